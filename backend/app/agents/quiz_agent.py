@@ -1,11 +1,16 @@
 import os
-import httpx
 import random
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, before_sleep_log
+import threading
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Tuple
+from tenacity import AsyncRetrying, retry, retry_if_exception, stop_after_attempt, wait_exponential, retry_if_exception_type, before_sleep_log
 import logging
-from pydantic_ai import Agent, RunContext, UnexpectedModelBehavior
-from pydantic_ai.models.google import GoogleModel
-from app.models.quiz import QuizGenerated
+from app.agents import web_search
+from app.core.llm_telemetry import record_tool_call, track_generation
+from app.models.quiz import QuestionGenerated, QuizGenerated
+
+if TYPE_CHECKING:
+    from pydantic_ai import Agent
 
 logger = logging.getLogger(__name__)
 
@@ -15,25 +20,67 @@ if api_key:
     os.environ["GOOGLE_API_KEY"] = api_key
 
 # Using gemini-2.5-flash as requested.
-model = GoogleModel('gemini-2.5-flash')
-
-quiz_agent = Agent(
-    model,
-    output_type=QuizGenerated,
-    system_prompt=(
-        "You are an expert educational AI assistant. Create multiple-choice quizzes from the provided lecture notes. "
-        "Ensure questions are directly relevant to the content, factually accurate, and pedagogically sound. "
-        "Each question must have exactly one correct answer and three plausible but incorrect distractors. "
-        "Do not use 'All of the above' or 'None of the above' as options.\n\n"
-        "FACT CHECKING REQUIRED: You must verify the factual accuracy of all generated questions and answers. "
-        "Use the `search_web` tool to verify facts, especially for dates, specific definitions, or scientific constants. "
-        "If the notes contain factually incorrect information, frame the question as 'According to the notes...' "
-        "or prioritize the correct fact if it's a general knowledge concept. Ensure the final quiz is high-quality and error-free."
-    )
+MODEL_NAME = 'gemini-2.5-flash'
+
+SYSTEM_PROMPT = (
+    "You are an expert educational AI assistant. Create multiple-choice quizzes from the provided lecture notes. "
+    "Ensure questions are directly relevant to the content, factually accurate, and pedagogically sound. "
+    "Each question must have exactly one correct answer and three plausible but incorrect distractors. "
+    "Do not use 'All of the above' or 'None of the above' as options.\n\n"
+    "FACT CHECKING REQUIRED: You must verify the factual accuracy of all generated questions and answers. "
+    "Use the `search_web` tool to verify facts, especially for dates, specific definitions, or scientific constants. "
+    "If the notes contain factually incorrect information, frame the question as 'According to the notes...' "
+    "or prioritize the correct fact if it's a general knowledge concept. Ensure the final quiz is high-quality and error-free."
 )
 
-@quiz_agent.tool
-async def search_web(ctx: RunContext[None], query: str) -> str:
+_agent = None
+_agent_lock = threading.Lock()
+
+def get_quiz_agent() -> "Agent[None, QuizGenerated]":
+    """
+    The quiz agent, built on first use.
+
+    pydantic-ai and the Google SDK take well over a second to import, so they are
+    not imported with this module: workers that never generate a quiz never pay for
+    them. The app lifespan prewarms the agent in a background thread.
+    """
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                started = time.perf_counter()
+                from pydantic_ai import Agent, Tool
+                from pydantic_ai.models.google import GoogleModel
+
+                _agent = Agent(
+                    GoogleModel(MODEL_NAME),
+                    output_type=QuizGenerated,
+                    system_prompt=SYSTEM_PROMPT,
+                    tools=[Tool(search_web, takes_ctx=True)],
+                )
+                logger.info(f"Quiz agent initialized in {time.perf_counter() - started:.2f}s")
+    return _agent
+
+def __getattr__(name: str):
+    # Keeps `quiz_agent.quiz_agent` / `quiz_agent.model` working without importing pydantic-ai eagerly
+    if name == "quiz_agent":
+        return get_quiz_agent()
+    if name == "model":
+        return get_quiz_agent().model
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+async def prewarm_quiz_agent():
+    """
+    Builds the agent off the event loop so the first generation does not pay for it.
+    """
+    import asyncio
+    try:
+        await asyncio.to_thread(get_quiz_agent)
+    except Exception as e:
+        logger.warning(f"Quiz agent prewarm failed (will retry on first use): {e}")
+
+# `ctx` (a RunContext[None]) is left unannotated so this module does not need pydantic-ai
+async def search_web(ctx, query: str) -> str:
     """
     Search the web for information to verify facts.
     Args:
@@ -51,31 +98,27 @@ async def search_web(ctx: RunContext[None], query: str) -> str:
         # but doesn't crash.
         return "System Error: Google Search API Key or CSE ID not configured. Proceed with internal knowledge only."
         
-    url = "https://www.googleapis.com/customsearch/v1"
-    params = {
-        "key": api_key,
-        "cx": cse_id,
-        "q": query,
-        "num": 3
-    }
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(url, params=params)
-            resp.raise_for_status()
-            data = resp.json()
-            
-            results = []
-            if "items" in data:
-                for item in data["items"]:
-                    title = item.get('title', 'No Title')
-                    snippet = item.get('snippet', 'No Snippet')
-                    results.append(f"Title: {title}\nSnippet: {snippet}\n")
-            
-            return "\n".join(results) if results else "No results found."
-            
-        except Exception as e:
-            return f"Error performing search: {str(e)}"
+    started = time.perf_counter()
+    failed = False
+    try:
+        return await web_search.search(query, api_key, cse_id)
+    except Exception as e:
+        failed = True
+        return f"Error performing search: {str(e)}"
+    finally:
+        record_tool_call("search_web", time.perf_counter() - started, error=failed)
+
+async def generate_quiz_content(prompt: str) -> QuizGenerated:
+    """
+    Generates a quiz using the provided prompt.
+    Retries on failure (e.g., 503 Model Overloaded); token usage, attempts and
+    tool calls are recorded as LLM telemetry.
+    """
+    with track_generation(MODEL_NAME, prompt) as telemetry:
+        quiz = await _run_quiz_agent(prompt, telemetry)
+
+    shuffle_quiz_options(quiz)
+    return quiz
 
 @retry(
     stop=stop_after_attempt(5),
@@ -83,25 +126,91 @@ async def search_web(ctx: RunContext[None], query: str) -> str:
     before_sleep=before_sleep_log(logger, logging.WARNING),
     reraise=True
 )
-async def generate_quiz_content(prompt: str) -> QuizGenerated:
+async def _run_quiz_agent(prompt: str, telemetry) -> QuizGenerated:
+    started = time.perf_counter()
+    try:
+        result = await get_quiz_agent().run(prompt)
+    except Exception as e:
+        telemetry.record_attempt(time.perf_counter() - started, e)
+        raise
+    telemetry.record_attempt(time.perf_counter() - started)
+    telemetry.record_usage(result.usage)
+    return result.output
+
+# Streaming can only be retried before the first question reaches the client
+STREAM_RETRY_WAIT = wait_exponential(multiplier=1, min=4, max=10)
+
+
+class _StreamClosed(Exception):
     """
-    Generates a quiz using the provided prompt.
-    Retries on failure (e.g., 503 Model Overloaded).
+    The consumer closed the stream. Raised in place of GeneratorExit inside the model
+    run, whose context managers only unwind cleanly on an ordinary exception.
     """
-    # Run the agent
-    result = await quiz_agent.run(prompt)
-    quiz = result.output
 
-    # Post-process to shuffle options and mitigate LLM positional bias
-    for question in quiz.questions:
-        # Store the text of the correct answer before shuffling
-        correct_option_text = question.options[question.correct_answer_index]
-        
-        # Shuffle the options
-        random.shuffle(question.options)
-        
-        # Find the new index of the correct answer
-        new_correct_index = question.options.index(correct_option_text)
-        question.correct_answer_index = new_correct_index
+async def stream_quiz_content(prompt: str) -> AsyncIterator[Tuple[str, QuestionGenerated]]:
+    """
+    Streams a quiz using the provided prompt, yielding (title, question) as soon as
+    each question is complete, with its options already shuffled.
+
+    The structured output is validated incrementally: a question is final once the
+    next one shows up in the partial output, and the last one when the run ends. Failures are
+    retried like generate_quiz_content until the first question has been yielded.
+    """
+    emitted = 0
+    try:
+        with track_generation(MODEL_NAME, prompt) as telemetry:
+            retrying = AsyncRetrying(
+                stop=stop_after_attempt(5),
+                wait=STREAM_RETRY_WAIT,
+                # Only model errors: cancellation or the consumer closing the stream must not start another run
+                retry=retry_if_exception(lambda e: isinstance(e, Exception) and emitted == 0),
+                before_sleep=before_sleep_log(logger, logging.WARNING),
+                reraise=True
+            )
+            async for attempt in retrying:
+                with attempt:
+                    started = time.perf_counter()
+                    try:
+                        async with get_quiz_agent().run_stream(prompt) as result:
+                            async for partial in result.stream_output(debounce_by=None):
+                                for question in partial.questions[emitted:-1]:
+                                    # Counted before yielding: once a question is handed out the run is not retried
+                                    emitted += 1
+                                    try:
+                                        yield partial.title, shuffle_question_options(question)
+                                    except GeneratorExit:
+                                        raise _StreamClosed()
+                            quiz = await result.get_output()
+                            telemetry.record_usage(result.usage)
+                    except Exception as e:
+                        telemetry.record_attempt(time.perf_counter() - started, e)
+                        raise
+                    telemetry.record_attempt(time.perf_counter() - started)
 
+            for question in quiz.questions[emitted:]:
+                yield quiz.title, shuffle_question_options(question)
+    except _StreamClosed:
+        return
+
+def shuffle_question_options(question: QuestionGenerated) -> QuestionGenerated:
+    """
+    Shuffles a question's options in place to mitigate LLM positional bias,
+    keeping correct_answer_index pointing at the correct option.
+    """
+    # Store the text of the correct answer before shuffling
+    correct_option_text = question.options[question.correct_answer_index]
+
+    # Shuffle the options
+    random.shuffle(question.options)
+
+    # Find the new index of the correct answer
+    question.correct_answer_index = question.options.index(correct_option_text)
+    return question
+
+def shuffle_quiz_options(quiz: QuizGenerated) -> QuizGenerated:
+    """
+    Shuffles each question's options in place (see shuffle_question_options).
+    """
+    for question in quiz.questions:
+        shuffle_question_options(question)
     return quiz
\ No newline at end of file
@@ -0,0 +1,108 @@
+import importlib.util
+import os
+import re
+from typing import Optional
+
+import httpx
+from app.core.ttl_cache import TTLCache
+
+SEARCH_URL = os.getenv("GOOGLE_SEARCH_URL", "https://www.googleapis.com/customsearch/v1")
+SEARCH_RESULTS = 3
+
+# HTTP/2 needs the optional `h2` package (httpx[http2]); fall back to HTTP/1.1 keep-alive
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _normalize_query(query: str) -> str:
+    # "What is  Photosynthesis?" and "what is photosynthesis?" are the same fact check
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+class SearchResultCache(TTLCache):
+    """
+    LRU cache of summarized search results keyed by normalized query, with a TTL.
+    Only successful lookups are cached, so a transient API error is retried next time.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 86400.0):
+        super().__init__(max_size, ttl=ttl)
+
+    def get(self, key: str) -> Optional[str]:
+        return super().get(key)
+
+    def set(self, key: str, summary: str):
+        super().set(key, summary)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["hit_rate"] = self.hit_rate()
+        return stats
+
+
+search_cache = SearchResultCache(
+    max_size=int(os.getenv("SEARCH_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "86400")),
+)
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        timeout=httpx.Timeout(float(os.getenv("SEARCH_TIMEOUT", "10")), connect=5.0),
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("SEARCH_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=10,
+            keepalive_expiry=30.0,
+        ),
+    )
+
+
+async def start_search_client():
+    """
+    Creates the application-scoped pooled client; called from the app lifespan.
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = _new_client()
+
+
+async def close_search_client():
+    global _http_client
+    client, _http_client = _http_client, None
+    if client is not None:
+        await client.aclose()
+
+
+def _summarize(data: dict) -> str:
+    results = []
+    for item in data.get("items", []):
+        title = item.get('title', 'No Title')
+        snippet = item.get('snippet', 'No Snippet')
+        results.append(f"Title: {title}\nSnippet: {snippet}\n")
+    return "\n".join(results) if results else "No results found."
+
+
+async def search(query: str, api_key: str, cse_id: str) -> str:
+    """
+    Summarized top results for `query`, served from the cache when possible.
+    Failed lookups raise and are never cached.
+    """
+    key = f"{cse_id}|{_normalize_query(query)}"
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+
+    params = {"key": api_key, "cx": cse_id, "q": query, "num": SEARCH_RESULTS}
+    if _http_client is not None:
+        resp = await _http_client.get(SEARCH_URL, params=params)
+    else:
+        # Outside the app (scripts, tests) there is no shared client
+        async with _new_client() as client:
+            resp = await client.get(SEARCH_URL, params=params)
+    resp.raise_for_status()
+    summary = _summarize(resp.json())
+
+    search_cache.set(key, summary)
+    return summary
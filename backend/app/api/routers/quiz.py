@@ -1,15 +1,52 @@
+import asyncio
+import json
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+import os
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Response
+from fastapi.responses import StreamingResponse
 from app.core.security import get_current_user
 from app.core.database import get_supabase_client
-from app.models.quiz import QuizGenerateRequest, QuizResponse, QuizHistoryResponse, QuizUpdateRequest # Import QuizUpdateRequest
+from app.models.quiz import QuizGenerateRequest, QuizResponse, QuizHistoryResponse, QuizUpdateRequest, QuizJobResponse # Import QuizUpdateRequest
 from app.services.quiz_service import generate_quiz, get_quiz_history, delete_quiz, update_quiz # Import update_quiz
-from app.models.quiz_submission import QuizStartResponse, QuizSubmissionRequest, QuizSubmissionResponse, QuizNextRequest, QuizNextResponse, QuizPreviousRequest, QuizPreviousResponse, QuizResultResponse, QuizRetakeRequest
-from app.services.quiz_submission import start_quiz_attempt, submit_answer, get_next_question, get_previous_question, get_quiz_results, retake_quiz
+from app.models.quiz_submission import QuizStartResponse, QuizSubmissionRequest, QuizSubmissionResponse, QuizBatchSubmissionRequest, QuizBatchSubmissionResponse, QuizNextRequest, QuizNextResponse, QuizPreviousRequest, QuizPreviousResponse, QuizResultResponse, QuizRetakeRequest
+from app.services.quiz_submission import start_quiz_attempt, submit_answer, submit_answers_batch, get_next_question, get_previous_question, get_quiz_results, retake_quiz
+from app.services.quiz_jobs import quiz_job_manager, to_job_response
+from app.services.quiz_streaming import stream_quiz_generation
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Idle SSE connections get a comment this often, so proxies do not close them mid-generation
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+
+async def _with_keepalive(events: AsyncIterator[dict], interval: float) -> AsyncIterator[Optional[dict]]:
+    """
+    Yields the events, and None whenever `interval` seconds pass without one.
+    The pending read is shielded, so a timeout never cancels the event stream itself.
+    """
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(events))
+            try:
+                event = await asyncio.wait_for(asyncio.shield(pending), interval)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            except StopAsyncIteration:
+                pending = None
+                return
+            pending = None
+            yield event
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        await events.aclose()
+
 @router.post("/quiz/generate", response_model=QuizResponse, status_code=status.HTTP_201_CREATED)
 async def generate_quiz_endpoint(
     request: QuizGenerateRequest, 
@@ -29,6 +66,94 @@ async def generate_quiz_endpoint(
             raise e
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+@router.post("/quiz/generate/stream")
+async def generate_quiz_stream_endpoint(
+    request: QuizGenerateRequest,
+    http_request: Request,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Streams the quiz as it is generated: one event per persisted question, as NDJSON
+    or, when the client accepts text/event-stream, as server-sent events.
+    """
+    user_id = user.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid user token")
+
+    supabase = get_supabase_client()
+    events = stream_quiz_generation(request, user_id, supabase)
+
+    # Errors before generation starts (no notes, admission control) keep their status code
+    try:
+        first = await anext(events)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in quiz generation stream endpoint: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+    use_sse = "text/event-stream" in http_request.headers.get("accept", "")
+
+    def encode(event: dict) -> str:
+        if use_sse:
+            return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        return json.dumps(event) + "\n"
+
+    async def event_stream():
+        yield encode(first)
+        async for event in events:
+            yield encode(event)
+
+    media_type = "text/event-stream" if use_sse else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+@router.post("/quiz/jobs", response_model=QuizJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_quiz_job_endpoint(
+    request: QuizGenerateRequest,
+    user: dict = Depends(get_current_user)
+):
+    user_id = user.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid user token")
+
+    job = await quiz_job_manager.submit(request, user_id)
+    return to_job_response(job)
+
+@router.get("/quiz/jobs/{job_id}", response_model=QuizJobResponse)
+async def get_quiz_job_endpoint(
+    job_id: str,
+    user: dict = Depends(get_current_user)
+):
+    user_id = user.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid user token")
+
+    job = quiz_job_manager.get_job(job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Quiz job not found")
+    return to_job_response(job)
+
+@router.get("/quiz/jobs/{job_id}/events")
+async def quiz_job_events_endpoint(
+    job_id: str,
+    user: dict = Depends(get_current_user)
+):
+    user_id = user.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid user token")
+
+    if not quiz_job_manager.get_job(job_id, user_id):
+        raise HTTPException(status_code=404, detail="Quiz job not found")
+
+    async def event_stream():
+        async for event in _with_keepalive(quiz_job_manager.events(job_id), SSE_KEEPALIVE_SECONDS):
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: stage\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @router.get("/quiz/{quiz_id}/start", response_model=QuizStartResponse)
 async def start_quiz_endpoint(
     quiz_id: str,
@@ -67,6 +192,29 @@ async def submit_answer_endpoint(
             raise e
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+@router.post("/quiz/{quiz_id}/answers", response_model=QuizBatchSubmissionResponse)
+async def submit_answers_batch_endpoint(
+    quiz_id: str,
+    request: QuizBatchSubmissionRequest,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Records many answers for one attempt in a single round trip, e.g. answers a
+    client queued while offline. Returns a result per answer.
+    """
+    user_id = user.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid user token")
+
+    supabase = get_supabase_client()
+
+    try:
+        return await submit_answers_batch(quiz_id, request, user_id, supabase)
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
 @router.post("/quiz/{quiz_id}/next", response_model=QuizNextResponse)
 async def next_question_endpoint(
     quiz_id: str,
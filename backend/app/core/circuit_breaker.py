@@ -0,0 +1,227 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Tuple
+
+import httpx
+from postgrest.exceptions import APIError
+
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+circuit_breaker_state = registry.gauge(
+    "circuit_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open).", ("breaker",)
+)
+circuit_breaker_transitions_total = registry.counter(
+    "circuit_breaker_transitions_total", "Circuit breaker state changes.", ("breaker", "state")
+)
+circuit_breaker_rejections_total = registry.counter(
+    "circuit_breaker_rejections_total", "Calls failed fast because the circuit was open.", ("breaker",)
+)
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Circuit {name} is open; failing fast for another {retry_after:.0f}s")
+
+
+def is_supabase_outage(error: BaseException) -> bool:
+    """
+    Errors that say Supabase is unreachable or unhealthy, as opposed to a bad query.
+
+    PostgREST answers ordinary query errors (PGRST116 no rows, constraint violations,
+    ...) with a JSON body; those prove the database is up and never trip the breaker.
+    A non-JSON 5xx from the gateway (postgrest reports its HTTP status as an int code),
+    PGRST00x (PostgREST cannot reach Postgres) or a connection-class SQLSTATE does.
+    """
+    if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, APIError):
+        if isinstance(error.code, int):
+            return error.code >= 500
+        return str(error.code or "").startswith(("PGRST00", "08", "57P"))
+    return False
+
+
+def is_supabase_unavailable(error: BaseException) -> bool:
+    """
+    The call did not get an answer from Supabase: rejected by the breaker (open, or
+    half-open with the trial slot taken) or failed with an outage error.
+    """
+    return isinstance(error, CircuitOpenError) or is_supabase_outage(error)
+
+
+def never_reached_supabase(error: BaseException) -> bool:
+    """
+    The call provably wrote nothing: the breaker rejected it or no connection was made.
+    Other failures (timeouts, resets) may hit after the database already committed.
+    """
+    return isinstance(error, (CircuitOpenError, httpx.ConnectError, httpx.ConnectTimeout))
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker.
+
+    Closed: calls go through and outcomes are kept for the last `window` seconds (at
+    most `window_size` calls). Once at least `min_calls` are recorded and the share of
+    failures reaches `failure_rate`, the circuit opens.
+
+    Open: calls fail immediately with CircuitOpenError for `open_seconds`, so callers
+    fall back without waiting for network timeouts.
+
+    Half-open: up to `half_open_calls` trial calls go through; a success closes the
+    circuit, a failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_calls: int = 10,
+        window_size: int = 50,
+        window: float = 60.0,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+        is_failure: Callable[[BaseException], bool] = lambda e: True,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.is_failure = is_failure
+        self._outcomes: Deque[Tuple[float, bool]] = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+        self._lock = threading.Lock()
+        circuit_breaker_state.set(_STATE_VALUES[CLOSED], breaker=name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def retry_after(self) -> int:
+        with self._lock:
+            remaining = self.open_seconds - (time.monotonic() - self._opened_at)
+        return max(1, math.ceil(remaining))
+
+    def _transition(self, state: str, reason: str = ""):
+        # Called with the lock held
+        previous, self._state = self._state, state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state != HALF_OPEN:
+            self._trials = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+        circuit_breaker_state.set(_STATE_VALUES[state], breaker=self.name)
+        circuit_breaker_transitions_total.inc(breaker=self.name, state=state)
+        message = f"Circuit {self.name}: {previous} -> {state}" + (f" ({reason})" if reason else "")
+        if state == OPEN:
+            logger.warning(message)
+        else:
+            logger.info(message)
+
+    def _admit(self):
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    remaining = self.open_seconds - (time.monotonic() - self._opened_at)
+                    circuit_breaker_rejections_total.inc(breaker=self.name)
+                    raise CircuitOpenError(self.name, remaining)
+                self._transition(HALF_OPEN, "probing")
+            if self._state == HALF_OPEN:
+                if self._trials >= self.half_open_calls:
+                    circuit_breaker_rejections_total.inc(breaker=self.name)
+                    raise CircuitOpenError(self.name, 1)
+                self._trials += 1
+
+    def _record(self, failed: bool, error: BaseException = None):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trials = max(0, self._trials - 1)
+                if failed:
+                    self._transition(OPEN, f"trial call failed: {error}")
+                else:
+                    self._transition(CLOSED, "trial call succeeded")
+                return
+            if self._state == OPEN:
+                return
+
+            now = time.monotonic()
+            self._outcomes.append((now, failed))
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                self._outcomes.popleft()
+            calls = len(self._outcomes)
+            failures = sum(1 for _, f in self._outcomes if f)
+            if failed and calls >= self.min_calls and failures / calls >= self.failure_rate:
+                self._transition(OPEN, f"{failures}/{calls} calls failed, last: {error}")
+
+    def _release(self):
+        # Cancelled before an outcome was known: give back a half-open trial slot
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trials = max(0, self._trials - 1)
+
+    @contextmanager
+    def guard(self):
+        """
+        Wraps one call: raises CircuitOpenError instead of running it while open, and
+        records its outcome. Exceptions `is_failure` rejects count as successes.
+        """
+        self._admit()
+        try:
+            yield
+        except Exception as e:
+            failed = self.is_failure(e)
+            self._record(failed, e if failed else None)
+            raise
+        except BaseException:
+            self._release()
+            raise
+        self._record(False)
+
+    def reset(self):
+        with self._lock:
+            self._outcomes.clear()
+            self._state = CLOSED
+            self._trials = 0
+        circuit_breaker_state.set(_STATE_VALUES[CLOSED], breaker=self.name)
+
+    def stats(self) -> dict:
+        state = self.state
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = sum(1 for _, f in self._outcomes if f)
+        return {
+            "state": _STATE_VALUES[state],
+            "window_calls": calls,
+            "window_failures": failures,
+        }
+
+
+supabase_breaker = CircuitBreaker(
+    "supabase",
+    failure_rate=float(os.getenv("SUPABASE_BREAKER_FAILURE_RATE", "0.5")),
+    min_calls=int(os.getenv("SUPABASE_BREAKER_MIN_CALLS", "10")),
+    window=float(os.getenv("SUPABASE_BREAKER_WINDOW", "60")),
+    open_seconds=float(os.getenv("SUPABASE_BREAKER_OPEN_SECONDS", "30")),
+    is_failure=is_supabase_outage,
+)
@@ -1,9 +1,22 @@
 from supabase import create_client, Client
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
 import os
 from . import config
+from postgrest.exceptions import APIError
+from .circuit_breaker import supabase_breaker
+from .query_metrics import InstrumentedClient
 
 _supabase_client: Client = None
 
+# The Supabase client is synchronous. Async handlers offload execute() to this bounded pool
+# so a slow PostgREST round trip never blocks the event loop for other requests.
+_db_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("SUPABASE_MAX_CONCURRENCY", "16")),
+    thread_name_prefix="supabase",
+)
+
 def get_supabase_client() -> Client:
     global _supabase_client
     if _supabase_client is None:
@@ -12,23 +25,45 @@ def get_supabase_client() -> Client:
 
         if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
             raise ValueError("Supabase URL and Service Role Key must be set in environment variables.")
-        _supabase_client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+        # Every table()/rpc() query is timed and tagged with its table, operation and caller
+        _supabase_client = InstrumentedClient(create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY))
     return _supabase_client
 
+async def execute_async(query):
+    """
+    Runs a query builder's blocking execute() on the database thread pool.
+    Usage: response = await execute_async(supabase.table("quizzes").select("*").eq("id", quiz_id))
+
+    Calls go through the Supabase circuit breaker: while Supabase is failing this
+    raises CircuitOpenError immediately instead of waiting for another timeout.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    with supabase_breaker.guard():
+        return await loop.run_in_executor(_db_executor, ctx.run, query.execute)
+
+def is_missing_function(error: BaseException) -> bool:
+    """
+    True when an rpc() call failed because the database function is not deployed
+    (PostgREST PGRST202, Postgres 42883 "function ... does not exist").
+
+    Only this case is safe to retry another way: after a timeout or a dropped
+    connection the function may already have committed.
+    """
+    if isinstance(error, APIError) and error.code in ("PGRST202", "42883"):
+        return True
+    message = str(error).lower()
+    return "function" in message and "does not exist" in message
+
 def verify_supabase_connection():
+    """
+    One-off blocking connectivity check, for scripts. The app itself checks readiness
+    in the background (see app.core.health) instead of blocking startup on this.
+    """
     try:
-        # Create a dedicated client for verification to avoid side effects on the global singleton
-        # during startup (which runs in the event loop thread), while requests run in worker threads.
-        # This helps prevent potential socket/SSL context issues (WinError 10035).
-        SUPABASE_URL = os.environ.get("SUPABASE_URL")
-        SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
-        
-        if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
-            return False
-            
-        temp_client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-        temp_client.table("courses").select("*").limit(1).execute()
-        
+        client = get_supabase_client()
+        client.table("courses").select("*").limit(1).execute()
+
         print("Supabase client initialized successfully.")
         return True
     except Exception as e:
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from app.core.database import execute_async, get_supabase_client
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+dependency_up = registry.gauge(
+    "dependency_up", "Whether the last readiness probe of a dependency succeeded.", ("dependency",)
+)
+dependency_probe_seconds = registry.histogram(
+    "dependency_probe_seconds", "Readiness probe latency per dependency.", ("dependency",)
+)
+
+
+async def check_supabase():
+    # Runs on the database pool like any other query, never on the event loop
+    await execute_async(get_supabase_client().table("courses").select("id").limit(1))
+
+
+class ReadinessProbe:
+    """
+    Dependency readiness for /readyz.
+
+    The result of the last probe is cached for `ttl` seconds, so orchestrators can
+    poll as often as they like without a database query per poll. Concurrent polls
+    of an expired result share a single probe, and each check is bounded by `timeout`.
+    """
+
+    def __init__(self, checks: Dict[str, Callable[[], Awaitable[None]]], ttl: float = 5.0, timeout: float = 3.0):
+        self.checks = checks
+        self.ttl = ttl
+        self.timeout = timeout
+        self._result: Optional[dict] = None
+        self._expires_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+
+    async def _run_check(self, name: str, check) -> dict:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), timeout=self.timeout)
+            ok, error = True, None
+        except asyncio.TimeoutError:
+            ok, error = False, f"timed out after {self.timeout:g}s"
+        except Exception as e:
+            ok, error = False, str(e) or type(e).__name__
+        elapsed = time.perf_counter() - started
+        dependency_up.set(1 if ok else 0, dependency=name)
+        dependency_probe_seconds.observe(elapsed, dependency=name)
+        result = {"ok": ok, "latency_ms": round(elapsed * 1000, 1)}
+        if error:
+            result["error"] = error
+        return result
+
+    async def _probe(self) -> dict:
+        names = list(self.checks)
+        results = await asyncio.gather(*(self._run_check(name, self.checks[name]) for name in names))
+        checks = dict(zip(names, results))
+        ready = all(r["ok"] for r in results)
+        if self._result is not None and self._result["ready"] != ready:
+            failing = [name for name, r in checks.items() if not r["ok"]]
+            logger.warning(f"Readiness changed to {'ready' if ready else 'not ready'}" + (f": {', '.join(failing)} failing" if failing else ""))
+        self._result = {"ready": ready, "checks": checks, "checked_at": time.time()}
+        self._expires_at = time.monotonic() + self.ttl
+        return self._result
+
+    async def check(self, force: bool = False) -> dict:
+        if not force and self._result is not None and self._expires_at > time.monotonic():
+            return self._result
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._probe())
+        # shield: a poller hanging up must not cancel the probe other pollers wait on
+        return await asyncio.shield(self._inflight)
+
+    @property
+    def last_result(self) -> Optional[dict]:
+        return self._result
+
+    async def run_startup_check(self):
+        """
+        Probes the dependencies once after startup, in the background, and logs the outcome.
+        """
+        result = await self.check(force=True)
+        for name, check in result["checks"].items():
+            if check["ok"]:
+                logger.info(f"Startup check: {name} reachable ({check['latency_ms']}ms)")
+            else:
+                logger.warning(f"Startup check: {name} unreachable: {check['error']}")
+
+    def reset(self):
+        self._result = None
+        self._expires_at = 0.0
+        self._inflight = None
+
+
+readiness = ReadinessProbe(
+    {"supabase": check_supabase},
+    ttl=float(os.getenv("READINESS_CACHE_TTL", "5")),
+    timeout=float(os.getenv("READINESS_CHECK_TIMEOUT", "3")),
+)
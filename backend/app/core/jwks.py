@@ -0,0 +1,145 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Algorithms Supabase uses for asymmetric JWT signing keys
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256"]
+
+
+class JWKSCache:
+    """
+    Caches the project's JSON Web Key Set, indexed by `kid`.
+
+    Keys come either from a local file (SUPABASE_JWKS_FILE, handy for tests and
+    air-gapped setups) or from the project's JWKS endpoint. An unknown `kid`
+    triggers an on-demand refresh (rate limited by `min_refresh_interval`) so key
+    rotation is picked up without waiting for the background refresh.
+    """
+
+    def __init__(self, url: Optional[str] = None, path: Optional[str] = None,
+                 refresh_interval: float = 600.0, min_refresh_interval: float = 30.0):
+        self.url = url
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._last_refresh: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def source(self) -> str:
+        return self.path or self.url or ""
+
+    def _fetch(self) -> Dict[str, Any]:
+        if self.path:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        response = httpx.get(self.url, timeout=5.0)
+        response.raise_for_status()
+        return response.json()
+
+    def _refresh_locked(self) -> bool:
+        self._last_refresh = time.monotonic()
+        try:
+            data = self._fetch()
+        except Exception as e:
+            logger.warning(f"Failed to refresh JWKS from {self.source}: {e}")
+            return False
+
+        keys = {}
+        for key in data.get("keys", []):
+            # Symmetric ("oct") keys are never trusted from a key set
+            if key.get("kid") and key.get("kty") in ("RSA", "EC"):
+                keys[key["kid"]] = key
+        self._keys = keys
+        return True
+
+    def refresh(self) -> bool:
+        """
+        Reloads the key set. On failure the previously loaded keys are kept.
+        """
+        with self._lock:
+            return self._refresh_locked()
+
+    def refresh_if_due(self) -> bool:
+        """
+        Reloads the key set unless a refresh, successful or not, started within
+        `min_refresh_interval`, or another thread is refreshing right now. While the
+        JWKS endpoint is down this costs one blocking fetch per interval, not one per
+        request, and requests never queue behind the lock.
+        """
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self._last_refresh is not None and time.monotonic() - self._last_refresh < self.min_refresh_interval:
+                return False
+            return self._refresh_locked()
+        finally:
+            self._lock.release()
+
+    def get_key(self, kid: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not kid:
+            return None
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+
+        # Unknown kid: the signing key may have rotated since the last fetch
+        self.refresh_if_due()
+        return self._keys.get(kid)
+
+    @property
+    def has_keys(self) -> bool:
+        return bool(self._keys)
+
+    async def run_background_refresh(self, warn_if_empty: bool = False):
+        # Warms the cache at startup, then keeps it fresh without blocking requests
+        await asyncio.to_thread(self.refresh)
+        if warn_if_empty and not self.has_keys:
+            # A JWKS URL is derived from SUPABASE_URL for every project, but projects on
+            # the legacy shared secret publish no asymmetric signing keys there
+            logger.warning(
+                f"SUPABASE_JWT_SECRET is not set and {self.source} provided no signing keys. "
+                "Authentication will fail."
+            )
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await asyncio.to_thread(self.refresh)
+
+
+_jwks_cache: Optional[JWKSCache] = None
+
+
+def _jwks_source() -> tuple[Optional[str], Optional[str]]:
+    path = os.getenv("SUPABASE_JWKS_FILE")
+    if path:
+        return None, path
+    url = os.getenv("SUPABASE_JWKS_URL")
+    if not url and os.getenv("SUPABASE_URL"):
+        url = os.getenv("SUPABASE_URL").rstrip("/") + "/auth/v1/.well-known/jwks.json"
+    return url, None
+
+
+def get_jwks_cache() -> Optional[JWKSCache]:
+    """
+    Returns the shared JWKS cache, or None if no JWKS source is configured.
+    """
+    global _jwks_cache
+    url, path = _jwks_source()
+    if not url and not path:
+        return None
+    if _jwks_cache is None or _jwks_cache.source != (path or url):
+        _jwks_cache = JWKSCache(
+            url=url,
+            path=path,
+            refresh_interval=float(os.getenv("SUPABASE_JWKS_REFRESH_INTERVAL", "600")),
+        )
+    return _jwks_cache
@@ -0,0 +1,232 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+TMP_DIR = os.path.join(os.path.dirname(__file__), "../../tmp")
+# JSONL sink, one record per generation; set to an empty string to disable
+TELEMETRY_PATH = os.getenv("LLM_TELEMETRY_PATH", os.path.join(TMP_DIR, "llm_telemetry.jsonl"))
+# USD per million tokens, for cost estimates (defaults: gemini-2.5-flash list price)
+INPUT_COST_PER_MTOK = float(os.getenv("LLM_INPUT_COST_PER_MTOK", "0.30"))
+OUTPUT_COST_PER_MTOK = float(os.getenv("LLM_OUTPUT_COST_PER_MTOK", "2.50"))
+
+llm_generations_total = registry.counter(
+    "llm_generations_total", "Quiz generations by model and outcome.", ("model", "outcome")
+)
+llm_generation_duration_seconds = registry.histogram(
+    "llm_generation_duration_seconds", "Wall time per quiz generation, including retries.", ("model",)
+)
+llm_attempt_duration_seconds = registry.histogram(
+    "llm_attempt_duration_seconds", "Wall time per model attempt.", ("model", "outcome")
+)
+llm_retries_total = registry.counter(
+    "llm_retries_total", "Retried model attempts by failure reason.", ("model", "reason")
+)
+llm_tokens_total = registry.counter(
+    "llm_tokens_total", "Tokens consumed by kind (input/output).", ("model", "kind")
+)
+llm_cost_usd_total = registry.counter(
+    "llm_cost_usd_total", "Estimated model spend in USD.", ("model",)
+)
+llm_tool_call_duration_seconds = registry.histogram(
+    "llm_tool_call_duration_seconds", "Agent tool call latency.", ("tool", "outcome")
+)
+
+
+@dataclass
+class AttemptRecord:
+    seconds: float
+    outcome: str
+    error: Optional[str] = None
+
+
+@dataclass
+class GenerationTelemetry:
+    """
+    Everything one generate_quiz_content call cost: attempts (and so retries),
+    token usage of the successful run, and the tool calls the agent made.
+    """
+    model: str
+    prompt_chars: int
+    tags: Dict[str, Any] = field(default_factory=dict)
+    generation_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    started_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    outcome: str = "pending"
+    total_seconds: float = 0.0
+    attempts: List[AttemptRecord] = field(default_factory=list)
+    input_tokens: int = 0
+    output_tokens: int = 0
+    requests: int = 0
+    tool_calls: int = 0
+    tool_seconds: float = 0.0
+    tool_errors: int = 0
+
+    @property
+    def retries(self) -> int:
+        return max(0, len(self.attempts) - 1)
+
+    @property
+    def estimated_cost_usd(self) -> float:
+        return (self.input_tokens * INPUT_COST_PER_MTOK + self.output_tokens * OUTPUT_COST_PER_MTOK) / 1_000_000
+
+    def record_attempt(self, seconds: float, error: Optional[BaseException] = None):
+        outcome = "error" if error else "ok"
+        self.attempts.append(AttemptRecord(seconds, outcome, _reason(error) if error else None))
+        llm_attempt_duration_seconds.observe(seconds, model=self.model, outcome=outcome)
+
+    def record_usage(self, usage):
+        # pydantic-ai exposes usage as a method (1.x) or a property (2.x)
+        if callable(usage):
+            usage = usage()
+        # Missing/odd usage objects must never fail a generation
+        try:
+            self.input_tokens += int(getattr(usage, "input_tokens", 0) or 0)
+            self.output_tokens += int(getattr(usage, "output_tokens", 0) or 0)
+            self.requests += int(getattr(usage, "requests", 0) or 0)
+        except (TypeError, ValueError):
+            pass
+
+    def to_record(self) -> Dict[str, Any]:
+        record = asdict(self)
+        record["retries"] = self.retries
+        record["retry_reasons"] = [a.error for a in self.attempts[:-1] if a.error]
+        record["estimated_cost_usd"] = round(self.estimated_cost_usd, 6)
+        return record
+
+
+def _reason(error: BaseException) -> str:
+    status = getattr(error, "status_code", None)
+    return f"{type(error).__name__}:{status}" if status else type(error).__name__
+
+
+_current: contextvars.ContextVar[Optional[GenerationTelemetry]] = contextvars.ContextVar("llm_generation", default=None)
+_tags: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("llm_generation_tags", default={})
+
+
+@contextmanager
+def telemetry_tags(**tags):
+    """
+    Attaches tags (e.g. prompt_version) to every generation started inside the block,
+    including the per-chunk generations that run as separate tasks.
+    """
+    token = _tags.set({**_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+@contextmanager
+def track_generation(model: str, prompt: str):
+    telemetry = GenerationTelemetry(model=model, prompt_chars=len(prompt), tags=dict(_tags.get()))
+    token = _current.set(telemetry)
+    started = time.perf_counter()
+    try:
+        yield telemetry
+        telemetry.outcome = "ok"
+    except BaseException:
+        telemetry.outcome = "error"
+        raise
+    finally:
+        _current.reset(token)
+        telemetry.total_seconds = time.perf_counter() - started
+        record_generation(telemetry)
+
+
+def record_tool_call(tool: str, seconds: float, error: bool = False):
+    llm_tool_call_duration_seconds.observe(seconds, tool=tool, outcome="error" if error else "ok")
+    telemetry = _current.get()
+    if telemetry is not None:
+        telemetry.tool_calls += 1
+        telemetry.tool_seconds += seconds
+        if error:
+            telemetry.tool_errors += 1
+
+
+class JsonlSink:
+    """
+    Appends records as JSON lines from a background writer thread, so a slow disk
+    never blocks the event loop that finished the generation. Records queued at
+    about the same time are written with one open/append.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+
+    def write(self, record: Dict[str, Any]):
+        if not self.path:
+            return
+        self._queue.put((self.path, json.dumps(record, default=str)))
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, name="llm-telemetry-sink", daemon=True)
+                self._writer.start()
+
+    def flush(self):
+        """
+        Blocks until every queued record has been written (or failed to write).
+        """
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._append(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _append(self, batch: List[Tuple[str, str]]):
+        lines_by_path: Dict[str, List[str]] = {}
+        for path, line in batch:
+            lines_by_path.setdefault(path, []).append(line)
+        for path, lines in lines_by_path.items():
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("".join(line + "\n" for line in lines))
+            except OSError as e:
+                logger.warning(f"Could not write LLM telemetry: {e}")
+
+
+telemetry_sink = JsonlSink(TELEMETRY_PATH)
+
+
+def record_generation(telemetry: GenerationTelemetry):
+    model = telemetry.model
+    llm_generations_total.inc(model=model, outcome=telemetry.outcome)
+    llm_generation_duration_seconds.observe(telemetry.total_seconds, model=model)
+    # Every attempt but the last was followed by a retry
+    for attempt in telemetry.attempts[:-1]:
+        if attempt.error:
+            llm_retries_total.inc(model=model, reason=attempt.error)
+    llm_tokens_total.inc(telemetry.input_tokens, model=model, kind="input")
+    llm_tokens_total.inc(telemetry.output_tokens, model=model, kind="output")
+    llm_cost_usd_total.inc(telemetry.estimated_cost_usd, model=model)
+
+    logger.info(
+        f"Generation {telemetry.generation_id} {telemetry.outcome} in {telemetry.total_seconds:.1f}s: "
+        f"{telemetry.input_tokens}+{telemetry.output_tokens} tokens, {telemetry.retries} retries, "
+        f"{telemetry.tool_calls} tool calls"
+    )
+    telemetry_sink.write(telemetry.to_record())
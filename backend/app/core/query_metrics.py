@@ -0,0 +1,225 @@
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.metrics import _route_template, registry
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SUPABASE_SLOW_QUERY_MS", "500"))
+# Requests issuing more queries than this are logged as likely N+1 patterns
+QUERY_COUNT_WARNING = int(os.getenv("SUPABASE_QUERY_COUNT_WARNING", "25"))
+
+OPERATIONS = ("select", "insert", "update", "upsert", "delete")
+
+Tag = Tuple[str, str, str]  # (table, operation, caller)
+
+supabase_query_duration_seconds = registry.histogram(
+    "supabase_query_duration_seconds", "PostgREST query latency by table and operation.", ("table", "operation")
+)
+supabase_queries_total = registry.counter(
+    "supabase_queries_total", "PostgREST queries by table, operation and outcome.", ("table", "operation", "outcome")
+)
+http_request_db_queries = registry.histogram(
+    "http_request_db_queries", "Database queries issued per HTTP request.", ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+)
+
+# Mutable per-request counter; a holder object (not an int) so increments made in
+# executor threads running a copy of the context are visible to the request.
+_request_queries: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("request_queries", default=None)
+
+
+def current_request_query_count() -> int:
+    holder = _request_queries.get()
+    return holder[0] if holder else 0
+
+
+class QueryStats:
+    """
+    Aggregates query timings per (table, operation, caller): counts, errors and
+    p50/p95/p99 over a bounded window of the most recent samples.
+    """
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._samples: Dict[Tag, deque] = {}
+        self._counts: Dict[Tag, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, tag: Tag, seconds: float, error: bool = False):
+        with self._lock:
+            samples = self._samples.get(tag)
+            if samples is None:
+                samples = self._samples[tag] = deque(maxlen=self.window)
+                self._counts[tag] = [0, 0]
+            samples.append(seconds)
+            self._counts[tag][0] += 1
+            if error:
+                self._counts[tag][1] += 1
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        One entry per tag, slowest p95 first.
+        """
+        with self._lock:
+            items = [(tag, sorted(samples), list(self._counts[tag])) for tag, samples in self._samples.items()]
+        rows = []
+        for (table, operation, caller), ordered, (count, errors) in items:
+            rows.append({
+                "table": table,
+                "operation": operation,
+                "caller": caller,
+                "count": count,
+                "errors": errors,
+                "p50_ms": _percentile(ordered, 0.50) * 1000,
+                "p95_ms": _percentile(ordered, 0.95) * 1000,
+                "p99_ms": _percentile(ordered, 0.99) * 1000,
+            })
+        rows.sort(key=lambda r: r["p95_ms"], reverse=True)
+        return rows
+
+    def render_metrics(self) -> List[str]:
+        lines = ["# TYPE supabase_query_latency_ms gauge"]
+        for row in self.summary():
+            labels = f'table="{row["table"]}",operation="{row["operation"]}",caller="{row["caller"]}"'
+            for q in ("p50", "p95", "p99"):
+                lines.append(f'supabase_query_latency_ms{{{labels},quantile="{q}"}} {row[f"{q}_ms"]:.3f}')
+        return lines
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+    return ordered[index]
+
+
+query_stats = QueryStats()
+registry.register_collector(query_stats.render_metrics)
+
+
+def _caller_name(depth: int = 2) -> str:
+    # Called from InstrumentedClient.table()/rpc(); the frame above is the service code
+    frame = sys._getframe(depth)
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+
+class _InstrumentedQuery:
+    """
+    Wraps a postgrest query builder: builder methods are passed through (re-wrapping
+    the returned builder) and execute() is timed and recorded.
+    """
+
+    __slots__ = ("_builder", "_table", "_operation", "_caller")
+
+    def __init__(self, builder, table: str, operation: Optional[str], caller: str):
+        self._builder = builder
+        self._table = table
+        self._operation = operation
+        self._caller = caller
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+        operation = self._operation or (name if name in OPERATIONS else None)
+
+        def method(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, "execute"):
+                return _InstrumentedQuery(result, self._table, operation, self._caller)
+            return result
+        return method
+
+    def execute(self):
+        operation = self._operation or "unknown"
+        tag = (self._table, operation, self._caller)
+        holder = _request_queries.get()
+        if holder is not None:
+            holder[0] += 1
+
+        started = time.perf_counter()
+        error = False
+        try:
+            return self._builder.execute()
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            query_stats.record(tag, elapsed, error)
+            supabase_query_duration_seconds.observe(elapsed, table=self._table, operation=operation)
+            supabase_queries_total.inc(table=self._table, operation=operation, outcome="error" if error else "ok")
+            if elapsed * 1000 >= SLOW_QUERY_MS:
+                logger.warning(f"Slow Supabase query: {operation} {self._table} from {self._caller} took {elapsed * 1000:.0f}ms")
+
+
+class InstrumentedClient:
+    """
+    Proxy around the Supabase client that instruments table() and rpc() queries.
+    Everything else (auth, storage, ...) is delegated unchanged.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    @property
+    def wrapped(self):
+        return self._client
+
+    def table(self, name: str) -> _InstrumentedQuery:
+        return _InstrumentedQuery(self._client.table(name), name, None, _caller_name())
+
+    def from_(self, name: str) -> _InstrumentedQuery:
+        return _InstrumentedQuery(self._client.from_(name), name, None, _caller_name())
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> _InstrumentedQuery:
+        return _InstrumentedQuery(self._client.rpc(fn, params or {}, **kwargs), f"rpc:{fn}", "rpc", _caller_name())
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class QueryCountMiddleware:
+    """
+    ASGI middleware counting the Supabase queries each request issues. The count is
+    returned in the X-DB-Query-Count header, recorded per route template and logged
+    when it exceeds SUPABASE_QUERY_COUNT_WARNING (usually a per-row query loop).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        holder = [0]
+        token = _request_queries.set(holder)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(holder[0]).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_queries.reset(token)
+            route_label = _route_template(scope)
+            http_request_db_queries.observe(holder[0], route=route_label)
+            if holder[0] > QUERY_COUNT_WARNING:
+                logger.warning(f"{scope['method']} {route_label} issued {holder[0]} Supabase queries")
@@ -3,6 +3,8 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
 from app.core.database import get_supabase_client
+from app.core.jwks import ASYMMETRIC_ALGORITHMS, get_jwks_cache
+from app.core.token_cache import token_cache
 
 security = HTTPBearer()
 
@@ -16,6 +18,13 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    # Strategy 0: Previously verified (or recently rejected) token
+    found, cached_payload = token_cache.get(token)
+    if found:
+        if cached_payload is None:
+            raise exception
+        return cached_payload
+
     # Strategy 1: Local JWT Verification (Fast)
     # Only attempts if secret is configured.
     if secret:
@@ -23,11 +32,31 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             # Supabase uses HS256
             # Audience 'authenticated' is standard for logged in users
             payload = jwt.decode(token, secret, algorithms=["HS256"], audience="authenticated")
+            token_cache.set(token, payload, exp=payload.get("exp"))
             return payload
         except JWTError:
             # If local verification fails (e.g. wrong secret), proceed to fallback
             pass
 
+    # Strategy 1b: Local verification against the project's JWKS (asymmetric signing keys)
+    # Only attempts if a JWKS source is configured and the token's kid is known.
+    try:
+        header = jwt.get_unverified_header(token)
+    except JWTError:
+        header = {}
+    if header.get("alg") in ASYMMETRIC_ALGORITHMS:
+        jwks = get_jwks_cache()
+        key = jwks.get_key(header.get("kid")) if jwks else None
+        if key:
+            try:
+                payload = jwt.decode(token, key, algorithms=[header["alg"]], audience="authenticated")
+            except JWTError:
+                # The key set is authoritative for its kid, so the auth server would reject this too
+                token_cache.set_rejected(token)
+                raise exception
+            token_cache.set(token, payload, exp=payload.get("exp"))
+            return payload
+
     # Strategy 2: Remote Supabase Verification (Robust fallback)
     # Uses the Supabase Auth API to validate the token. Slower but works without shared secret.
     try:
@@ -38,6 +67,7 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         user = user_response.user
         
         if not user:
+            token_cache.set_rejected(token)
             raise exception
             
         # Construct a payload-like dictionary from the User object
@@ -50,8 +80,21 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             "app_metadata": user.app_metadata,
             "role": user.role,
         }
+        token_cache.set(token, payload, exp=_unverified_exp(token))
         return payload
+    except HTTPException:
+        raise
     except Exception as e:
         # Log the error for debugging purposes (optional, but helpful)
         # print(f"Remote auth validation failed: {e}")
+        # Only remember explicit rejections; transient network errors must not lock users out.
+        if getattr(e, "status", None) in (401, 403):
+            token_cache.set_rejected(token)
         raise exception
+
+def _unverified_exp(token: str):
+    # The token has already been verified remotely; we only need its expiry to bound the cache TTL.
+    try:
+        return jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        return None
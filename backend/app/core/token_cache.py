@@ -0,0 +1,72 @@
+import hashlib
+import os
+import time
+from typing import Any, Dict, Optional
+from app.core.ttl_cache import TTLCache
+
+
+def _hash_token(token: str) -> str:
+    # Never keep raw bearer tokens in memory longer than the request needs them
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class TokenCache(TTLCache):
+    """
+    In-process LRU cache of verified JWT payloads.
+
+    Positive entries expire at the token's own `exp` claim (capped by `max_ttl`),
+    so a cached payload is never served for a token that has already expired.
+    Rejected tokens are remembered for a short `negative_ttl` so that a client
+    retrying with a bad token does not trigger a remote verification each time.
+    """
+
+    def __init__(self, max_size: int = 1024, max_ttl: float = 300.0, negative_ttl: float = 10.0):
+        super().__init__(max_size, ttl=max_ttl)
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.negative_hits = 0
+
+    def get(self, token: str) -> tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Returns (found, payload). A found entry with payload None is a cached rejection.
+        """
+        with self._lock:
+            found, payload = self._lookup(_hash_token(token))
+            if not found:
+                self.misses += 1
+            elif payload is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return found, payload
+
+    def set(self, token: str, payload: Dict[str, Any], exp: Optional[float] = None):
+        ttl = self.max_ttl
+        if exp is not None:
+            # `exp` is wall-clock time; the cache only needs the time remaining
+            ttl = min(ttl, float(exp) - time.time())
+        if ttl <= 0:
+            return
+        self._store(_hash_token(token), payload, ttl)
+
+    def set_rejected(self, token: str):
+        if self.negative_ttl <= 0:
+            return
+        self._store(_hash_token(token), None, self.negative_ttl)
+
+    def clear(self):
+        super().clear()
+        with self._lock:
+            self.negative_hits = 0
+
+    def stats(self) -> Dict[str, int]:
+        stats = super().stats()
+        stats["negative_hits"] = self.negative_hits
+        return stats
+
+
+token_cache = TokenCache(
+    max_size=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "1024")),
+    max_ttl=float(os.getenv("AUTH_TOKEN_CACHE_MAX_TTL", "300")),
+    negative_ttl=float(os.getenv("AUTH_TOKEN_CACHE_NEGATIVE_TTL", "10")),
+)
@@ -1,25 +1,97 @@
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+import asyncio
 import os
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.core import config
-from app.core.database import verify_supabase_connection
+from app.agents.quiz_agent import prewarm_quiz_agent
+from app.agents.web_search import close_search_client, search_cache, start_search_client
+from app.core.circuit_breaker import supabase_breaker
+from app.core.database import get_supabase_client
+from app.core.health import readiness
+from app.core.jwks import get_jwks_cache
+from app.core.llm_telemetry import telemetry_sink
+from app.core.metrics import MetricsMiddleware, registry
+from app.core.query_metrics import QueryCountMiddleware
 from app.core.security import get_current_user
+from app.core.token_cache import token_cache
 from app.api.routers import courses, notes, quiz
+from app.services.quiz_jobs import quiz_job_manager
+from app.services.mock_storage import WriteBehindMockStore, get_mock_store
+from app.services.generation_cache import generation_cache
+from app.services.generation_limiter import generation_limiter
+from app.services.quiz_snapshot import attempt_state_cache, quiz_snapshot_cache
+from app.services.prompt_registry import prompt_registry
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Check for JWT Secret
-    if not os.getenv("SUPABASE_JWT_SECRET"):
+    # Check for JWT Secret (or a JWKS source for asymmetric signing keys). A JWKS cache
+    # exists whenever SUPABASE_URL is set, so whether it has keys is checked once loaded
+    has_jwt_secret = bool(os.getenv("SUPABASE_JWT_SECRET"))
+    if not has_jwt_secret and not get_jwks_cache():
         print("WARNING: SUPABASE_JWT_SECRET is not set. Authentication will fail.")
     
-    # Verify Supabase connection on startup
-    if verify_supabase_connection():
-        print("Backend: Supabase connection verified successfully during startup.")
-    else:
-        print("Backend: Supabase connection verification FAILED during startup.")
+    # Check Supabase in the background so a slow or unreachable database never delays boot;
+    # /readyz reports the result
+    startup_check_task = asyncio.create_task(readiness.run_startup_check())
+
+    # Preload prompt templates in the background (and keep them fresh) so generation
+    # rarely waits on a system_prompts lookup, without blocking boot on the database
+    prompt_refresh_task = asyncio.create_task(prompt_registry.run_background_refresh(get_supabase_client))
+
+    # Keep the JWKS warm so asymmetric tokens verify locally
+    jwks_refresh_task = None
+    jwks = get_jwks_cache()
+    if jwks:
+        jwks_refresh_task = asyncio.create_task(jwks.run_background_refresh(warn_if_empty=not has_jwt_secret))
+
+    # Pooled HTTP client for the agent's search_web tool
+    await start_search_client()
+
+    # Build the quiz agent (pydantic-ai + Google SDK) after startup instead of at import
+    prewarm_task = None
+    if os.getenv("QUIZ_AGENT_PREWARM", "true").lower() in ("1", "true", "yes"):
+        prewarm_task = asyncio.create_task(prewarm_quiz_agent())
+
+    # Background quiz generation workers
+    await quiz_job_manager.start()
+
+    # Periodic write-behind flush of the mock storage fallback
+    mock_store = get_mock_store()
+    mock_flush_task = None
+    if isinstance(mock_store, WriteBehindMockStore):
+        mock_flush_task = asyncio.create_task(mock_store.run_background_flush())
+
     yield
 
+    for task in (startup_check_task, prewarm_task):
+        if task:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    await quiz_job_manager.stop()
+    await close_search_client()
+
+    if mock_flush_task:
+        mock_flush_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await mock_flush_task
+        mock_store.flush()
+
+    # Generations finished just before shutdown may still be queued for the JSONL sink
+    telemetry_sink.flush()
+
+    prompt_refresh_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await prompt_refresh_task
+
+    if jwks_refresh_task:
+        jwks_refresh_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await jwks_refresh_task
+
 app = FastAPI(lifespan=lifespan)
 
 origins = [
@@ -39,6 +111,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(QueryCountMiddleware)
+
+# Outermost, so the measured latency includes CORS and every other middleware
+app.add_middleware(MetricsMiddleware)
+
+registry.register_stats("auth_token_cache", token_cache.stats)
+registry.register_stats("generation_cache", generation_cache.stats)
+registry.register_stats("quiz_jobs", quiz_job_manager.stats)
+registry.register_stats("generation_limiter", generation_limiter.stats)
+registry.register_stats("quiz_snapshot_cache", quiz_snapshot_cache.stats)
+registry.register_stats("attempt_state_cache", attempt_state_cache.stats)
+registry.register_stats("search_cache", search_cache.stats)
+registry.register_stats("prompt_registry", prompt_registry.stats)
+registry.register_stats("supabase_breaker", supabase_breaker.stats)
+registry.register_collector(prompt_registry.render_metrics)
+registry.register_stats("mock_storage", lambda: getattr(get_mock_store(), "stats", dict)())
+
 app.include_router(courses.router, prefix="/api/v1", tags=["courses"])
 app.include_router(notes.router, prefix="/api/v1", tags=["notes"])
 app.include_router(quiz.router, prefix="/api/v1", tags=["quiz"])
@@ -47,6 +136,21 @@ app.include_router(quiz.router, prefix="/api/v1", tags=["quiz"])
 def read_root():
     return {"message": "Hello World"}
 
+@app.get("/healthz", include_in_schema=False)
+def healthz():
+    # Liveness only: the process is up and serving. Dependencies are reported by /readyz.
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    result = await readiness.check()
+    body = {"status": "ready" if result["ready"] else "not ready", **result}
+    return JSONResponse(body, status_code=200 if result["ready"] else 503)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/protected")
 def protected_route(user: dict = Depends(get_current_user)):
     return {"message": "You are authenticated", "user": user}
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 from datetime import datetime
 
@@ -18,6 +18,7 @@ class QuizGenerated(BaseModel):
 class QuizGenerateRequest(BaseModel):
     note_ids: List[str] # Receiving as strings (UUIDs) from JSON
     quiz_length: int = Field(..., description="Number of questions in the quiz (5, 10, 15, 20, 25, 30)")
+    bypass_cache: bool = Field(False, description="Always call the model, even if these notes were generated from before.")
 
     @field_validator('quiz_length')
     @classmethod
@@ -48,6 +49,15 @@ class QuizResponse(BaseModel):
 class QuizUpdateRequest(BaseModel):
     title: str
 
+class QuizJobResponse(BaseModel):
+    job_id: str
+    status: str # queued, running, completed, failed
+    stage: str # queued, running, notes_fetched, model_running, persisting, done, failed
+    quiz: Optional[QuizResponse] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
 class QuizHistoryItem(BaseModel):
     id: str
     title: str
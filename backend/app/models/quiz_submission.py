@@ -41,6 +41,31 @@ class QuizSubmissionResponse(BaseModel):
     feedback_text: str
     explanation: Optional[str] = None
 
+class AnswerSubmission(BaseModel):
+    question_id: str
+    answer_id: str
+
+class QuizBatchSubmissionRequest(BaseModel):
+    attempt_id: str
+    # Answers queued by the client, in the order they were given
+    answers: List[AnswerSubmission] = Field(..., min_length=1, max_length=500)
+
+class BatchAnswerResult(BaseModel):
+    question_id: str
+    answer_id: str
+    accepted: bool
+    is_correct: Optional[bool] = None
+    correct_answer_id: Optional[str] = None
+    feedback_text: Optional[str] = None
+    explanation: Optional[str] = None
+    error: Optional[str] = None
+
+class QuizBatchSubmissionResponse(BaseModel):
+    attempt_id: str
+    accepted: int
+    correct: int
+    results: List[BatchAnswerResult]
+
 class QuizNextRequest(BaseModel):
     attempt_id: str
 
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import math
+import os
+import re
+import time
+from typing import Callable, Dict, List, Tuple
+from app.agents.quiz_agent import generate_quiz_content
+from app.models.quiz import QuizGenerated, QuestionGenerated
+from app.services.prompt_template import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Rough budget of note tokens per model call; larger note sets are split
+CHUNK_TOKEN_BUDGET = int(os.getenv("GENERATION_CHUNK_TOKENS", "12000"))
+CHUNK_CONCURRENCY = int(os.getenv("GENERATION_CHUNK_CONCURRENCY", "3"))
+# Ask each chunk for a few extra questions so deduplication can still fill the quiz
+OVERGENERATION_RATIO = 0.2
+
+
+def _split_oversized(note: str, max_tokens: int) -> List[str]:
+    max_chars = max_tokens * 4
+    pieces: List[str] = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n", note):
+        # A single paragraph larger than the budget is cut at the budget boundary
+        while len(paragraph) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        candidate = f"{current}\n\n{paragraph}" if current else paragraph
+        if len(candidate) > max_chars:
+            pieces.append(current)
+            current = paragraph
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_notes(notes: List[str], max_tokens: int = CHUNK_TOKEN_BUDGET) -> List[str]:
+    """
+    Packs notes into chunks of at most `max_tokens` (estimated), keeping notes whole
+    where possible and splitting oversized notes on paragraph boundaries.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for note in notes:
+        for piece in _split_oversized(note, max_tokens):
+            piece_tokens = estimate_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def limit_chunks(chunks: List[str], max_chunks: int) -> List[str]:
+    """
+    Joins neighbouring chunks so there are at most `max_chunks` of roughly equal size.
+    Every chunk costs a model call and is asked for at least one question, so a large
+    note set must not fan out into more calls than the quiz has questions.
+    """
+    if len(chunks) <= max_chunks:
+        return chunks
+    sizes = [estimate_tokens(c) for c in chunks]
+    total = sum(sizes)
+    groups: List[List[str]] = [[] for _ in range(max_chunks)]
+    position = 0
+    for chunk, size in zip(chunks, sizes):
+        # Each chunk goes to the group covering the middle of its span of the notes
+        groups[min(max_chunks - 1, int((position + size / 2) * max_chunks / total))].append(chunk)
+        position += size
+    return ["\n\n".join(group) for group in groups if group]
+
+
+def allocate_questions(chunks: List[str], quiz_length: int) -> List[int]:
+    """
+    Splits the requested question count across chunks in proportion to their size,
+    with some headroom for deduplication. Every chunk is asked for at least one question.
+    """
+    target = quiz_length + math.ceil(quiz_length * OVERGENERATION_RATIO)
+    sizes = [estimate_tokens(c) for c in chunks]
+    total = sum(sizes)
+    counts = [max(1, math.floor(target * size / total)) for size in sizes]
+    # Hand out the rounding remainder to the largest chunks first
+    for i in sorted(range(len(chunks)), key=lambda i: sizes[i], reverse=True):
+        if sum(counts) >= target:
+            break
+        counts[i] += 1
+    return counts
+
+
+def _question_key(question: QuestionGenerated) -> str:
+    return re.sub(r"[\W_]+", " ", question.question_text.lower()).strip()
+
+
+def merge_questions(per_chunk: List[List[QuestionGenerated]], quiz_length: int) -> List[QuestionGenerated]:
+    """
+    Interleaves chunk results round-robin (so trimming does not drop whole topics),
+    removes duplicate questions and trims to `quiz_length`.
+    """
+    merged: List[QuestionGenerated] = []
+    seen = set()
+    for round_index in range(max((len(q) for q in per_chunk), default=0)):
+        for questions in per_chunk:
+            if round_index >= len(questions):
+                continue
+            question = questions[round_index]
+            key = _question_key(question)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(question)
+    return merged[:quiz_length]
+
+
+async def generate_chunked_quiz(
+    notes: List[str],
+    quiz_length: int,
+    render_prompt: Callable[[str, int], str],
+    max_tokens: int = CHUNK_TOKEN_BUDGET,
+    concurrency: int = CHUNK_CONCURRENCY,
+) -> Tuple[QuizGenerated, List[Dict[str, float]]]:
+    """
+    Map-reduce generation: one model call per note chunk (at most `quiz_length` chunks,
+    `concurrency` calls at once), then merge, deduplicate and trim. If failed chunks or
+    duplicates leave the quiz short, one top-up round asks the failed (else the largest)
+    chunks for the missing questions. Returns the quiz and per-call timings.
+    """
+    chunks = limit_chunks(chunk_notes(notes, max_tokens), quiz_length)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    timings: List[Dict[str, float]] = []
+
+    async def run_chunk(index: int, count: int, timing: Dict[str, float]) -> QuizGenerated:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                return await generate_quiz_content(render_prompt(chunks[index], count))
+            finally:
+                timing.update({
+                    "chunk": index,
+                    "tokens": estimate_tokens(chunks[index]),
+                    "questions_requested": count,
+                    "seconds": round(time.perf_counter() - started, 3),
+                })
+
+    async def run_round(indexes: List[int], counts: List[int], **tags) -> List[Tuple[int, object]]:
+        round_timings = [dict(tags) for _ in indexes]
+        timings.extend(round_timings)
+        results = await asyncio.gather(
+            *[run_chunk(index, count, timing) for index, count, timing in zip(indexes, counts, round_timings)],
+            return_exceptions=True,
+        )
+        for index, result, timing in zip(indexes, results, round_timings):
+            if isinstance(result, Exception):
+                timing["error"] = str(result)
+                logger.warning(f"Quiz generation chunk {index} failed: {result}")
+            else:
+                timing["questions_returned"] = len(result.questions)
+            logger.info(f"Quiz generation chunk timing: {timing}")
+        return list(zip(indexes, results))
+
+    results = await run_round(list(range(len(chunks))), allocate_questions(chunks, quiz_length))
+    successful = [r for _, r in results if not isinstance(r, Exception)]
+    if not successful:
+        # Surface the model error (e.g. 503 overloaded) exactly as a single call would
+        raise next(r for _, r in results if isinstance(r, Exception))
+
+    questions = merge_questions([r.questions for r in successful], quiz_length)
+    missing = quiz_length - len(questions)
+    if missing > 0:
+        failed = [i for i, r in results if isinstance(r, Exception)]
+        by_size = sorted(range(len(chunks)), key=lambda i: estimate_tokens(chunks[i]), reverse=True)
+        indexes = (failed + [i for i in by_size if i not in failed])[:missing]
+        logger.info(f"Chunked quiz is {missing} question(s) short; topping up from chunk(s) {indexes}")
+        topups = await run_round(indexes, allocate_questions([chunks[i] for i in indexes], missing), topup=True)
+        successful += [r for _, r in topups if not isinstance(r, Exception)]
+        questions = merge_questions([r.questions for r in successful], quiz_length)
+        if len(questions) < quiz_length:
+            logger.warning(f"Chunked quiz has {len(questions)} of {quiz_length} questions after topping up")
+
+    return QuizGenerated(title=successful[0].title, questions=questions), timings
+
+
+def summarize_timings(timings: List[Dict[str, float]]) -> Dict[str, float]:
+    """
+    One-line summary of generate_chunked_quiz timings for the caller's log.
+    """
+    return {
+        "calls": len(timings),
+        "failed": sum(1 for t in timings if "error" in t),
+        "topups": sum(1 for t in timings if t.get("topup")),
+        "questions_returned": sum(t.get("questions_returned", 0) for t in timings),
+        "slowest_seconds": max((t.get("seconds", 0.0) for t in timings), default=0.0),
+    }
@@ -0,0 +1,82 @@
+import hashlib
+import os
+import random
+import re
+from typing import Dict, List, Optional
+from app.agents.quiz_agent import shuffle_quiz_options
+from app.core.ttl_cache import TTLCache
+from app.models.quiz import QuizGenerated
+
+
+def _normalize_note(content: str) -> str:
+    # Whitespace-only edits should not force a new LLM call
+    return re.sub(r"\s+", " ", content).strip()
+
+
+def make_generation_key(notes: List[str], template_version: str, model_name: str, quiz_length: int) -> str:
+    """
+    Content address of a generation: identical notes (in any order), prompt template,
+    model and quiz length always map to the same key.
+    """
+    digest = hashlib.sha256()
+    for note in sorted(_normalize_note(n) for n in notes):
+        digest.update(hashlib.sha256(note.encode("utf-8")).digest())
+    digest.update(f"|{template_version}|{model_name}|{quiz_length}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class GenerationCache(TTLCache):
+    """
+    LRU cache of generated question sets with a TTL.
+
+    Entries are stored as deep copies; every hit returns a fresh copy with questions
+    and options reshuffled, so students regenerating from the same notes get a
+    different-looking quiz without another Gemini call.
+
+    Each entry also records how many model calls produced it (one, or one per chunk
+    and top-up for chunked generation), so a hit counts every call it saves.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 86400.0):
+        super().__init__(max_size, ttl=ttl)
+        self.bypassed = 0
+        self.llm_calls_avoided = 0
+
+    def get(self, key: str) -> Optional[QuizGenerated]:
+        entry = super().get(key)
+        if entry is None:
+            return None
+        quiz, model_calls = entry
+        with self._lock:
+            self.llm_calls_avoided += model_calls
+        quiz = quiz.model_copy(deep=True)
+        random.shuffle(quiz.questions)
+        return shuffle_quiz_options(quiz)
+
+    def set(self, key: str, quiz: QuizGenerated, model_calls: int = 1):
+        super().set(key, (quiz.model_copy(deep=True), model_calls))
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self):
+        super().clear()
+        with self._lock:
+            self.bypassed = 0
+            self.llm_calls_avoided = 0
+
+    def stats(self) -> Dict[str, float]:
+        stats = super().stats()
+        stats.update({
+            "bypassed": self.bypassed,
+            "hit_rate": self.hit_rate(),
+            "llm_calls_avoided": self.llm_calls_avoided,
+        })
+        return stats
+
+
+generation_cache = GenerationCache(
+    max_size=int(os.getenv("GENERATION_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("GENERATION_CACHE_TTL", "86400")),
+)
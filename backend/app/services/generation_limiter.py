@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Tuple
+from fastapi import HTTPException
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+llm_generations_active = registry.gauge(
+    "llm_generations_active", "Quiz generations currently holding a model slot."
+)
+llm_generation_queue_depth = registry.gauge(
+    "llm_generation_queue_depth", "Quiz generations waiting for a model slot."
+)
+llm_generation_queue_wait_seconds = registry.histogram(
+    "llm_generation_queue_wait_seconds", "Time spent waiting for a model slot.", ("outcome",)
+)
+llm_generation_rejections_total = registry.counter(
+    "llm_generation_rejections_total", "Quiz generations turned away by admission control.", ("reason",)
+)
+
+
+class GenerationLimiter:
+    """
+    Admission control for model calls: at most `max_concurrent` generations run at
+    once and at most `max_per_user` per user. Others wait in a FIFO queue of at most
+    `max_waiting` entries for up to `wait_timeout` seconds.
+
+    A full queue is rejected immediately with 429 and a Retry-After estimated from
+    recent generation times, so a burst sheds load instead of piling onto an already
+    overloaded model and retrying in lockstep.
+
+    Waiters are plain futures (no asyncio.Semaphore), so the limiter is not bound to
+    the event loop it was first used on.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_per_user: int = 2, max_waiting: int = 32, wait_timeout: float = 30.0):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._active = 0
+        self._active_by_user: Dict[str, int] = {}
+        self._waiters: Deque[Tuple[str, asyncio.Future]] = deque()
+        # Moving average of how long a generation holds its slot, for Retry-After
+        self._avg_hold = 20.0
+
+    def _has_capacity(self, user_id: str) -> bool:
+        return self._active < self.max_concurrent and self._active_by_user.get(user_id, 0) < self.max_per_user
+
+    def _grant(self, user_id: str):
+        self._active += 1
+        self._active_by_user[user_id] = self._active_by_user.get(user_id, 0) + 1
+        llm_generations_active.set(self._active)
+
+    def _release(self, user_id: str):
+        self._active -= 1
+        remaining = self._active_by_user.get(user_id, 1) - 1
+        if remaining > 0:
+            self._active_by_user[user_id] = remaining
+        else:
+            self._active_by_user.pop(user_id, None)
+        llm_generations_active.set(self._active)
+        self._wake()
+
+    def _wake(self):
+        # Grant slots in arrival order, skipping users already at their own limit
+        for entry in list(self._waiters):
+            if self._active >= self.max_concurrent:
+                break
+            user_id, waiter = entry
+            if waiter.done():
+                self._waiters.remove(entry)
+            elif self._has_capacity(user_id):
+                self._waiters.remove(entry)
+                self._grant(user_id)
+                waiter.set_result(None)
+        llm_generation_queue_depth.set(len(self._waiters))
+
+    def retry_after(self) -> int:
+        waves = (len(self._waiters) + 1) / max(self.max_concurrent, 1)
+        return max(1, min(60, math.ceil(self._avg_hold * waves)))
+
+    def _reject(self, reason: str, status_code: int, detail: str):
+        llm_generation_rejections_total.inc(reason=reason)
+        logger.warning(f"Rejected quiz generation ({reason}): {self._active} active, {len(self._waiters)} waiting")
+        raise HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(self.retry_after())})
+
+    async def _acquire(self, user_id: str):
+        if self._has_capacity(user_id):
+            self._grant(user_id)
+            llm_generation_queue_wait_seconds.observe(0.0, outcome="admitted")
+            return
+        if len(self._waiters) >= self.max_waiting:
+            self._reject("queue_full", 429, "Quiz generation is busy. Please try again shortly.")
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (user_id, waiter)
+        self._waiters.append(entry)
+        llm_generation_queue_depth.set(len(self._waiters))
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.wait_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted just as the wait ended
+                if isinstance(e, asyncio.CancelledError):
+                    self._release(user_id)
+                    raise
+            else:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                llm_generation_queue_depth.set(len(self._waiters))
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                llm_generation_queue_wait_seconds.observe(time.monotonic() - started, outcome="timeout")
+                self._reject("timeout", 503, "Quiz generation is busy. Please try again shortly.")
+        llm_generation_queue_wait_seconds.observe(time.monotonic() - started, outcome="admitted")
+
+    @asynccontextmanager
+    async def slot(self, user_id: str):
+        await self._acquire(user_id)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * (time.monotonic() - started)
+            self._release(user_id)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "active": self._active,
+            "waiting": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "avg_hold_seconds": self._avg_hold,
+        }
+
+
+generation_limiter = GenerationLimiter(
+    max_concurrent=int(os.getenv("LLM_MAX_CONCURRENT_GENERATIONS", "8")),
+    max_per_user=int(os.getenv("LLM_MAX_GENERATIONS_PER_USER", "2")),
+    max_waiting=int(os.getenv("LLM_GENERATION_QUEUE_SIZE", "32")),
+    wait_timeout=float(os.getenv("LLM_GENERATION_QUEUE_TIMEOUT", "30")),
+)
@@ -1,37 +1,336 @@
+import asyncio
+import atexit
+import copy
 import json
+import logging
 import os
-from typing import Optional, Dict, Any
+import sqlite3
+import threading
+import time
+from contextlib import suppress
+from typing import Optional, Dict, Any, List, Tuple
 
-MOCK_FILE = os.path.join(os.path.dirname(__file__), "../../tmp/mock_db.json")
+logger = logging.getLogger(__name__)
 
-def _load_db() -> Dict[str, Any]:
-    if not os.path.exists(MOCK_FILE):
-        return {"quizzes": {}, "attempts": {}}
-    try:
-        with open(MOCK_FILE, "r") as f:
-            return json.load(f)
-    except:
-        return {"quizzes": {}, "attempts": {}}
+TMP_DIR = os.path.join(os.path.dirname(__file__), "../../tmp")
+MOCK_DB_PATH = os.getenv("MOCK_DB_PATH", os.path.join(TMP_DIR, "mock_db.sqlite3"))
+# Previous JSON store; imported once into an empty SQLite store
+MOCK_FILE = os.path.join(TMP_DIR, "mock_db.json")
 
-def _save_db(data: Dict[str, Any]):
-    os.makedirs(os.path.dirname(MOCK_FILE), exist_ok=True)
-    with open(MOCK_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+TABLES = ("quizzes", "attempts")
+
+
+class SQLiteMockStore:
+    """
+    Key/value store for fallback quizzes and attempts, one row per record.
+
+    SQLite in WAL mode gives per-record reads and writes through the primary key
+    index, and file locking so concurrent requests (and processes) never lose writes.
+    Each thread gets its own connection. Every write bumps the record's `version`,
+    which lets write-behind callers detect writes from other processes.
+    """
+
+    def __init__(self, path: str, legacy_json_path: Optional[str] = None):
+        self.path = path
+        self.legacy_json_path = legacy_json_path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _ensure_initialized(self) -> sqlite3.Connection:
+        conn = self._connect()
+        if self._initialized:
+            return conn
+        with self._init_lock:
+            if not self._initialized:
+                for table in TABLES:
+                    conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (id TEXT PRIMARY KEY, data TEXT NOT NULL, version INTEGER NOT NULL DEFAULT 0)")
+                    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+                    if "version" not in columns:
+                        # Stores created before records were versioned
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+                self._import_legacy_json(conn)
+                self._initialized = True
+        return conn
+
+    def _import_legacy_json(self, conn: sqlite3.Connection):
+        if not self.legacy_json_path or not os.path.exists(self.legacy_json_path):
+            return
+        if any(conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() for table in TABLES):
+            return
+        try:
+            with open(self.legacy_json_path, "r") as f:
+                legacy = json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not import legacy mock DB {self.legacy_json_path}: {e}")
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in TABLES:
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO {table} (id, data) VALUES (?, ?)",
+                    [(key, json.dumps(record)) for key, record in legacy.get(table, {}).items()]
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info(f"Imported legacy mock DB from {self.legacy_json_path}")
+
+    @staticmethod
+    def _upsert(table: str) -> str:
+        return (
+            f"INSERT INTO {table} (id, data, version) VALUES (?, ?, 1) "
+            f"ON CONFLICT(id) DO UPDATE SET data = excluded.data, version = {table}.version + 1"
+        )
+
+    def put(self, table: str, record_id: str, record: Dict[str, Any]):
+        conn = self._ensure_initialized()
+        conn.execute(self._upsert(table), (record_id, json.dumps(record)))
+
+    def put_many(self, table: str, records: Dict[str, Dict[str, Any]]):
+        self.write_batch({table: records})
+
+    def write_batch(self, batches: Dict[str, Dict[str, Dict[str, Any]]]):
+        """
+        Writes records for several tables in one transaction: either all land or none do.
+        """
+        conn = self._ensure_initialized()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table, records in batches.items():
+                conn.executemany(
+                    self._upsert(table),
+                    [(record_id, json.dumps(record)) for record_id, record in records.items()]
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def write_batch_checked(self, batches: Dict[str, Dict[str, Tuple[Dict[str, Any], Optional[int]]]]) -> List[Tuple[str, str]]:
+        """
+        Like write_batch, but each record comes with the version it replaces (None for
+        a new record). Records whose stored version has moved on since are left as they
+        are and returned as (table, record_id) conflicts.
+        """
+        conn = self._ensure_initialized()
+        conflicts = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table, records in batches.items():
+                for record_id, (record, base_version) in records.items():
+                    row = conn.execute(f"SELECT version FROM {table} WHERE id = ?", (record_id,)).fetchone()
+                    if (row[0] if row else None) != base_version:
+                        conflicts.append((table, record_id))
+                        continue
+                    conn.execute(self._upsert(table), (record_id, json.dumps(record)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return conflicts
+
+    def version(self, table: str, record_id: str) -> Optional[int]:
+        conn = self._ensure_initialized()
+        row = conn.execute(f"SELECT version FROM {table} WHERE id = ?", (record_id,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, table: str, record_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._ensure_initialized()
+        row = conn.execute(f"SELECT data FROM {table} WHERE id = ?", (record_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def count(self, table: str) -> int:
+        conn = self._ensure_initialized()
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+class WriteBehindMockStore:
+    """
+    Write-behind layer in front of a SQLiteMockStore.
+
+    Writes only update memory and mark the record dirty; dirty records are flushed
+    in a single transaction by the background task every `flush_interval` seconds,
+    as soon as `flush_threshold` records are dirty, and once more at shutdown.
+
+    Only records with unflushed writes are held in memory; all other reads go to
+    SQLite, so writes flushed by other processes (uvicorn workers) are seen at once.
+    Each dirty record remembers the stored version it replaces: if another process
+    flushed the same record in the meantime, its copy is kept and this one is dropped
+    (counted in `flush_conflicts`) rather than silently overwriting it.
+    """
+
+    def __init__(self, backing: SQLiteMockStore, flush_interval: float = 5.0, flush_threshold: int = 100):
+        self.backing = backing
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        # table -> record_id -> (record, stored version it replaces)
+        self._dirty: Dict[str, Dict[str, Tuple[Dict[str, Any], Optional[int]]]] = {table: {} for table in TABLES}
+        # Records taken by a flush in progress, so reads still see them
+        self._flushing: Dict[str, Dict[str, Tuple[Dict[str, Any], Optional[int]]]] = {table: {} for table in TABLES}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.flushes = 0
+        self.flushed_records = 0
+        self.flush_errors = 0
+        self.flush_conflicts = 0
+        self.last_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    def _pending(self, table: str, record_id: str):
+        # Called with the lock held
+        return self._dirty[table].get(record_id) or self._flushing[table].get(record_id)
+
+    def get(self, table: str, record_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            pending = self._pending(table, record_id)
+            if pending is not None:
+                return copy.deepcopy(pending[0])
+        return self.backing.get(table, record_id)
+
+    def _base_version(self, table: str, record_id: str) -> Optional[int]:
+        # The stored version that a new write to this record replaces
+        with self._lock:
+            dirty = self._dirty[table].get(record_id)
+            if dirty is not None:
+                return dirty[1]
+            flushing = self._flushing[table].get(record_id)
+            if flushing is not None:
+                # The flush in progress writes the next version
+                return (flushing[1] or 0) + 1
+        return self.backing.version(table, record_id)
+
+    def put(self, table: str, record_id: str, record: Dict[str, Any]):
+        base_version = self._base_version(table, record_id)
+        with self._lock:
+            current = self._dirty[table].get(record_id)
+            # A concurrent put may have dirtied the record meanwhile; keep its base
+            self._dirty[table][record_id] = (copy.deepcopy(record), current[1] if current else base_version)
+            dirty = sum(len(records) for records in self._dirty.values())
+        if self.flush_threshold and dirty >= self.flush_threshold:
+            self._request_flush()
+
+    def dirty_count(self) -> int:
+        with self._lock:
+            return sum(len(records) for records in self._dirty.values())
+
+    def flush(self) -> int:
+        """
+        Writes all dirty records to disk in one transaction. Returns the number written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batches = {table: records for table, records in self._dirty.items() if records}
+                self._flushing = {table: dict(batches.get(table, {})) for table in TABLES}
+                self._dirty = {table: {} for table in TABLES}
+            if not batches:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                conflicts = self.backing.write_batch_checked(batches)
+            except Exception as e:
+                with self._lock:
+                    for table, records in batches.items():
+                        for record_id, entry in records.items():
+                            # Writes made during the flush are newer
+                            self._dirty[table].setdefault(record_id, entry)
+                    self._flushing = {table: {} for table in TABLES}
+                self.flush_errors += 1
+                logger.error(f"Mock storage flush failed, will retry: {e}")
+                raise
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                self._flushing = {table: {} for table in TABLES}
+            if conflicts:
+                self.flush_conflicts += len(conflicts)
+                logger.warning(
+                    f"Mock storage kept {len(conflicts)} record(s) written by another process: "
+                    + ", ".join(f"{table}/{record_id}" for table, record_id in conflicts)
+                )
+
+            written = sum(len(records) for records in batches.values()) - len(conflicts)
+            self.flushes += 1
+            self.flushed_records += written
+            self.last_flush_seconds = elapsed
+            self.total_flush_seconds += elapsed
+            return written
+
+    def _request_flush(self):
+        if self._loop is not None and self._wakeup is not None:
+            # put() may run outside the event loop thread (e.g. in the DB executor)
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        else:
+            # No background flusher running (scripts, tests): flush inline
+            self.flush()
+
+    async def run_background_flush(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                self._wakeup.clear()
+                try:
+                    await asyncio.to_thread(self.flush)
+                except Exception:
+                    pass  # already logged; records stay dirty for the next round
+        finally:
+            self._loop = None
+            self._wakeup = None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "dirty_records": self.dirty_count(),
+            "flushes": self.flushes,
+            "flushed_records": self.flushed_records,
+            "flush_errors": self.flush_errors,
+            "flush_conflicts": self.flush_conflicts,
+            "last_flush_seconds": self.last_flush_seconds,
+            "total_flush_seconds": self.total_flush_seconds,
+        }
+
+
+_store = WriteBehindMockStore(
+    SQLiteMockStore(MOCK_DB_PATH, legacy_json_path=MOCK_FILE),
+    flush_interval=float(os.getenv("MOCK_STORE_FLUSH_INTERVAL", "5")),
+    flush_threshold=int(os.getenv("MOCK_STORE_FLUSH_THRESHOLD", "100")),
+)
+# Last-resort flush for processes that never ran the FastAPI lifespan
+atexit.register(lambda: _store.flush() if isinstance(_store, WriteBehindMockStore) else None)
+
+def get_mock_store():
+    return _store
+
+def set_mock_store(store):
+    global _store
+    _store = store
 
 def save_mock_quiz(quiz_data: Dict[str, Any]):
-    db = _load_db()
-    db["quizzes"][quiz_data["id"]] = quiz_data
-    _save_db(db)
+    _store.put("quizzes", quiz_data["id"], quiz_data)
 
 def get_mock_quiz(quiz_id: str) -> Optional[Dict[str, Any]]:
-    db = _load_db()
-    return db["quizzes"].get(quiz_id)
+    return _store.get("quizzes", quiz_id)
 
 def save_mock_attempt(attempt_data: Dict[str, Any]):
-    db = _load_db()
-    db["attempts"][attempt_data["id"]] = attempt_data
-    _save_db(db)
+    _store.put("attempts", attempt_data["id"], attempt_data)
 
 def get_mock_attempt(attempt_id: str) -> Optional[Dict[str, Any]]:
-    db = _load_db()
-    return db["attempts"].get(attempt_id)
+    return _store.get("attempts", attempt_id)
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Dict, List, Optional
+from supabase import Client
+from app.core.database import execute_async
+from app.services.prompt_template import CompiledTemplate, TemplateError
+
+logger = logging.getLogger(__name__)
+
+QUIZ_PROMPT_KEY = "quiz_generator_v1"
+
+# Used when system_prompts has no row for the key or cannot be reached
+FALLBACK_TEMPLATES = {
+    QUIZ_PROMPT_KEY: (
+        "You are an expert educator. Generate a multiple-choice quiz based on the following notes.\n\n"
+        "Notes:\n{{notes}}\n\n"
+        "Instructions:\n"
+        "1. Generate {{quiz_length}} questions.\n"
+        "2. Focus on definitions, application, and comparison.\n"
+        "3. Each question must have 4 options.\n"
+        "4. Provide the correct answer index (0-3) and a brief explanation.\n"
+        "5. Ensure questions are relevant, accurate, and pedagogical.\n"
+        "6. FACT CHECKING: Use your search tool to verify facts. Ensure questions are correct according to both the notes and general knowledge.\n"
+        "\n"
+        "Output Format: JSON matching the specified schema."
+    ),
+}
+
+# Variables the caller supplies for each key; a stored template must use exactly these
+TEMPLATE_VARIABLES = {
+    QUIZ_PROMPT_KEY: frozenset({"notes", "quiz_length"}),
+}
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    key: str
+    template: str
+    is_fallback: bool = False
+
+    @cached_property
+    def version(self) -> str:
+        # Content-addressed, so an edited row is a new version without any schema support
+        return f"{self.key}:{hashlib.sha256(self.template.encode('utf-8')).hexdigest()[:12]}"
+
+    @cached_property
+    def compiled(self) -> CompiledTemplate:
+        return CompiledTemplate(self.template)
+
+    def validate(self):
+        required = TEMPLATE_VARIABLES.get(self.key)
+        if required is not None:
+            self.compiled.validate(required)
+
+
+class PromptRegistry:
+    """
+    In-process cache of system_prompts templates.
+
+    All templates are loaded at startup and refreshed in the background every
+    `ttl` seconds, so generation never waits on a prompt lookup. A key that is not
+    loaded yet is fetched on demand; a stale entry is served while a refresh runs.
+    Missing keys fall back to the built-in template, re-checked after `fallback_ttl`.
+
+    Templates are compiled and validated when loaded; a row with missing or unknown
+    variables is rejected and the previous (or built-in) template stays in use.
+    """
+
+    def __init__(self, ttl: float = 300.0, fallback_ttl: float = 60.0):
+        self.ttl = ttl
+        self.fallback_ttl = fallback_ttl
+        self._entries: Dict[str, tuple[float, PromptTemplate]] = {}
+        self._lock = threading.Lock()
+        self._refreshing: set = set()
+        self._tasks: set = set()
+        self.loads = 0
+        self.load_errors = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _accept(self, prompt: PromptTemplate) -> bool:
+        try:
+            prompt.validate()
+        except TemplateError as e:
+            self.load_errors += 1
+            logger.error(f"Rejected system prompt {prompt.key} ({prompt.version}): {e}")
+            return False
+        return True
+
+    def _store(self, prompt: PromptTemplate):
+        ttl = self.fallback_ttl if prompt.is_fallback else self.ttl
+        with self._lock:
+            previous = self._entries.get(prompt.key)
+            self._entries[prompt.key] = (time.monotonic() + ttl, prompt)
+        if previous and previous[1].version != prompt.version:
+            logger.info(f"Prompt template {prompt.key} changed: {previous[1].version} -> {prompt.version}")
+
+    def _fallback(self, key: str) -> PromptTemplate:
+        template = FALLBACK_TEMPLATES.get(key)
+        if template is None:
+            raise KeyError(f"No prompt template for {key}")
+        return PromptTemplate(key=key, template=template, is_fallback=True)
+
+    async def load_all(self, supabase: Client) -> int:
+        """
+        Loads every template; returns how many were loaded. Errors keep the current entries.
+        """
+        try:
+            response = await execute_async(supabase.table("system_prompts").select("key, template"))
+        except Exception as e:
+            self.load_errors += 1
+            logger.warning(f"Could not load system prompts: {e}")
+            return 0
+        self.loads += 1
+        rows = [row for row in (response.data or []) if row.get("key") and row.get("template")]
+        loaded = 0
+        for row in rows:
+            prompt = PromptTemplate(key=row["key"], template=row["template"])
+            if self._accept(prompt):
+                self._store(prompt)
+                loaded += 1
+        return loaded
+
+    async def _fetch(self, key: str, supabase: Client) -> PromptTemplate:
+        try:
+            response = await execute_async(supabase.table("system_prompts").select("template").eq("key", key).single())
+            self.loads += 1
+            if response.data and response.data.get("template"):
+                prompt = PromptTemplate(key=key, template=response.data["template"])
+                if self._accept(prompt):
+                    self._store(prompt)
+                    return prompt
+        except Exception as e:
+            self.load_errors += 1
+            logger.warning(f"Could not fetch system prompt {key} (using fallback): {e}")
+
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and not entry[1].is_fallback:
+            # Keep serving the last good template through a failed refresh
+            return entry[1]
+        prompt = self._fallback(key)
+        self._store(prompt)
+        return prompt
+
+    async def _refresh_in_background(self, key: str, supabase: Client):
+        try:
+            await self._fetch(key, supabase)
+        finally:
+            self._refreshing.discard(key)
+
+    async def get(self, key: str, supabase: Client) -> PromptTemplate:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return await self._fetch(key, supabase)
+
+        self.hits += 1
+        expires_at, prompt = entry
+        if expires_at <= time.monotonic() and key not in self._refreshing:
+            self._refreshing.add(key)
+            task = asyncio.create_task(self._refresh_in_background(key, supabase))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return prompt
+
+    def version(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[1].version if entry else None
+
+    def invalidate(self, key: Optional[str] = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        self.invalidate()
+        self.loads = self.load_errors = self.hits = self.misses = 0
+
+    async def run_background_refresh(self, supabase_factory):
+        """
+        Loads every template right away, then again every `ttl` seconds. Runs as a task
+        so an unreachable database never delays startup; until the first load lands,
+        get() fetches templates on a miss.
+        """
+        try:
+            loaded = await self.load_all(supabase_factory())
+            logger.info(f"Preloaded {loaded} prompt template(s)")
+        except Exception as e:
+            logger.warning(f"Prompt templates not preloaded: {e}")
+        while True:
+            await asyncio.sleep(self.ttl)
+            try:
+                await self.load_all(supabase_factory())
+            except Exception as e:
+                logger.warning(f"Prompt template refresh failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            fallbacks = sum(1 for _, prompt in self._entries.values() if prompt.is_fallback)
+            return {
+                "templates": len(self._entries),
+                "fallbacks": fallbacks,
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "load_errors": self.load_errors,
+            }
+
+    def render_metrics(self) -> List[str]:
+        with self._lock:
+            prompts = [prompt for _, prompt in self._entries.values()]
+        lines = ["# TYPE prompt_template_info gauge"]
+        for prompt in prompts:
+            lines.append(f'prompt_template_info{{key="{prompt.key}",version="{prompt.version}",fallback="{str(prompt.is_fallback).lower()}"}} 1')
+        return lines
+
+
+prompt_registry = PromptRegistry(
+    ttl=float(os.getenv("PROMPT_CACHE_TTL", "300")),
+    fallback_ttl=float(os.getenv("PROMPT_FALLBACK_TTL", "60")),
+)
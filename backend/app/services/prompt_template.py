@@ -0,0 +1,81 @@
+import re
+from typing import Any, FrozenSet, Iterable, List, Union
+
+PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def _tokens_for_chars(chars: int) -> int:
+    # ~4 characters per token is close enough for budgeting English prose
+    return chars // 4 + 1
+
+
+def estimate_tokens(text: str) -> int:
+    return _tokens_for_chars(len(text))
+
+
+class _Variable(str):
+    """Marks a parsed placeholder among the literal parts."""
+
+
+class CompiledTemplate:
+    """
+    A prompt template parsed once into literal parts and {{variable}} slots.
+
+    Rendering is a single join over the parts, so each value is copied exactly once
+    and placeholder-like text inside a value (e.g. "{{quiz_length}}" in someone's
+    notes) is never substituted.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self._parts: List[Union[str, _Variable]] = []
+        position = 0
+        for match in PLACEHOLDER.finditer(source):
+            if match.start() > position:
+                self._parts.append(source[position:match.start()])
+            self._parts.append(_Variable(match.group(1)))
+            position = match.end()
+        if position < len(source):
+            self._parts.append(source[position:])
+
+        self.variables: FrozenSet[str] = frozenset(p for p in self._parts if isinstance(p, _Variable))
+        self._static_length = sum(len(p) for p in self._parts if not isinstance(p, _Variable))
+
+    def validate(self, required: Iterable[str]):
+        """
+        Raises TemplateError unless the template uses exactly the `required` variables.
+        """
+        required = frozenset(required)
+        missing = required - self.variables
+        unknown = self.variables - required
+        if missing or unknown:
+            problems = []
+            if missing:
+                problems.append(f"missing {', '.join(sorted(missing))}")
+            if unknown:
+                problems.append(f"unknown {', '.join(sorted(unknown))}")
+            raise TemplateError(f"Invalid prompt template: {'; '.join(problems)}")
+
+    def _values(self, values: dict) -> dict:
+        missing = self.variables - values.keys()
+        if missing:
+            raise TemplateError(f"Missing template variables: {', '.join(sorted(missing))}")
+        return {name: str(values[name]) for name in self.variables}
+
+    def render(self, **values: Any) -> str:
+        strings = self._values(values)
+        return "".join(strings[p] if isinstance(p, _Variable) else p for p in self._parts)
+
+    def rendered_length(self, **values: Any) -> int:
+        strings = self._values(values)
+        return self._static_length + sum(len(strings[p]) for p in self._parts if isinstance(p, _Variable))
+
+    def estimate_tokens(self, **values: Any) -> int:
+        """
+        Token estimate of the rendered prompt, computed without rendering it.
+        """
+        return _tokens_for_chars(self.rendered_length(**values))
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+from fastapi import HTTPException
+from app.core.database import get_supabase_client
+from app.models.quiz import QuizGenerateRequest, QuizJobResponse
+from app.services.quiz_service import generate_quiz
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STAGES = ("done", "failed")
+
+
+class InMemoryJobBackend:
+    """
+    Process-local job queue, job store and event fan-out.
+
+    The manager only talks to the backend through these methods, which map onto
+    Redis primitives (LPUSH/BRPOP, HSET/HGET, PUBLISH/SUBSCRIBE), so a shared
+    backend can replace this one with set_job_backend() when running several workers.
+    """
+
+    def __init__(self, max_queue_size: int = 100):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._events: Dict[str, List[Dict[str, Any]]] = {}
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+
+    def enqueue(self, job_id: str):
+        # Raises asyncio.QueueFull when the queue is at capacity
+        self._queue.put_nowait(job_id)
+
+    async def dequeue(self) -> str:
+        return await self._queue.get()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def save_job(self, job: Dict[str, Any]):
+        self._jobs[job["id"]] = job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    def delete_job(self, job_id: str):
+        self._jobs.pop(job_id, None)
+        self._events.pop(job_id, None)
+        self._wake(job_id)
+
+    def publish(self, job_id: str, event: Dict[str, Any]):
+        self._events.setdefault(job_id, []).append(event)
+        self._wake(job_id)
+
+    def _wake(self, job_id: str):
+        for waiter in self._waiters.pop(job_id, []):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields every event for the job (including those published before subscribing)
+        until a terminal stage is reached or the job is gone.
+        """
+        seen = 0
+        while True:
+            events = self._events.get(job_id, [])
+            while seen < len(events):
+                event = events[seen]
+                seen += 1
+                yield event
+                if event["stage"] in TERMINAL_STAGES:
+                    return
+            job = self._jobs.get(job_id)
+            if job is None or job["stage"] in TERMINAL_STAGES:
+                # Pruned, or finished with its events gone: nothing more will arrive
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(job_id, []).append(waiter)
+            await waiter
+
+
+class QuizJobManager:
+    """
+    Runs quiz generation in the background on a bounded pool of worker tasks.
+    """
+
+    def __init__(self, workers: int = 4, max_jobs_per_user: int = 2, max_queue_size: int = 100, retention: float = 3600.0):
+        self.workers = workers
+        self.max_jobs_per_user = max_jobs_per_user
+        self.max_queue_size = max_queue_size
+        self.retention = retention
+        self.backend = None
+        self._tasks: List[asyncio.Task] = []
+        self._active_by_user: Dict[str, int] = {}
+        self._finished: deque = deque()
+
+    async def start(self):
+        if self.backend is None:
+            self.backend = InMemoryJobBackend(max_queue_size=self.max_queue_size)
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(i)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._active_by_user.clear()
+        self._finished.clear()
+        # The in-process queue is bound to the event loop that is shutting down
+        if isinstance(self.backend, InMemoryJobBackend):
+            self.backend = None
+
+    async def submit(self, request: QuizGenerateRequest, user_id: str) -> Dict[str, Any]:
+        if not self._tasks:
+            raise HTTPException(status_code=503, detail="Quiz generation workers are not running.")
+        self._prune_finished()
+        if self._active_by_user.get(user_id, 0) >= self.max_jobs_per_user:
+            raise HTTPException(status_code=429, detail="Too many quiz generations in progress. Please wait for one to finish.")
+
+        now = datetime.now(timezone.utc)
+        job = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "request": request.model_dump(),
+            "status": "queued",
+            "stage": "queued",
+            "quiz": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self.backend.save_job(job)
+        try:
+            self.backend.enqueue(job["id"])
+        except asyncio.QueueFull:
+            self.backend.delete_job(job["id"])
+            raise HTTPException(status_code=429, detail="Quiz generation queue is full. Please try again shortly.")
+
+        self._active_by_user[user_id] = self._active_by_user.get(user_id, 0) + 1
+        self.backend.publish(job["id"], {"stage": "queued"})
+        return job
+
+    def get_job(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        job = self.backend.get_job(job_id) if self.backend else None
+        if not job or job["user_id"] != user_id:
+            return None
+        return job
+
+    async def events(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streams the job's stage events. If the stream ends without a terminal event
+        (the events were pruned, or a shared backend does not replay events published
+        before subscribing), the final event is rebuilt from the stored job.
+        """
+        async for event in self.backend.subscribe(job_id):
+            yield event
+            if event["stage"] in TERMINAL_STAGES:
+                return
+        job = self.backend.get_job(job_id)
+        if job and job["stage"] in TERMINAL_STAGES:
+            yield _stage_event(job)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": len(self._tasks),
+            "queue_depth": self.backend.queue_depth() if self.backend else 0,
+            "active_jobs": sum(self._active_by_user.values()),
+        }
+
+    def _prune_finished(self):
+        cutoff = time.monotonic() - self.retention
+        while self._finished and self._finished[0][0] < cutoff:
+            _, job_id = self._finished.popleft()
+            self.backend.delete_job(job_id)
+
+    def _set_stage(self, job: Dict[str, Any], stage: str, **fields):
+        job.update(stage=stage, updated_at=datetime.now(timezone.utc), **fields)
+        self.backend.save_job(job)
+        self.backend.publish(job["id"], _stage_event(job))
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job_id = await self.backend.dequeue()
+            job = self.backend.get_job(job_id)
+            if job is None:
+                continue
+            try:
+                await self._run_job(job)
+            except Exception as e:
+                logger.error(f"Quiz job {job_id} crashed in worker {worker_id}: {e}", exc_info=True)
+            finally:
+                user_id = job["user_id"]
+                self._active_by_user[user_id] = max(self._active_by_user.get(user_id, 1) - 1, 0)
+                self._finished.append((time.monotonic(), job_id))
+
+    async def _run_job(self, job: Dict[str, Any]):
+        self._set_stage(job, "running", status="running")
+        try:
+            request = QuizGenerateRequest(**job["request"])
+            quiz = await generate_quiz(
+                request, job["user_id"], get_supabase_client(),
+                progress=lambda stage: self._set_stage(job, stage)
+            )
+            self._set_stage(job, "done", status="completed", quiz=quiz.model_dump())
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else "An unexpected error occurred while generating the quiz."
+            logger.error(f"Quiz job {job['id']} failed: {e}")
+            self._set_stage(job, "failed", status="failed", error=detail)
+
+
+def _stage_event(job: Dict[str, Any]) -> Dict[str, Any]:
+    event = {"stage": job["stage"]}
+    if job["stage"] == "done":
+        event["quiz_id"] = job["quiz"]["id"]
+    elif job["stage"] == "failed":
+        event["error"] = job["error"]
+    return event
+
+
+def to_job_response(job: Dict[str, Any]) -> QuizJobResponse:
+    return QuizJobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        stage=job["stage"],
+        quiz=job["quiz"],
+        error=job["error"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+    )
+
+
+def set_job_backend(backend):
+    quiz_job_manager.backend = backend
+
+
+quiz_job_manager = QuizJobManager(
+    workers=int(os.getenv("QUIZ_JOB_WORKERS", "4")),
+    max_jobs_per_user=int(os.getenv("QUIZ_JOB_MAX_PER_USER", "2")),
+    max_queue_size=int(os.getenv("QUIZ_JOB_QUEUE_SIZE", "100")),
+    retention=float(os.getenv("QUIZ_JOB_RETENTION", "3600")),
+)
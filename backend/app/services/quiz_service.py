@@ -1,126 +1,139 @@
 import logging
+import os
 import uuid
-from typing import List
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from fastapi import HTTPException
 from supabase import Client
-from app.agents.quiz_agent import generate_quiz_content
-from app.models.quiz import QuizGenerateRequest, QuizResponse, QuestionResponse, OptionResponse, QuizHistoryItem
+from app.core.circuit_breaker import never_reached_supabase
+from app.core.database import execute_async, is_missing_function
+from app.agents.quiz_agent import MODEL_NAME, generate_quiz_content
+from app.models.quiz import QuizGenerateRequest, QuestionGenerated, QuizGenerated, QuizResponse, QuestionResponse, OptionResponse, QuizHistoryItem
 
 logger = logging.getLogger(__name__)
 
 from app.services.mock_storage import save_mock_quiz
+from app.services.generation_cache import generation_cache, make_generation_key
+from app.services.quiz_snapshot import attempt_state_cache, invalidate_quiz_snapshot, quiz_snapshot_cache, snapshot_from_response
+from app.services.chunked_generation import CHUNK_TOKEN_BUDGET, generate_chunked_quiz, summarize_timings
+from app.core.llm_telemetry import telemetry_tags
+from app.services.generation_limiter import generation_limiter
+from app.services.prompt_registry import QUIZ_PROMPT_KEY, PromptTemplate, prompt_registry
+
+# Prompts estimated above this are refused outright instead of being chunked into many model calls
+MAX_PROMPT_TOKENS = int(os.getenv("GENERATION_MAX_PROMPT_TOKENS", "400000"))
+
+@dataclass
+class GenerationInputs:
+    course_id: Optional[str]
+    notes: List[str]
+    prompt: PromptTemplate
+
+    @cached_property
+    def full_notes(self) -> str:
+        return "\n\n".join(self.notes)
+
+    @property
+    def template_version(self) -> str:
+        return self.prompt.version
+
+    def render_prompt(self, notes: str, quiz_length: int) -> str:
+        return self.prompt.compiled.render(notes=notes, quiz_length=quiz_length)
+
+    def prompt_tokens(self, quiz_length: int) -> int:
+        """Estimated size of the full prompt, without rendering it."""
+        return self.prompt.compiled.estimate_tokens(notes=self.full_notes, quiz_length=quiz_length)
+
+    def notes_budget(self, quiz_length: int, budget: int) -> int:
+        """Note tokens per chunk so that each rendered chunk prompt stays within `budget`."""
+        overhead = self.prompt.compiled.estimate_tokens(notes="", quiz_length=quiz_length)
+        return max(budget - overhead, budget // 2)
+
+async def load_generation_inputs(request: QuizGenerateRequest, supabase: Client) -> GenerationInputs:
+    """
+    Fetches the selected notes and the prompt template. Raises 400 when there is
+    nothing to generate from and 413 when the prompt would be too large.
+    """
+    # 1. Fetch Notes
+    # request.note_ids is List[str]
+    response = await execute_async(supabase.table("notes").select("content, course_id").in_("id", request.note_ids))
+    notes_data = response.data
+
+    if not notes_data:
+        raise HTTPException(status_code=400, detail="No notes found for selected items.")
+
+    # Determine Course ID from the first note (assuming single-course selection)
+    course_id = notes_data[0].get('course_id') if notes_data else None
+
+    # filter out empty notes
+    valid_notes = [note['content'] for note in notes_data if note.get('content')]
+
+    if not valid_notes:
+        raise HTTPException(status_code=400, detail="Selected notes have empty content.")
+
+    # 2. Prompt Template (cached in-process; falls back to the built-in template)
+    prompt = await prompt_registry.get(QUIZ_PROMPT_KEY, supabase)
+    inputs = GenerationInputs(course_id=course_id, notes=valid_notes, prompt=prompt)
+
+    prompt_tokens = inputs.prompt_tokens(request.quiz_length)
+    if prompt_tokens > MAX_PROMPT_TOKENS:
+        logger.warning(f"Refusing quiz generation: prompt of ~{prompt_tokens} tokens exceeds {MAX_PROMPT_TOKENS}")
+        raise HTTPException(status_code=413, detail="Selected notes are too large to generate a quiz from. Please select fewer notes.")
+    return inputs
+
+async def generate_quiz(request: QuizGenerateRequest, user_id: str, supabase: Client, progress: Optional[Callable[[str], None]] = None) -> QuizResponse:
+    """
+    Generates and persists a quiz. `progress`, if given, is called with the name of
+    each stage as it starts (notes_fetched, model_running, persisting).
+    """
+    def report(stage: str):
+        if progress:
+            progress(stage)
 
-async def generate_quiz(request: QuizGenerateRequest, user_id: str, supabase: Client) -> QuizResponse:
     try:
-        # 1. Fetch Notes
-        # request.note_ids is List[str]
-        response = supabase.table("notes").select("content, course_id").in_("id", request.note_ids).execute()
-        notes_data = response.data
+        inputs = await load_generation_inputs(request, supabase)
+        course_id, valid_notes, full_notes = inputs.course_id, inputs.notes, inputs.full_notes
+        render_prompt, template_version = inputs.render_prompt, inputs.template_version
+        report("notes_fetched")
+
+        # 3. Call AI Agent (unless an identical generation is cached)
+        cache_key = make_generation_key(valid_notes, template_version, MODEL_NAME, request.quiz_length)
+        generated_quiz = None
+        if request.bypass_cache:
+            generation_cache.record_bypass()
+        else:
+            generated_quiz = generation_cache.get(cache_key)
+
+        if generated_quiz is None:
+            report("model_running")
+            model_calls = 1
+            # Admission control: bounded concurrency per process and per user, 429 when saturated
+            async with generation_limiter.slot(user_id):
+                with telemetry_tags(prompt_version=template_version, quiz_length=request.quiz_length):
+                    if inputs.prompt_tokens(request.quiz_length) > CHUNK_TOKEN_BUDGET:
+                        # Large note sets: generate per chunk in parallel, then merge
+                        generated_quiz, timings = await generate_chunked_quiz(
+                            valid_notes, request.quiz_length, render_prompt,
+                            max_tokens=inputs.notes_budget(request.quiz_length, CHUNK_TOKEN_BUDGET),
+                        )
+                        logger.info(f"Chunked generation {cache_key[:12]}: {summarize_timings(timings)}")
+                        model_calls = len(timings)
+                    else:
+                        generated_quiz = await generate_quiz_content(render_prompt(full_notes, request.quiz_length))
+            generation_cache.set(cache_key, generated_quiz, model_calls=model_calls)
+        else:
+            logger.info(f"Reusing cached question set for generation {cache_key[:12]}")
         
-        if not notes_data:
-            raise HTTPException(status_code=400, detail="No notes found for selected items.")
-        
-        # Determine Course ID from the first note (assuming single-course selection)
-        course_id = notes_data[0].get('course_id') if notes_data else None
-
-        # Concatenate notes
-        # filter out empty notes
-        valid_notes = [note['content'] for note in notes_data if note.get('content')]
-        
-        if not valid_notes:
-             raise HTTPException(status_code=400, detail="Selected notes have empty content.")
-             
-        full_notes = "\n\n".join(valid_notes)
-        
-        # 2. Fetch Prompt Template
-        template = None
-        try:
-            prompt_response = supabase.table("system_prompts").select("template").eq("key", "quiz_generator_v1").single().execute()
-            if prompt_response.data:
-                template = prompt_response.data['template']
-        except Exception as e:
-            logger.warning(f"Could not fetch system prompt (using fallback): {e}")
-
-        if not template:
-            # Fallback prompt if DB is empty/fail
-            template = (
-                "You are an expert educator. Generate a multiple-choice quiz based on the following notes.\n\n"
-                "Notes:\n{{notes}}\n\n"
-                "Instructions:\n"
-                "1. Generate {{quiz_length}} questions.\n"
-                "2. Focus on definitions, application, and comparison.\n"
-                "3. Each question must have 4 options.\n"
-                "4. Provide the correct answer index (0-3) and a brief explanation.\n"
-                "5. Ensure questions are relevant, accurate, and pedagogical.\n"
-                "6. FACT CHECKING: Use your search tool to verify facts. Ensure questions are correct according to both the notes and general knowledge.\n"
-                "\n"
-                "Output Format: JSON matching the specified schema."
-            )
-            
-        # 3. Prepare Prompt
-        final_prompt = template.replace("{{notes}}", full_notes).replace("{{quiz_length}}", str(request.quiz_length))
-        
-        # 4. Call AI Agent
-        generated_quiz = await generate_quiz_content(final_prompt)
-        
-        # 5. Persist to DB (with fallback)
+        # 4. Persist to DB (with fallback)
+        report("persisting")
         try:
-            # Create Quiz
-            quiz_data = {
-                "user_id": user_id,
-                "title": generated_quiz.title,
-                "course_id": course_id
-            }
-            
-            quiz_insert = supabase.table("quizzes").insert(quiz_data).execute()
-            if not quiz_insert.data:
-                raise Exception("Failed to insert quiz record")
-            
-            quiz_id = quiz_insert.data[0]['id']
-            
-            questions_response_list = []
-            
-            # Create Questions and Options
-            for q in generated_quiz.questions:
-                question_data = {
-                    "quiz_id": quiz_id,
-                    "question_text": q.question_text,
-                    "correct_answer_index": q.correct_answer_index,
-                    "explanation": q.explanation
-                }
-                q_insert = supabase.table("quiz_questions").insert(question_data).execute()
-                question_id = q_insert.data[0]['id']
-                
-                options_list = []
-                for o_idx, option_text in enumerate(q.options):
-                    option_data = {
-                        "question_id": question_id,
-                        "option_text": option_text,
-                        "option_index": o_idx
-                    }
-                    o_insert = supabase.table("quiz_options").insert(option_data).execute()
-                    o_data = o_insert.data[0]
-                    options_list.append(OptionResponse(
-                        id=o_data['id'],
-                        option_text=o_data['option_text'],
-                        option_index=o_data['option_index']
-                    ))
-                
-                questions_response_list.append(QuestionResponse(
-                    id=question_id,
-                    question_text=q.question_text,
-                    options=options_list,
-                    correct_answer_index=q.correct_answer_index,
-                    explanation=q.explanation
-                ))
-                
-            return QuizResponse(
-                id=quiz_id,
-                title=generated_quiz.title,
-                questions=questions_response_list
-            )
+            return await persist_generated_quiz(generated_quiz, user_id, course_id, supabase)
 
         except Exception as e:
+            # Anything else may have committed already; storing a second copy would duplicate the quiz
+            if not never_reached_supabase(e):
+                raise
             logger.error(f"Database persistence failed (using mock storage): {e}")
             
             # Generate persistent IDs for mock storage
@@ -136,39 +149,8 @@ async def generate_quiz(request: QuizGenerateRequest, user_id: str, supabase: Cl
             }
             
             for q in generated_quiz.questions:
-                temp_q_id = str(uuid.uuid4())
-                options_list = []
-                
-                mock_question = {
-                    "id": temp_q_id,
-                    "question_text": q.question_text,
-                    "correct_answer_index": q.correct_answer_index,
-                    "explanation": q.explanation,
-                    "options": []
-                }
-                
-                for o_idx, option_text in enumerate(q.options):
-                    temp_o_id = str(uuid.uuid4())
-                    opt_resp = OptionResponse(
-                        id=temp_o_id,
-                        option_text=option_text,
-                        option_index=o_idx
-                    )
-                    options_list.append(opt_resp)
-                    mock_question["options"].append({
-                        "id": temp_o_id,
-                        "option_text": option_text,
-                        "option_index": o_idx,
-                        "is_correct": o_idx == q.correct_answer_index # Store correctness locally
-                    })
-                
-                questions_response_list.append(QuestionResponse(
-                    id=temp_q_id,
-                    question_text=q.question_text,
-                    options=options_list,
-                    correct_answer_index=q.correct_answer_index,
-                    explanation=q.explanation
-                ))
+                mock_question, question_response = build_mock_question(q)
+                questions_response_list.append(question_response)
                 mock_quiz["questions"].append(mock_question)
             
             # Save to mock storage
@@ -192,9 +174,165 @@ async def generate_quiz(request: QuizGenerateRequest, user_id: str, supabase: Cl
         # Sanitize error for client
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred while generating the quiz: {str(e)}")
 
+def build_mock_question(q: QuestionGenerated) -> Tuple[Dict[str, Any], QuestionResponse]:
+    """
+    Mock-storage record for a generated question (with locally generated IDs and
+    per-option correctness) and the matching response model.
+    """
+    temp_q_id = str(uuid.uuid4())
+    options_list = []
+    mock_question = {
+        "id": temp_q_id,
+        "question_text": q.question_text,
+        "correct_answer_index": q.correct_answer_index,
+        "explanation": q.explanation,
+        "options": []
+    }
+
+    for o_idx, option_text in enumerate(q.options):
+        temp_o_id = str(uuid.uuid4())
+        options_list.append(OptionResponse(id=temp_o_id, option_text=option_text, option_index=o_idx))
+        mock_question["options"].append({
+            "id": temp_o_id,
+            "option_text": option_text,
+            "option_index": o_idx,
+            "is_correct": o_idx == q.correct_answer_index # Store correctness locally
+        })
+
+    question_response = QuestionResponse(
+        id=temp_q_id,
+        question_text=q.question_text,
+        options=options_list,
+        correct_answer_index=q.correct_answer_index,
+        explanation=q.explanation
+    )
+    return mock_question, question_response
+
+def _build_quiz_response(quiz_id: str, generated_quiz: QuizGenerated, question_ids: List[str], option_ids: List[List[str]]) -> QuizResponse:
+    questions_response_list = []
+    for q, question_id, q_option_ids in zip(generated_quiz.questions, question_ids, option_ids):
+        questions_response_list.append(QuestionResponse(
+            id=question_id,
+            question_text=q.question_text,
+            options=[
+                OptionResponse(id=option_id, option_text=option_text, option_index=o_idx)
+                for o_idx, (option_id, option_text) in enumerate(zip(q_option_ids, q.options))
+            ],
+            correct_answer_index=q.correct_answer_index,
+            explanation=q.explanation
+        ))
+    return QuizResponse(id=quiz_id, title=generated_quiz.title, questions=questions_response_list)
+
+async def _insert_generated_quiz_rpc(generated_quiz: QuizGenerated, user_id: str, course_id: Optional[str], supabase: Client):
+    """
+    Writes the quiz, its questions and options in a single transaction via the
+    create_generated_quiz database function.
+    """
+    questions_payload = [
+        {
+            "question_text": q.question_text,
+            "options": q.options,
+            "correct_answer_index": q.correct_answer_index,
+            "explanation": q.explanation
+        }
+        for q in generated_quiz.questions
+    ]
+    rpc_res = await execute_async(supabase.rpc("create_generated_quiz", {
+        "p_user_id": user_id,
+        "p_course_id": course_id,
+        "p_title": generated_quiz.title,
+        "p_questions": questions_payload
+    }))
+    result = rpc_res.data
+    if not result or not result.get("quiz_id"):
+        raise Exception("create_generated_quiz returned no quiz ID")
+
+    question_ids = [q["id"] for q in result["questions"]]
+    option_ids = [q["option_ids"] for q in result["questions"]]
+    return result["quiz_id"], question_ids, option_ids
+
+async def _insert_generated_quiz_bulk(generated_quiz: QuizGenerated, user_id: str, course_id: Optional[str], supabase: Client):
+    """
+    Writes the quiz in three bulk inserts (quiz, questions, options). If any step fails
+    the quiz row is deleted again, which cascades to anything already inserted.
+    """
+    quiz_insert = await execute_async(supabase.table("quizzes").insert({
+        "user_id": user_id,
+        "title": generated_quiz.title,
+        "course_id": course_id
+    }))
+    if not quiz_insert.data:
+        raise Exception("Failed to insert quiz record")
+    quiz_id = quiz_insert.data[0]['id']
+
+    try:
+        questions_insert = await execute_async(supabase.table("quiz_questions").insert([
+            {
+                "quiz_id": quiz_id,
+                "position": position,
+                "question_text": q.question_text,
+                "correct_answer_index": q.correct_answer_index,
+                "explanation": q.explanation
+            }
+            for position, q in enumerate(generated_quiz.questions)
+        ]))
+        if not questions_insert.data or len(questions_insert.data) != len(generated_quiz.questions):
+            raise Exception("Failed to insert quiz questions")
+        # PostgREST returns bulk-inserted rows in insertion order
+        question_ids = [row['id'] for row in questions_insert.data]
+
+        options_insert = await execute_async(supabase.table("quiz_options").insert([
+            {
+                "question_id": question_id,
+                "option_text": option_text,
+                "option_index": o_idx
+            }
+            for question_id, q in zip(question_ids, generated_quiz.questions)
+            for o_idx, option_text in enumerate(q.options)
+        ]))
+        expected_options = sum(len(q.options) for q in generated_quiz.questions)
+        if not options_insert.data or len(options_insert.data) != expected_options:
+            raise Exception("Failed to insert quiz options")
+
+        option_ids_by_question = {question_id: {} for question_id in question_ids}
+        for row in options_insert.data:
+            option_ids_by_question[row['question_id']][row['option_index']] = row['id']
+        option_ids = [
+            [option_ids_by_question[question_id][o_idx] for o_idx in range(len(q.options))]
+            for question_id, q in zip(question_ids, generated_quiz.questions)
+        ]
+    except Exception:
+        try:
+            await execute_async(supabase.table("quizzes").delete().eq("id", quiz_id))
+        except Exception as cleanup_error:
+            logger.error(f"Failed to clean up partially persisted quiz {quiz_id}: {cleanup_error}")
+        raise
+
+    return quiz_id, question_ids, option_ids
+
+async def persist_generated_quiz(generated_quiz: QuizGenerated, user_id: str, course_id: Optional[str], supabase: Client) -> QuizResponse:
+    """
+    Persists a generated quiz atomically and returns it with all database IDs.
+    Prefers the create_generated_quiz RPC (one round trip, one transaction) and falls
+    back to three bulk inserts only when the function is not deployed; any other
+    failure is raised, since the RPC may have committed before it was reported.
+    """
+    try:
+        quiz_id, question_ids, option_ids = await _insert_generated_quiz_rpc(generated_quiz, user_id, course_id, supabase)
+    except Exception as e:
+        if not is_missing_function(e):
+            raise
+        logger.warning(f"create_generated_quiz RPC not available (using bulk inserts): {e}")
+        quiz_id, question_ids, option_ids = await _insert_generated_quiz_bulk(generated_quiz, user_id, course_id, supabase)
+
+    quiz = _build_quiz_response(quiz_id, generated_quiz, question_ids, option_ids)
+    # The first attempt on a new quiz is served without re-reading what was just written
+    quiz_snapshot_cache.set(snapshot_from_response(quiz))
+    return quiz
+
 async def get_quiz_history(user_id: str, supabase: Client) -> List[QuizHistoryItem]:
     try:
-        response = supabase.table("quizzes").select("id, title, created_at, course_id").eq("user_id", user_id).order("created_at", desc=True).execute()
+        response = await execute_async(supabase.table("quizzes").select("id, title, created_at, course_id").eq("user_id", user_id).order("created_at", desc=True))
         
         if not response.data:
             return []
@@ -221,7 +359,7 @@ async def delete_quiz(quiz_id: str, user_id: str, supabase: Client):
 
         # First, verify the quiz belongs to the user
 
-        response = supabase.table("quizzes").select("id").eq("id", quiz_id).eq("user_id", user_id).single().execute()
+        response = await execute_async(supabase.table("quizzes").select("id").eq("id", quiz_id).eq("user_id", user_id).single())
 
         
 
@@ -231,29 +369,37 @@ async def delete_quiz(quiz_id: str, user_id: str, supabase: Client):
 
 
 
+        invalidate_quiz_snapshot(quiz_id)
+
+
+
         # Manual Cascade Delete (safest fallback if RPC/Cascade missing)
 
         # 1. Get Attempts to delete answers
 
-        attempts_res = supabase.table("quiz_attempts").select("id").eq("quiz_id", quiz_id).execute()
+        attempts_res = await execute_async(supabase.table("quiz_attempts").select("id").eq("quiz_id", quiz_id))
 
         if attempts_res.data:
 
             attempt_ids = [a['id'] for a in attempts_res.data]
 
+            for attempt_id in attempt_ids:
+
+                attempt_state_cache.invalidate(attempt_id)
+
             # 2. Delete Answers
 
-            supabase.table("quiz_answers").delete().in_("attempt_id", attempt_ids).execute()
+            await execute_async(supabase.table("quiz_answers").delete().in_("attempt_id", attempt_ids))
 
             # 3. Delete Attempts
 
-            supabase.table("quiz_attempts").delete().eq("quiz_id", quiz_id).execute()
+            await execute_async(supabase.table("quiz_attempts").delete().eq("quiz_id", quiz_id))
 
 
 
         # 4. Get Questions to delete options
 
-        questions_res = supabase.table("quiz_questions").select("id").eq("quiz_id", quiz_id).execute()
+        questions_res = await execute_async(supabase.table("quiz_questions").select("id").eq("quiz_id", quiz_id))
 
         if questions_res.data:
 
@@ -261,17 +407,17 @@ async def delete_quiz(quiz_id: str, user_id: str, supabase: Client):
 
             # 5. Delete Options
 
-            supabase.table("quiz_options").delete().in_("question_id", question_ids).execute()
+            await execute_async(supabase.table("quiz_options").delete().in_("question_id", question_ids))
 
             # 6. Delete Questions
 
-            supabase.table("quiz_questions").delete().eq("quiz_id", quiz_id).execute()
+            await execute_async(supabase.table("quiz_questions").delete().eq("quiz_id", quiz_id))
 
 
 
         # 7. Delete Quiz
 
-        del_res = supabase.table("quizzes").delete().eq("id", quiz_id).execute()
+        del_res = await execute_async(supabase.table("quizzes").delete().eq("id", quiz_id))
 
         
 
@@ -281,7 +427,7 @@ async def delete_quiz(quiz_id: str, user_id: str, supabase: Client):
 
              # Verify deletion
 
-             check = supabase.table("quizzes").select("id").eq("id", quiz_id).execute()
+             check = await execute_async(supabase.table("quizzes").select("id").eq("id", quiz_id))
 
              if check.data:
 
@@ -303,17 +449,19 @@ async def update_quiz(quiz_id: str, title: str, user_id: str, supabase: Client):
 
         # Verify ownership
 
-        response = supabase.table("quizzes").select("id").eq("id", quiz_id).eq("user_id", user_id).single().execute()
+        response = await execute_async(supabase.table("quizzes").select("id").eq("id", quiz_id).eq("user_id", user_id).single())
 
         if not response.data:
 
             raise HTTPException(status_code=404, detail="Quiz not found or you don't have permission to update it.")
 
+        invalidate_quiz_snapshot(quiz_id)
+
 
 
         # Update
 
-        update_res = supabase.table("quizzes").update({"title": title}).eq("id", quiz_id).execute()
+        update_res = await execute_async(supabase.table("quizzes").update({"title": title}).eq("id", quiz_id))
 
         
 
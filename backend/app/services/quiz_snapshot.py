@@ -0,0 +1,193 @@
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from supabase import Client
+from app.core.circuit_breaker import is_supabase_unavailable
+from app.core.database import execute_async
+from app.core.ttl_cache import TTLCache
+from app.models.quiz import OptionResponse, QuizResponse
+from app.models.quiz_submission import QuestionDisplay
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SnapshotQuestion:
+    id: str
+    question_text: str
+    options: Tuple[OptionResponse, ...]
+    correct_answer_index: Optional[int]
+    explanation: Optional[str]
+
+    def display(self) -> QuestionDisplay:
+        return QuestionDisplay(id=self.id, question_text=self.question_text, options=list(self.options))
+
+    def option_id(self, option_index: Optional[int]) -> Optional[str]:
+        return next((o.id for o in self.options if o.option_index == option_index), None)
+
+
+@dataclass(frozen=True)
+class QuizSnapshot:
+    """
+    Immutable, display-ready view of a quiz: questions in navigation order with
+    options already sorted by option_index.
+    """
+    quiz_id: str
+    title: str
+    questions: Tuple[SnapshotQuestion, ...]
+
+    @property
+    def total_questions(self) -> int:
+        return len(self.questions)
+
+
+def _snapshot_question(question_id, question_text, options, correct_answer_index, explanation) -> SnapshotQuestion:
+    return SnapshotQuestion(
+        id=question_id,
+        question_text=question_text,
+        options=tuple(sorted(options, key=lambda o: o.option_index)),
+        correct_answer_index=correct_answer_index,
+        explanation=explanation,
+    )
+
+
+def build_snapshot(quiz_id: str, title: str, rows: List[Dict[str, Any]]) -> QuizSnapshot:
+    """
+    Builds a snapshot from `quiz_questions` rows joined with `quiz_options(*)`.
+    """
+    rows = sorted(rows, key=lambda r: (r.get('position') or 0, r['id']))
+    questions = tuple(
+        _snapshot_question(
+            row['id'],
+            row['question_text'],
+            [
+                OptionResponse(id=opt['id'], option_text=opt['option_text'], option_index=opt['option_index'])
+                for opt in row.get('quiz_options', [])
+            ],
+            row.get('correct_answer_index'),
+            row.get('explanation'),
+        )
+        for row in rows
+    )
+    return QuizSnapshot(quiz_id=quiz_id, title=title, questions=questions)
+
+
+def snapshot_from_response(quiz: QuizResponse) -> QuizSnapshot:
+    """
+    Builds a snapshot from a freshly persisted quiz, so the first attempt needs no reads.
+    Questions are persisted with `position` in generation order, which is the order here.
+    """
+    return QuizSnapshot(
+        quiz_id=quiz.id,
+        title=quiz.title,
+        questions=tuple(
+            _snapshot_question(q.id, q.question_text, q.options, q.correct_answer_index, q.explanation)
+            for q in quiz.questions
+        ),
+    )
+
+
+class QuizSnapshotCache(TTLCache):
+    """
+    In-process LRU of quiz snapshots. Questions and options never change after
+    generation, but a title edited on another worker only invalidates that worker's
+    copy, so entries also expire after `ttl` seconds.
+    """
+
+    def get(self, quiz_id: str) -> Optional[QuizSnapshot]:
+        return super().get(quiz_id)
+
+    def set(self, snapshot: QuizSnapshot):
+        super().set(snapshot.quiz_id, snapshot)
+
+
+class AttemptStateCache(TTLCache):
+    """
+    Cache of the fields of an attempt that never change (owner and quiz), so ownership
+    checks skip the attempt read. The current question index is deliberately not
+    cached: next/previous on another worker would leave it stale.
+    """
+
+    def get(self, attempt_id: str) -> Optional[Dict[str, Any]]:
+        state = super().get(attempt_id)
+        return dict(state) if state is not None else None
+
+    def set(self, attempt_id: str, user_id: str, quiz_id: str):
+        super().set(attempt_id, {
+            "id": attempt_id,
+            "user_id": user_id,
+            "quiz_id": quiz_id,
+        })
+
+
+async def get_quiz_snapshot(quiz_id: str, supabase: Client) -> Optional[QuizSnapshot]:
+    """
+    Returns the cached snapshot, loading it from the database on a miss.
+    Returns None when the quiz does not exist in the database, and raises when
+    Supabase is unavailable so callers can tell an outage from a missing quiz.
+    Quizzes without questions, or still being streamed (generation_complete false),
+    are returned but not cached.
+    """
+    snapshot = quiz_snapshot_cache.get(quiz_id)
+    if snapshot is not None:
+        return snapshot
+
+    try:
+        quiz_res = await execute_async(supabase.table("quizzes").select("*").eq("id", quiz_id).single())
+    except Exception as e:
+        if is_supabase_unavailable(e):
+            raise
+        return None
+    if not quiz_res.data:
+        return None
+
+    questions_res = await execute_async(supabase.table("quiz_questions").select("*, quiz_options(*)").eq("quiz_id", quiz_id))
+    snapshot = build_snapshot(quiz_id, quiz_res.data['title'], questions_res.data or [])
+    if snapshot.questions and quiz_res.data.get('generation_complete', True):
+        quiz_snapshot_cache.set(snapshot)
+    return snapshot
+
+
+def _question_from_row(row: Dict[str, Any]) -> SnapshotQuestion:
+    return build_snapshot("", "", [row]).questions[0]
+
+
+async def get_question_at(quiz_id: str, index: int, supabase: Client) -> Tuple[Optional[SnapshotQuestion], int]:
+    """
+    Returns (question at `index` or None if out of range, total number of questions).
+    Served from the cached snapshot; on a miss only the one row at `index` is fetched
+    through the (quiz_id, position) index, with the total from an exact count.
+    """
+    snapshot = quiz_snapshot_cache.get(quiz_id)
+    if snapshot is None:
+        try:
+            res = await execute_async(
+                supabase.table("quiz_questions")
+                .select("*, quiz_options(*)", count="exact")
+                .eq("quiz_id", quiz_id)
+                .order("position")
+                .range(index, index)
+            )
+            row = res.data[0] if res.data else None
+            return (_question_from_row(row) if row else None), (res.count or 0)
+        except Exception as e:
+            # e.g. PostgREST rejects a range that starts past the last row
+            logger.info(f"Single-question fetch for quiz {quiz_id} failed, loading full snapshot: {e}")
+            snapshot = await get_quiz_snapshot(quiz_id, supabase)
+            if snapshot is None:
+                return None, 0
+
+    question = snapshot.questions[index] if 0 <= index < snapshot.total_questions else None
+    return question, snapshot.total_questions
+
+
+def invalidate_quiz_snapshot(quiz_id: str):
+    quiz_snapshot_cache.invalidate(quiz_id)
+
+
+quiz_snapshot_cache = QuizSnapshotCache(
+    max_size=int(os.getenv("QUIZ_SNAPSHOT_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("QUIZ_SNAPSHOT_CACHE_TTL", "300")),
+)
+attempt_state_cache = AttemptStateCache(max_size=int(os.getenv("QUIZ_ATTEMPT_CACHE_SIZE", "4096")))
@@ -0,0 +1,224 @@
+import logging
+import uuid
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional
+from fastapi import HTTPException
+from supabase import Client
+from app.core.circuit_breaker import never_reached_supabase
+from app.core.database import execute_async
+from app.core.llm_telemetry import telemetry_tags
+from app.agents.quiz_agent import MODEL_NAME, stream_quiz_content
+from app.models.quiz import QuizGenerateRequest, QuestionGenerated, QuizGenerated, QuizResponse, QuestionResponse, OptionResponse
+from app.services.chunked_generation import CHUNK_TOKEN_BUDGET, generate_chunked_quiz, summarize_timings
+from app.services.generation_cache import generation_cache, make_generation_key
+from app.services.generation_limiter import generation_limiter
+from app.services.mock_storage import save_mock_quiz
+from app.services.quiz_service import build_mock_question, load_generation_inputs
+from app.services.quiz_snapshot import invalidate_quiz_snapshot, quiz_snapshot_cache, snapshot_from_response
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingQuizWriter:
+    """
+    Persists a quiz one question at a time while it is being generated, so the quiz
+    can be started before generation finishes.
+
+    The quiz row is created with the first question and marked generation_complete
+    only by finish(), so no worker caches a snapshot of the partial quiz. If Supabase
+    cannot be reached to create it, the quiz goes to mock storage instead (as in
+    generate_quiz); any other failure aborts the quiz.
+    """
+
+    def __init__(self, user_id: str, course_id: Optional[str], supabase: Client):
+        self.user_id = user_id
+        self.course_id = course_id
+        self.supabase = supabase
+        self.quiz_id: Optional[str] = None
+        self.title: Optional[str] = None
+        self.questions: List[QuestionResponse] = []
+        self.generated: List[QuestionGenerated] = []
+        self._mock_quiz: Optional[Dict[str, Any]] = None
+
+    async def _create_quiz(self, title: str):
+        self.title = title
+        try:
+            quiz_insert = await execute_async(self.supabase.table("quizzes").insert({
+                "user_id": self.user_id,
+                "title": title,
+                "course_id": self.course_id,
+                "generation_complete": False
+            }))
+            if not quiz_insert.data:
+                raise Exception("Failed to insert quiz record")
+            self.quiz_id = quiz_insert.data[0]['id']
+        except Exception as e:
+            if not never_reached_supabase(e):
+                raise
+            logger.error(f"Database persistence failed (using mock storage): {e}")
+            self.quiz_id = str(uuid.uuid4())
+            self._mock_quiz = {"id": self.quiz_id, "user_id": self.user_id, "title": title, "questions": []}
+
+    async def _insert_question(self, position: int, q: QuestionGenerated) -> QuestionResponse:
+        question_insert = await execute_async(self.supabase.table("quiz_questions").insert({
+            "quiz_id": self.quiz_id,
+            "position": position,
+            "question_text": q.question_text,
+            "correct_answer_index": q.correct_answer_index,
+            "explanation": q.explanation
+        }))
+        if not question_insert.data:
+            raise Exception("Failed to insert quiz question")
+        question_id = question_insert.data[0]['id']
+
+        options_insert = await execute_async(self.supabase.table("quiz_options").insert([
+            {"question_id": question_id, "option_text": option_text, "option_index": o_idx}
+            for o_idx, option_text in enumerate(q.options)
+        ]))
+        if not options_insert.data or len(options_insert.data) != len(q.options):
+            raise Exception("Failed to insert quiz options")
+        option_ids = {row['option_index']: row['id'] for row in options_insert.data}
+
+        return QuestionResponse(
+            id=question_id,
+            question_text=q.question_text,
+            options=[
+                OptionResponse(id=option_ids[o_idx], option_text=option_text, option_index=o_idx)
+                for o_idx, option_text in enumerate(q.options)
+            ],
+            correct_answer_index=q.correct_answer_index,
+            explanation=q.explanation
+        )
+
+    async def add(self, title: str, q: QuestionGenerated) -> QuestionResponse:
+        if self.quiz_id is None:
+            await self._create_quiz(title)
+
+        if self._mock_quiz is not None:
+            mock_question, question = build_mock_question(q)
+            self._mock_quiz["questions"].append(mock_question)
+            save_mock_quiz(self._mock_quiz)
+        else:
+            question = await self._insert_question(len(self.questions), q)
+            # A student may already be taking the quiz; drop the partial snapshot
+            invalidate_quiz_snapshot(self.quiz_id)
+
+        self.questions.append(question)
+        self.generated.append(q)
+        return question
+
+    async def finish(self) -> QuizResponse:
+        quiz = QuizResponse(id=self.quiz_id, title=self.title, questions=self.questions)
+        if self._mock_quiz is None:
+            try:
+                await execute_async(self.supabase.table("quizzes").update({"generation_complete": True}).eq("id", self.quiz_id))
+            except Exception as e:
+                # The quiz is usable; its snapshot just won't be cached on other workers
+                logger.error(f"Failed to mark streamed quiz {self.quiz_id} complete: {e}")
+            quiz_snapshot_cache.set(snapshot_from_response(quiz))
+        return quiz
+
+    async def abort(self):
+        if self.quiz_id is None or self._mock_quiz is not None:
+            return
+        try:
+            # Cascades to the questions and options written so far
+            await execute_async(self.supabase.table("quizzes").delete().eq("id", self.quiz_id))
+            invalidate_quiz_snapshot(self.quiz_id)
+        except Exception as e:
+            logger.error(f"Failed to clean up partially streamed quiz {self.quiz_id}: {e}")
+
+
+def _error_detail(e: Exception) -> str:
+    if isinstance(e, HTTPException):
+        return e.detail
+    error_str = str(e)
+    if "503" in error_str or "overloaded" in error_str.lower():
+        return "The AI model is currently overloaded. Please try again in a few moments."
+    return "An unexpected error occurred while generating the quiz."
+
+
+async def stream_quiz_generation(request: QuizGenerateRequest, user_id: str, supabase: Client) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Generates a quiz and yields progress events as each question is persisted:
+
+        {"event": "started"}
+        {"event": "quiz", "quiz_id": ..., "title": ...}
+        {"event": "question", "index": 0, "question": {...}}   (one per question)
+        {"event": "done", "quiz_id": ..., "total_questions": ...}
+
+    Problems found before "started" (no notes, oversized prompt, generation saturated) raise
+    HTTPException so the endpoint can still answer with a status code; later
+    failures are reported as {"event": "error", "detail": ...} and the partial quiz
+    is removed.
+
+    Cached question sets and large note sets (chunked generation) cannot be streamed
+    from the model; they are emitted question by question once generated.
+    """
+    inputs = await load_generation_inputs(request, supabase)
+    cache_key = make_generation_key(inputs.notes, inputs.template_version, MODEL_NAME, request.quiz_length)
+    cached = None
+    if request.bypass_cache:
+        generation_cache.record_bypass()
+    else:
+        cached = generation_cache.get(cache_key)
+
+    writer = StreamingQuizWriter(user_id, inputs.course_id, supabase)
+
+    async def emit(title: str, q: QuestionGenerated):
+        created = writer.quiz_id is None
+        question = await writer.add(title, q)
+        if created:
+            yield {"event": "quiz", "quiz_id": writer.quiz_id, "title": writer.title}
+        yield {"event": "question", "index": len(writer.questions) - 1, "question": question.model_dump()}
+
+    started = completed = False
+    try:
+        if cached is not None:
+            logger.info(f"Reusing cached question set for generation {cache_key[:12]}")
+            started = True
+            yield {"event": "started"}
+            for q in cached.questions:
+                async for event in emit(cached.title, q):
+                    yield event
+        else:
+            model_calls = 1
+            async with generation_limiter.slot(user_id):
+                started = True
+                yield {"event": "started"}
+                with telemetry_tags(prompt_version=inputs.template_version, quiz_length=request.quiz_length):
+                    if inputs.prompt_tokens(request.quiz_length) > CHUNK_TOKEN_BUDGET:
+                        generated, timings = await generate_chunked_quiz(
+                            inputs.notes, request.quiz_length, inputs.render_prompt,
+                            max_tokens=inputs.notes_budget(request.quiz_length, CHUNK_TOKEN_BUDGET),
+                        )
+                        logger.info(f"Chunked generation {cache_key[:12]}: {summarize_timings(timings)}")
+                        model_calls = len(timings)
+                        for q in generated.questions:
+                            async for event in emit(generated.title, q):
+                                yield event
+                    else:
+                        prompt = inputs.render_prompt(inputs.full_notes, request.quiz_length)
+                        # Closed right away if persisting a question fails, ending the model run
+                        async with aclosing(stream_quiz_content(prompt)) as questions:
+                            async for title, q in questions:
+                                async for event in emit(title, q):
+                                    yield event
+            if writer.questions:
+                generation_cache.set(cache_key, QuizGenerated(title=writer.title, questions=writer.generated), model_calls=model_calls)
+
+        if not writer.questions:
+            raise Exception("The model returned no questions")
+        quiz = await writer.finish()
+        completed = True
+        yield {"event": "done", "quiz_id": quiz.id, "total_questions": len(quiz.questions)}
+    except Exception as e:
+        if not isinstance(e, HTTPException):
+            logger.error(f"Streaming quiz generation failed after {len(writer.questions)} questions: {e}", exc_info=True)
+        # Nothing sent yet (e.g. rejected by admission control): the endpoint answers with a status code
+        if not started:
+            raise
+        yield {"event": "error", "detail": _error_detail(e)}
+    finally:
+        if not completed:
+            await writer.abort()
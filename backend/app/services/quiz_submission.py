@@ -1,161 +1,379 @@
 from fastapi import HTTPException
 from supabase import Client
-from app.models.quiz_submission import QuizStartResponse, QuestionDisplay, QuizAttempt, QuizSubmissionRequest, QuizSubmissionResponse, QuizNextRequest, QuizNextResponse, QuizResultResponse, QuizPreviousRequest, QuizPreviousResponse
+from app.core.circuit_breaker import OPEN, CircuitOpenError, is_supabase_unavailable, supabase_breaker
+from app.core.database import execute_async, is_missing_function
+from app.models.quiz_submission import QuizStartResponse, QuestionDisplay, QuizAttempt, QuizSubmissionRequest, QuizSubmissionResponse, QuizBatchSubmissionRequest, QuizBatchSubmissionResponse, BatchAnswerResult, QuizNextRequest, QuizNextResponse, QuizResultResponse, QuizPreviousRequest, QuizPreviousResponse
 from app.models.quiz import OptionResponse
 import logging
+import math
 from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
 import uuid
 from app.services.mock_storage import get_mock_quiz, save_mock_attempt, get_mock_attempt
+from app.services.quiz_snapshot import QuizSnapshot, SnapshotQuestion, attempt_state_cache, get_question_at, get_quiz_snapshot
 
 
-async def submit_answer(quiz_id: str, request: QuizSubmissionRequest, user_id: str, supabase: Client) -> QuizSubmissionResponse:
+def _not_found(detail: str, lookup_error: Optional[BaseException] = None) -> HTTPException:
     """
-    Validates a submitted answer, records it, and returns feedback.
+    404 for a quiz or attempt missing from both the database and mock storage, unless
+    the database lookup never got an answer (`lookup_error` is a circuit rejection or
+    an outage): then 503 with Retry-After, since the row may well exist.
+    """
+    if lookup_error is not None and is_supabase_unavailable(lookup_error):
+        if isinstance(lookup_error, CircuitOpenError):
+            retry_after = max(1, math.ceil(lookup_error.retry_after))
+        else:
+            retry_after = supabase_breaker.retry_after() if supabase_breaker.state == OPEN else 1
+        return HTTPException(
+            status_code=503,
+            detail="The database is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(retry_after)},
+        )
+    return HTTPException(status_code=404, detail=detail)
+
+
+async def _load_snapshot(quiz_id: str, supabase: Client) -> Tuple[Optional[QuizSnapshot], Optional[Exception]]:
+    """
+    Returns (snapshot or None, the error if Supabase was unavailable) for _not_found.
     """
     try:
-        is_mock = False
-        attempt_data = None
-        question_data = None
-        selected_option = None
+        return await get_quiz_snapshot(quiz_id, supabase), None
+    except Exception as e:
+        if not is_supabase_unavailable(e):
+            raise
+        return None, e
+
+
+def _submission_response(is_correct: bool, correct_answer_id: str, explanation: Optional[str]) -> QuizSubmissionResponse:
+    feedback_text = "Correct!" if is_correct else "Incorrect."
+    if explanation:
+        feedback_text += f" {explanation}"
+    return QuizSubmissionResponse(
+        is_correct=is_correct,
+        correct_answer_id=correct_answer_id,
+        feedback_text=feedback_text,
+        explanation=explanation
+    )
+
+def _grade_mock_answer(attempt_data: Dict[str, Any], request: QuizSubmissionRequest) -> QuizSubmissionResponse:
+    mock_quiz = get_mock_quiz(attempt_data['quiz_id'])
+    if not mock_quiz:
+        raise HTTPException(status_code=404, detail="Mock quiz data missing")
+
+    # Find question
+    mock_q = next((q for q in mock_quiz['questions'] if q['id'] == request.question_id), None)
+    if not mock_q:
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    # Find selected option
+    # In mock storage, options are dicts in the question
+    mock_opt = next((o for o in mock_q['options'] if o['id'] == request.answer_id), None)
+    if not mock_opt:
+        raise HTTPException(status_code=400, detail="Invalid answer ID")
+
+    correct_answer_id = next((o['id'] for o in mock_q['options'] if o['is_correct']), "")
+    return _submission_response(mock_opt['is_correct'], correct_answer_id, mock_q.get('explanation'))
+
+async def _grade_answer_rpc(request: QuizSubmissionRequest, user_id: str, supabase: Client) -> Optional[dict]:
+    """
+    Checks ownership, grades and records the answer in one round trip (grade_answer).
+    """
+    res = await execute_async(supabase.rpc("grade_answer", {
+        "p_attempt_id": request.attempt_id,
+        "p_question_id": request.question_id,
+        "p_option_id": request.answer_id,
+        "p_user_id": user_id
+    }))
+    return res.data or None
+
+async def _submit_answer_queries(request: QuizSubmissionRequest, user_id: str, supabase: Client) -> QuizSubmissionResponse:
+    """
+    Same result as grade_answer using plain queries, for databases without the function.
+    """
+    attempt_data = None
+    lookup_error = None
 
-        # 1. Verify Attempt Ownership
-        try:
-            attempt_res = supabase.table("quiz_attempts").select("id, user_id").eq("id", request.attempt_id).single().execute()
-            if attempt_res.data:
-                attempt_data = attempt_res.data
-        except Exception:
-            pass
+    # 1. Verify Attempt Ownership
+    try:
+        attempt_res = await execute_async(supabase.table("quiz_attempts").select("id, user_id").eq("id", request.attempt_id).single())
+        if attempt_res.data:
+            attempt_data = attempt_res.data
+    except Exception as e:
+        lookup_error = e
 
+    if not attempt_data:
+        # Fallback to mock
+        attempt_data = get_mock_attempt(request.attempt_id)
         if not attempt_data:
-            # Fallback to mock
-            attempt_data = get_mock_attempt(request.attempt_id)
-            if attempt_data:
-                is_mock = True
-            else:
-                 raise HTTPException(status_code=404, detail="Quiz attempt not found")
-        
+            raise _not_found("Quiz attempt not found", lookup_error)
         if attempt_data['user_id'] != user_id:
             raise HTTPException(status_code=403, detail="Not authorized for this quiz attempt")
+        return _grade_mock_answer(attempt_data, request)
+
+    if attempt_data['user_id'] != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized for this quiz attempt")
+
+    # 2. Fetch Question and Correct Answer
+    question_res = await execute_async(supabase.table("quiz_questions").select("id, correct_answer_index, explanation").eq("id", request.question_id).single())
+    if not question_res.data:
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    question_db = question_res.data
+    correct_index = question_db.get('correct_answer_index')
+    explanation = question_db.get('explanation')
+
+    # Fetch selected option to verify it exists
+    selected_option_res = await execute_async(supabase.table("quiz_options").select("id, option_index, option_text").eq("id", request.answer_id).single())
+    if not selected_option_res.data:
+         raise HTTPException(status_code=400, detail="Invalid answer ID")
+
+    selected_option = selected_option_res.data
+    is_correct = (selected_option['option_index'] == correct_index)
+
+    # Record
+    answer_data = {
+        "attempt_id": request.attempt_id,
+        "question_id": request.question_id,
+        "selected_option_index": selected_option['option_index'],
+        "is_correct": is_correct
+    }
+    await execute_async(supabase.table("quiz_answers").insert(answer_data))
+
+    # Get correct option ID
+    correct_answer_id = ""
+    if not is_correct:
+         correct_opt_res = await execute_async(supabase.table("quiz_options").select("id").eq("question_id", request.question_id).eq("option_index", correct_index).single())
+         if correct_opt_res.data:
+             correct_answer_id = correct_opt_res.data['id']
+    else:
+        correct_answer_id = request.answer_id
+
+    return _submission_response(is_correct, correct_answer_id, explanation)
 
-        # 2. Fetch Question and Correct Answer
-        if not is_mock:
-            question_res = supabase.table("quiz_questions").select("id, correct_answer_index, explanation").eq("id", request.question_id).single().execute()
-            if not question_res.data:
-                raise HTTPException(status_code=404, detail="Question not found")
-            
-            question_db = question_res.data
-            # Fetch options to get the text? No, we have indices.
-            # Wait, earlier code used 'correct_answer' text. 
-            # But the generator saves 'correct_answer_index'.
-            # Let's assume DB stores index or we need to join.
-            # Simplified: The previous code assumed `correct_answer` column existed as text? 
-            # My create script had `correct_answer_index`.
-            # Let's just use the index from the question data.
-            correct_index = question_db.get('correct_answer_index')
-            explanation = question_db.get('explanation')
-            
-            # Fetch selected option to verify it exists
-            selected_option_res = supabase.table("quiz_options").select("id, option_index, option_text").eq("id", request.answer_id).single().execute()
-            if not selected_option_res.data:
-                 raise HTTPException(status_code=400, detail="Invalid answer ID")
-            
-            selected_option = selected_option_res.data
-            is_correct = (selected_option['option_index'] == correct_index)
-            
-            # Record
-            answer_data = {
-                "attempt_id": request.attempt_id,
-                "question_id": request.question_id,
-                "selected_option_index": selected_option['option_index'],
-                "is_correct": is_correct
-            }
-            supabase.table("quiz_answers").insert(answer_data).execute()
-
-            # Get correct option ID
-            correct_answer_id = ""
-            if not is_correct:
-                 correct_opt_res = supabase.table("quiz_options").select("id").eq("question_id", request.question_id).eq("option_index", correct_index).single().execute()
-                 if correct_opt_res.data:
-                     correct_answer_id = correct_opt_res.data['id']
-            else:
-                correct_answer_id = request.answer_id
+async def submit_answer(quiz_id: str, request: QuizSubmissionRequest, user_id: str, supabase: Client) -> QuizSubmissionResponse:
+    """
+    Validates a submitted answer, records it, and returns feedback.
+    """
+    try:
+        # 1. Grade and record in one call (plain queries if the function is missing).
+        # Other errors are not retried: grade_answer may have committed the answer already.
+        lookup_error = None
+        try:
+            graded = await _grade_answer_rpc(request, user_id, supabase)
+        except CircuitOpenError as e:
+            # Rejected before reaching the database, so nothing was recorded
+            graded, lookup_error = None, e
+        except Exception as e:
+            if not is_missing_function(e):
+                raise
+            logger.warning(f"grade_answer RPC not available (using queries): {e}")
+            return await _submit_answer_queries(request, user_id, supabase)
+
+        if graded is None:
+            # Not in the database: mock storage fallback
+            attempt_data = get_mock_attempt(request.attempt_id)
+            if not attempt_data:
+                raise _not_found("Quiz attempt not found", lookup_error)
+            if attempt_data['user_id'] != user_id:
+                raise HTTPException(status_code=403, detail="Not authorized for this quiz attempt")
+            return _grade_mock_answer(attempt_data, request)
 
-            feedback_text = "Correct!" if is_correct else "Incorrect."
-            if explanation:
-                feedback_text += f" {explanation}"
-                
-            return QuizSubmissionResponse(
-                is_correct=is_correct,
-                correct_answer_id=correct_answer_id,
-                feedback_text=feedback_text,
-                explanation=explanation
-            )
+        if graded['user_id'] != user_id:
+            raise HTTPException(status_code=403, detail="Not authorized for this quiz attempt")
+        if graded.get('error') == "question_not_found":
+            raise HTTPException(status_code=404, detail="Question not found")
+        if graded.get('error') == "invalid_answer":
+            raise HTTPException(status_code=400, detail="Invalid answer ID")
+        
+        return _submission_response(graded['is_correct'], graded.get('correct_answer_id') or "", graded.get('explanation'))
 
-        else:
-            # Mock Logic
+    except Exception as e:
+        logger.error(f"Error submitting answer: {e}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _get_attempt_state(attempt_id: str, supabase: Client, with_index: bool = False):
+    """
+    Returns (attempt_data, is_mock). Owner and quiz of database attempts come from the
+    attempt state cache when possible; with `with_index` the attempt is always read,
+    so current_question_index reflects navigation served by any worker.
+    """
+    if not with_index:
+        attempt_data = attempt_state_cache.get(attempt_id)
+        if attempt_data:
+            return attempt_data, False
+
+    lookup_error = None
+    try:
+        attempt_res = await execute_async(supabase.table("quiz_attempts").select("*").eq("id", attempt_id).single())
+        if attempt_res.data:
+            attempt_data = attempt_res.data
+            attempt_state_cache.set(attempt_id, attempt_data['user_id'], attempt_data['quiz_id'])
+            return attempt_data, False
+    except Exception as e:
+        lookup_error = e
+
+    # Check mock
+    attempt_data = get_mock_attempt(attempt_id)
+    if attempt_data:
+        return attempt_data, True
+    raise _not_found("Quiz attempt not found", lookup_error)
+
+def _grading_from_snapshot(snapshot) -> Dict[str, Dict[str, Any]]:
+    return {
+        q.id: {
+            "options": {o.id: o.option_index for o in q.options},
+            "correct_index": q.correct_answer_index,
+            "correct_answer_id": q.option_id(q.correct_answer_index) or "",
+            "explanation": q.explanation,
+        }
+        for q in snapshot.questions
+    }
+
+def _grading_from_mock(mock_quiz: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    grading = {}
+    for q in mock_quiz.get('questions', []):
+        correct = next((o for o in q['options'] if o['is_correct']), None)
+        grading[q['id']] = {
+            "options": {o['id']: o['option_index'] for o in q['options']},
+            "correct_index": correct['option_index'] if correct else None,
+            "correct_answer_id": correct['id'] if correct else "",
+            "explanation": q.get('explanation'),
+        }
+    return grading
+
+async def submit_answers_batch(quiz_id: str, request: QuizBatchSubmissionRequest, user_id: str, supabase: Client) -> QuizBatchSubmissionResponse:
+    """
+    Grades and records many answers for one attempt: the attempt and quiz are read
+    once (usually from cache) and all answers are inserted in a single bulk write.
+
+    Results are per answer, in request order. Unknown questions or options are
+    reported as not accepted instead of failing the batch; when a question appears
+    more than once only its last answer is recorded.
+    """
+    try:
+        attempt_data, is_mock = await _get_attempt_state(request.attempt_id, supabase)
+        if attempt_data['user_id'] != user_id:
+            raise HTTPException(status_code=403, detail="Not authorized for this quiz attempt")
+        if attempt_data.get('quiz_id') and attempt_data['quiz_id'] != quiz_id:
+            raise HTTPException(status_code=400, detail="Quiz attempt does not belong to this quiz")
+
+        if is_mock:
             mock_quiz = get_mock_quiz(attempt_data['quiz_id'])
             if not mock_quiz:
                 raise HTTPException(status_code=404, detail="Mock quiz data missing")
-            
-            # Find question
-            mock_q = next((q for q in mock_quiz['questions'] if q['id'] == request.question_id), None)
-            if not mock_q:
-                raise HTTPException(status_code=404, detail="Question not found")
-            
-            # Find selected option
-            # In mock storage, options are dicts in the question
-            mock_opt = next((o for o in mock_q['options'] if o['id'] == request.answer_id), None)
-            if not mock_opt:
-                 raise HTTPException(status_code=400, detail="Invalid answer ID")
-            
-            is_correct = mock_opt['is_correct']
-            correct_answer_id = next((o['id'] for o in mock_q['options'] if o['is_correct']), "")
-            
-            feedback_text = "Correct!" if is_correct else "Incorrect."
-            if mock_q.get('explanation'):
-                feedback_text += f" {mock_q['explanation']}"
-                
-            return QuizSubmissionResponse(
-                is_correct=is_correct,
-                correct_answer_id=correct_answer_id,
-                feedback_text=feedback_text,
-                explanation=mock_q.get('explanation')
-            )
+            grading = _grading_from_mock(mock_quiz)
+        else:
+            snapshot, lookup_error = await _load_snapshot(quiz_id, supabase)
+            if snapshot is None:
+                raise _not_found("Quiz not found", lookup_error)
+            grading = _grading_from_snapshot(snapshot)
+
+        # First pass: validate, so a rejected later answer never supersedes a valid one
+        errors = {}
+        last_for_question = {}
+        for i, answer in enumerate(request.answers):
+            question = grading.get(answer.question_id)
+            if question is None:
+                errors[i] = "Question not found"
+            elif answer.answer_id not in question["options"]:
+                errors[i] = "Invalid answer ID"
+            else:
+                last_for_question[answer.question_id] = i
+
+        results = []
+        rows = []
+        for i, answer in enumerate(request.answers):
+            result = BatchAnswerResult(question_id=answer.question_id, answer_id=answer.answer_id, accepted=False)
+            results.append(result)
+            if i in errors:
+                result.error = errors[i]
+                continue
+            question = grading[answer.question_id]
+            if last_for_question[answer.question_id] != i:
+                result.error = "Superseded by a later answer to the same question"
+                continue
+
+            selected_index = question["options"][answer.answer_id]
+            is_correct = selected_index == question["correct_index"]
+            feedback = _submission_response(is_correct, question["correct_answer_id"], question["explanation"])
+            results[-1] = BatchAnswerResult(question_id=answer.question_id, answer_id=answer.answer_id, accepted=True, **feedback.model_dump())
+            rows.append({
+                "attempt_id": request.attempt_id,
+                "question_id": answer.question_id,
+                "selected_option_index": selected_index,
+                "is_correct": is_correct
+            })
+
+        # Mock attempts are graded but not recorded, as in submit_answer
+        if rows and not is_mock:
+            insert_res = await execute_async(supabase.table("quiz_answers").insert(rows))
+            if not insert_res.data or len(insert_res.data) != len(rows):
+                raise HTTPException(status_code=500, detail="Failed to record answers")
+
+        return QuizBatchSubmissionResponse(
+            attempt_id=request.attempt_id,
+            accepted=len(rows),
+            correct=sum(1 for r in results if r.is_correct),
+            results=results
+        )
 
     except Exception as e:
-        logger.error(f"Error submitting answer: {e}")
+        logger.error(f"Error submitting answers: {e}")
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _get_existing_answer(attempt_id: str, question: SnapshotQuestion, supabase: Client):
+    """
+    Returns (existing_answer, selected_option_id) for the latest answer to `question` in the attempt.
+    """
+    # Use limit(1) rather than single() to avoid PGRST116 on duplicates
+    answer_res = await execute_async(supabase.table("quiz_answers").select("*").eq("attempt_id", attempt_id).eq("question_id", question.id).order("created_at", desc=True).limit(1))
+    if not answer_res.data:
+        return None, None
+
+    ans_data = answer_res.data[0]
+    is_correct = ans_data['is_correct']
+    explanation = question.explanation
+
+    feedback_text = "Correct!" if is_correct else "Incorrect."
+    if explanation:
+        feedback_text += f" {explanation}"
+
+    existing_answer = QuizSubmissionResponse(
+        is_correct=is_correct,
+        correct_answer_id=question.option_id(question.correct_answer_index) or "",
+        feedback_text=feedback_text,
+        explanation=explanation
+    )
+    return existing_answer, question.option_id(ans_data['selected_option_index'])
+
 async def start_quiz_attempt(quiz_id: str, user_id: str, supabase: Client) -> QuizStartResponse:
     """
     Initializes a quiz attempt and returns the first question.
     """
     try:
-        quiz_title = ""
         is_mock = False
         mock_quiz_data = None
 
-        # 1. Verify Quiz Exists
-        try:
-            quiz_res = supabase.table("quizzes").select("title, user_id").eq("id", quiz_id).single().execute()
-            if quiz_res.data:
-                quiz_title = quiz_res.data['title']
-        except Exception:
-            pass # Fallback to mock check
+        # 1. Verify Quiz Exists (questions come from the cached snapshot)
+        snapshot, lookup_error = await _load_snapshot(quiz_id, supabase)
             
-        if not quiz_title:
+        if snapshot is None:
             # Check mock storage
             mock_quiz_data = get_mock_quiz(quiz_id)
             if mock_quiz_data:
-                quiz_title = mock_quiz_data['title']
                 is_mock = True
             else:
-                raise HTTPException(status_code=404, detail="Quiz not found")
+                raise _not_found("Quiz not found", lookup_error)
+
+        if not is_mock and not snapshot.questions:
+            raise HTTPException(status_code=404, detail="Quiz has no questions")
 
         # 2. Create Quiz Attempt
         attempt_id = ""
@@ -166,10 +384,11 @@ async def start_quiz_attempt(quiz_id: str, user_id: str, supabase: Client) -> Qu
                 "status": "in_progress",
                 "current_question_index": 0
             }
-            attempt_res = supabase.table("quiz_attempts").insert(attempt_data).execute()
+            attempt_res = await execute_async(supabase.table("quiz_attempts").insert(attempt_data))
             if not attempt_res.data:
                 raise HTTPException(status_code=500, detail="Failed to create quiz attempt")
             attempt_id = attempt_res.data[0]['id']
+            attempt_state_cache.set(attempt_id, user_id, quiz_id)
         else:
             attempt_id = str(uuid.uuid4())
             save_mock_attempt({
@@ -179,36 +398,14 @@ async def start_quiz_attempt(quiz_id: str, user_id: str, supabase: Client) -> Qu
                 "status": "in_progress"
             })
 
-        # 3. Fetch Questions
+        # 3. First Question
         if not is_mock:
-            questions_res = supabase.table("quiz_questions").select("*, quiz_options(*)").eq("quiz_id", quiz_id).execute()
-            if not questions_res.data:
-                 raise HTTPException(status_code=404, detail="Quiz has no questions")
-            
-            questions = questions_res.data
-            # Sort questions? DB doesn't guarantee order unless we have a column.
-            # Using ID or insertion order if consistent.
-            
-            total_questions = len(questions)
-            first_question_data = questions[0]
-
-            # Map Options
-            options = []
-            for opt in first_question_data.get('quiz_options', []):
-                options.append(OptionResponse(
-                    id=opt['id'],
-                    option_text=opt['option_text'],
-                    option_index=opt['option_index']
-                ))
-            options.sort(key=lambda x: x.option_index)
-
-            first_question = QuestionDisplay(
-                id=first_question_data['id'],
-                question_text=first_question_data['question_text'],
-                options=options
-            )
+            quiz_title = snapshot.title
+            total_questions = snapshot.total_questions
+            first_question = snapshot.questions[0].display()
         else:
             # Mock Data
+            quiz_title = mock_quiz_data['title']
             questions = mock_quiz_data['questions']
             if not questions:
                 raise HTTPException(status_code=404, detail="Quiz has no questions")
@@ -250,24 +447,8 @@ async def get_next_question(quiz_id: str, request: QuizNextRequest, user_id: str
     Advances to the next question in the quiz attempt.
     """
     try:
-        is_mock = False
-        attempt_data = None
-        
         # 1. Verify Attempt Ownership
-        try:
-            attempt_res = supabase.table("quiz_attempts").select("*").eq("id", request.attempt_id).single().execute()
-            if attempt_res.data:
-                attempt_data = attempt_res.data
-        except Exception:
-            pass
-
-        if not attempt_data:
-            # Check mock
-            attempt_data = get_mock_attempt(request.attempt_id)
-            if attempt_data:
-                is_mock = True
-            else:
-                raise HTTPException(status_code=404, detail="Quiz attempt not found")
+        attempt_data, is_mock = await _get_attempt_state(request.attempt_id, supabase, with_index=True)
         
         if attempt_data['user_id'] != user_id:
             raise HTTPException(status_code=403, detail="Not authorized for this quiz attempt")
@@ -275,25 +456,19 @@ async def get_next_question(quiz_id: str, request: QuizNextRequest, user_id: str
         current_index = attempt_data.get('current_question_index', 0)
         next_index = current_index + 1
         
-        # 2. Fetch Questions to check total and get next
+        # 2. Get Questions from the snapshot to check total and get next
         if not is_mock:
-            questions_res = supabase.table("quiz_questions").select("*, quiz_options(*)").eq("quiz_id", quiz_id).execute()
-            if not questions_res.data:
+            next_q, total_questions = await get_question_at(quiz_id, next_index, supabase)
+            if not total_questions:
                  raise HTTPException(status_code=404, detail="Quiz has no questions")
             
-            questions = questions_res.data
-            # Ensure deterministic order - sorting by ID for now as a fallback for lack of 'order' column
-            questions.sort(key=lambda x: x['id'])
-            
-            total_questions = len(questions)
-            
             if next_index >= total_questions:
                 # Quiz Completed
-                supabase.table("quiz_attempts").update({
+                await execute_async(supabase.table("quiz_attempts").update({
                     "status": "completed",
                     "end_time": datetime.utcnow().isoformat(),
                     "current_question_index": total_questions # Set to total to indicate end
-                }).eq("id", request.attempt_id).execute()
+                }).eq("id", request.attempt_id))
                 
                 return QuizNextResponse(
                     attempt_id=request.attempt_id,
@@ -304,68 +479,20 @@ async def get_next_question(quiz_id: str, request: QuizNextRequest, user_id: str
                 )
             else:
                 # Next
-                next_q_data = questions[next_index]
-                
                 # Update Attempt
-                supabase.table("quiz_attempts").update({
+                await execute_async(supabase.table("quiz_attempts").update({
                     "current_question_index": next_index
-                }).eq("id", request.attempt_id).execute()
-                
-                # Map Options
-                options = []
-                for opt in next_q_data.get('quiz_options', []):
-                    options.append(OptionResponse(
-                        id=opt['id'],
-                        option_text=opt['option_text'],
-                        option_index=opt['option_index']
-                    ))
-                options.sort(key=lambda x: x.option_index)
-
-                next_question = QuestionDisplay(
-                    id=next_q_data['id'],
-                    question_text=next_q_data['question_text'],
-                    options=options
-                )
+                }).eq("id", request.attempt_id))
                 
                 # Check for existing answer
-                existing_answer = None
-                selected_option_id = None
-                
-                answer_res = supabase.table("quiz_answers").select("*").eq("attempt_id", request.attempt_id).eq("question_id", next_q_data['id']).order("created_at", desc=True).limit(1).execute()
-                
-                if answer_res.data and len(answer_res.data) > 0:
-                    ans_data = answer_res.data[0]
-                    
-                    explanation = next_q_data.get('explanation')
-                    correct_index = next_q_data.get('correct_answer_index')
-                    is_correct = ans_data['is_correct']
-                    
-                    correct_answer_id = ""
-                    correct_opt = next((o for o in options if o.option_index == correct_index), None)
-                    if correct_opt:
-                        correct_answer_id = correct_opt.id
-                    
-                    selected_opt = next((o for o in options if o.option_index == ans_data['selected_option_index']), None)
-                    if selected_opt:
-                        selected_option_id = selected_opt.id
-
-                    feedback_text = "Correct!" if is_correct else "Incorrect."
-                    if explanation:
-                        feedback_text += f" {explanation}"
-
-                    existing_answer = QuizSubmissionResponse(
-                        is_correct=is_correct,
-                        correct_answer_id=correct_answer_id,
-                        feedback_text=feedback_text,
-                        explanation=explanation
-                    )
+                existing_answer, selected_option_id = await _get_existing_answer(request.attempt_id, next_q, supabase)
                 
                 return QuizNextResponse(
                     attempt_id=request.attempt_id,
                     current_question_index=next_index,
                     total_questions=total_questions,
                     is_complete=False,
-                    next_question=next_question,
+                    next_question=next_q.display(),
                     existing_answer=existing_answer,
                     selected_option_id=selected_option_id
                 )
@@ -426,24 +553,8 @@ async def get_previous_question(quiz_id: str, request: QuizPreviousRequest, user
     Navigates to the previous question in the quiz attempt.
     """
     try:
-        is_mock = False
-        attempt_data = None
-        
         # 1. Verify Attempt Ownership
-        try:
-            attempt_res = supabase.table("quiz_attempts").select("*").eq("id", request.attempt_id).single().execute()
-            if attempt_res.data:
-                attempt_data = attempt_res.data
-        except Exception:
-            pass
-
-        if not attempt_data:
-            # Check mock
-            attempt_data = get_mock_attempt(request.attempt_id)
-            if attempt_data:
-                is_mock = True
-            else:
-                raise HTTPException(status_code=404, detail="Quiz attempt not found")
+        attempt_data, is_mock = await _get_attempt_state(request.attempt_id, supabase, with_index=True)
         
         if attempt_data['user_id'] != user_id:
             raise HTTPException(status_code=403, detail="Not authorized for this quiz attempt")
@@ -456,85 +567,27 @@ async def get_previous_question(quiz_id: str, request: QuizPreviousRequest, user
 
         prev_index = current_index - 1
         
-        # 2. Fetch Questions
+        # 2. Get Questions from the snapshot
         if not is_mock:
-            questions_res = supabase.table("quiz_questions").select("*, quiz_options(*)").eq("quiz_id", quiz_id).execute()
-            if not questions_res.data:
+            prev_q, total_questions = await get_question_at(quiz_id, prev_index, supabase)
+            if not total_questions:
                  raise HTTPException(status_code=404, detail="Quiz has no questions")
-            
-            questions = questions_res.data
-            # Ensure deterministic order
-            questions.sort(key=lambda x: x['id'])
-            total_questions = len(questions)
+            if prev_q is None:
+                 raise HTTPException(status_code=404, detail="Question not found")
             
             # Update Attempt
-            supabase.table("quiz_attempts").update({
+            await execute_async(supabase.table("quiz_attempts").update({
                 "current_question_index": prev_index
-            }).eq("id", request.attempt_id).execute()
-            
-            prev_q_data = questions[prev_index]
-            
-            # Map Options
-            options = []
-            for opt in prev_q_data.get('quiz_options', []):
-                options.append(OptionResponse(
-                    id=opt['id'],
-                    option_text=opt['option_text'],
-                    option_index=opt['option_index']
-                ))
-            options.sort(key=lambda x: x.option_index)
-
-            previous_question = QuestionDisplay(
-                id=prev_q_data['id'],
-                question_text=prev_q_data['question_text'],
-                options=options
-            )
+            }).eq("id", request.attempt_id))
             
             # 3. Fetch Existing Answer
-            existing_answer = None
-            selected_option_id = None
-            
-            # We need to find if there's an answer for this question and attempt
-            # Use limit(1) and maybe_single() or just check list to avoid PGRST116 on duplicates
-            answer_res = supabase.table("quiz_answers").select("*").eq("attempt_id", request.attempt_id).eq("question_id", prev_q_data['id']).order("created_at", desc=True).limit(1).execute()
-            
-            if answer_res.data and len(answer_res.data) > 0:
-                ans_data = answer_res.data[0]
-                
-                # Get explanation and correct answer ID from question/options
-                explanation = prev_q_data.get('explanation')
-                correct_index = prev_q_data.get('correct_answer_index')
-                
-                is_correct = ans_data['is_correct']
-                
-                # Get correct option ID
-                correct_answer_id = ""
-                # Re-find correct option ID from options list
-                correct_opt = next((o for o in options if o.option_index == correct_index), None)
-                if correct_opt:
-                    correct_answer_id = correct_opt.id
-                
-                # Get selected option ID
-                selected_opt = next((o for o in options if o.option_index == ans_data['selected_option_index']), None)
-                if selected_opt:
-                    selected_option_id = selected_opt.id
-
-                feedback_text = "Correct!" if is_correct else "Incorrect."
-                if explanation:
-                    feedback_text += f" {explanation}"
-
-                existing_answer = QuizSubmissionResponse(
-                    is_correct=is_correct,
-                    correct_answer_id=correct_answer_id,
-                    feedback_text=feedback_text,
-                    explanation=explanation
-                )
+            existing_answer, selected_option_id = await _get_existing_answer(request.attempt_id, prev_q, supabase)
 
             return QuizPreviousResponse(
                 attempt_id=request.attempt_id,
                 current_question_index=prev_index,
                 total_questions=total_questions,
-                previous_question=previous_question,
+                previous_question=prev_q.display(),
                 existing_answer=existing_answer,
                 selected_option_id=selected_option_id
             )
@@ -584,56 +637,100 @@ async def get_previous_question(quiz_id: str, request: QuizPreviousRequest, user
             raise e
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _attempt_results_rpc(attempt_id: str, user_id: str, supabase: Client) -> Optional[dict]:
+    """
+    Scores the attempt and persists score/end_time in one round trip (get_attempt_results).
+    """
+    res = await execute_async(supabase.rpc("get_attempt_results", {"p_attempt_id": attempt_id, "p_user_id": user_id}))
+    return res.data or None
+
+async def _attempt_results_queries(quiz_id: str, attempt_id: str, user_id: str, supabase: Client) -> Optional[dict]:
+    """
+    Same result as get_attempt_results using plain queries, for databases without the function.
+    Returns None when the attempt does not exist; errors that mean Supabase is
+    unavailable are raised so the caller does not report a missing attempt.
+    """
+    try:
+        attempt_res = await execute_async(supabase.table("quiz_attempts").select("*").eq("id", attempt_id).single())
+    except Exception as e:
+        if is_supabase_unavailable(e):
+            raise
+        return None
+    attempt_data = attempt_res.data
+    if not attempt_data:
+        return None
+    if attempt_data['user_id'] != user_id:
+        return {"user_id": attempt_data['user_id']}
+
+    q_count_res = await execute_async(supabase.table("quiz_questions").select("id", count="exact").eq("quiz_id", quiz_id))
+    total_questions = q_count_res.count or 0
+
+    # Only the latest answer per question counts
+    answers_res = await execute_async(supabase.table("quiz_answers").select("question_id, is_correct").eq("attempt_id", attempt_id).order("created_at", desc=True))
+    latest = {}
+    for row in answers_res.data or []:
+        latest.setdefault(row['question_id'], row['is_correct'])
+    score = sum(1 for is_correct in latest.values() if is_correct)
+
+    end_time = attempt_data.get('end_time') or datetime.utcnow().isoformat()
+    await execute_async(supabase.table("quiz_attempts").update({"score": score, "end_time": end_time}).eq("id", attempt_id))
+
+    return {
+        "user_id": attempt_data['user_id'],
+        "quiz_id": attempt_data['quiz_id'],
+        "score": score,
+        "total_questions": total_questions,
+        "end_time": end_time
+    }
+
 async def get_quiz_results(quiz_id: str, attempt_id: str, user_id: str, supabase: Client) -> QuizResultResponse:
     """
     Calculates and returns the final score for a completed quiz attempt.
     """
     try:
-        # 1. Verify Attempt
-        attempt_res = supabase.table("quiz_attempts").select("*").eq("id", attempt_id).single().execute()
-        if not attempt_res.data:
-             # Mock check?
-             mock = get_mock_attempt(attempt_id)
-             if not mock:
-                raise HTTPException(status_code=404, detail="Quiz attempt not found")
-             attempt_data = mock
-        else:
-            attempt_data = attempt_res.data
+        # 1. Score and persist the attempt in one call (plain queries if the function is missing)
+        lookup_error = None
+        try:
+            results = await _attempt_results_rpc(attempt_id, user_id, supabase)
+        except CircuitOpenError as e:
+            results, lookup_error = None, e
+        except Exception as e:
+            if not is_missing_function(e):
+                raise
+            logger.warning(f"get_attempt_results RPC not available (using queries): {e}")
+            try:
+                results = await _attempt_results_queries(quiz_id, attempt_id, user_id, supabase)
+            except Exception as query_error:
+                if not is_supabase_unavailable(query_error):
+                    raise
+                results, lookup_error = None, query_error
+
+        if results is None:
+            # Mock check
+            mock = get_mock_attempt(attempt_id)
+            if not mock:
+                raise _not_found("Quiz attempt not found", lookup_error)
+            mock_quiz = get_mock_quiz(mock['quiz_id'])
+            results = {
+                "user_id": mock['user_id'],
+                "score": 0,
+                "total_questions": len(mock_quiz.get('questions', [])) if mock_quiz else 0,
+                "end_time": mock.get('end_time')
+            }
 
-        if attempt_data['user_id'] != user_id:
+        if results['user_id'] != user_id:
             raise HTTPException(status_code=403, detail="Not authorized to view these results")
             
-        # 2. Calculate Score
-        total_questions = 0
-        score = 0
+        score = results['score']
+        total_questions = results['total_questions']
         
-        if "mock" in attempt_id or not attempt_res.data: # Simple mock detection
-             # Mock logic
-             mock_quiz = get_mock_quiz(attempt_data['quiz_id'])
-             if mock_quiz:
-                 total_questions = len(mock_quiz.get('questions', []))
-                 pass
-        else:
-            # Real DB logic
-            # Get total questions for this quiz
-            q_count_res = supabase.table("quiz_questions").select("id", count="exact").eq("quiz_id", quiz_id).execute()
-            total_questions = q_count_res.count
-
-            # Get correct answers count
-            score_res = supabase.table("quiz_answers").select("id", count="exact").eq("attempt_id", attempt_id).eq("is_correct", True).execute()
-            score = score_res.count
-
-        # Calculate percentage
+        # 2. Calculate percentage
         percentage = 0.0
         if total_questions > 0:
             percentage = (score / total_questions) * 100.0
             percentage = round(percentage, 1)
 
-        # 3. Update Score in Attempt (if not already)
-        if attempt_res.data and attempt_res.data.get('score') is None:
-             supabase.table("quiz_attempts").update({"score": score}).eq("id", attempt_id).execute()
-
-        completed_at_str = attempt_data.get('end_time')
+        completed_at_str = results.get('end_time')
         completed_at = datetime.fromisoformat(completed_at_str) if completed_at_str else datetime.utcnow()
 
         return QuizResultResponse(
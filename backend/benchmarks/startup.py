@@ -0,0 +1,70 @@
+"""
+Startup benchmark: how long a fresh worker takes to import the app and to answer
+its first request.
+
+Each run is a new interpreter, so nothing is shared between samples. Compare with
+`--eager`, which builds the quiz agent during startup the way the app used to.
+
+    cd backend
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --runs 5 --eager
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+if {eager}:
+    from app.agents.quiz_agent import get_quiz_agent
+    get_quiz_agent()
+import app.main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    client.get("/")
+    first_request = time.perf_counter()
+print(json.dumps({{
+    "import_s": imported - started,
+    "first_request_s": first_request - started,
+    "pydantic_ai_loaded_at_import": "pydantic_ai" in sys.modules,
+}}))
+"""
+
+
+def sample(eager: bool) -> dict:
+    env = {**os.environ, "PYTHONPATH": str(BACKEND_DIR), "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "benchmark")}
+    if not eager:
+        # Measure the worker itself, not the background prewarm racing it
+        env.setdefault("QUIZ_AGENT_PREWARM", "false")
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(eager=eager)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--eager", action="store_true", help="build the quiz agent at startup (previous behaviour)")
+    args = parser.parse_args()
+
+    samples = [sample(args.eager) for _ in range(args.runs)]
+    mode = "eager agent" if args.eager else "lazy agent"
+    print(f"{mode}, {args.runs} runs")
+    for key in ("import_s", "first_request_s"):
+        values = [s[key] for s in samples]
+        print(f"  {key:<16} median {statistics.median(values):.3f}s  min {min(values):.3f}s  max {max(values):.3f}s")
+    print(f"  pydantic-ai imported with app.main: {samples[0]['pydantic_ai_loaded_at_import']}")
+
+
+if __name__ == "__main__":
+    main()
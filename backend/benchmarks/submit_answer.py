@@ -0,0 +1,108 @@
+"""
+submit_answer latency: one grade_answer RPC versus the plain-query path
+(attempt, question, selected option, insert, correct option).
+
+Against a real database (records one answer per sample, so use a throwaway attempt):
+
+    cd backend
+    python benchmarks/submit_answer.py --attempt <id> --question <id> --option <id> --user <id> --runs 200
+
+Without a database, each round trip is simulated with a fixed delay plus jitter:
+
+    python benchmarks/submit_answer.py --simulate-ms 40 --runs 200
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.models.quiz_submission import QuizSubmissionRequest  # noqa: E402
+from app.services.quiz_submission import _submit_answer_queries, submit_answer  # noqa: E402
+
+
+class _SimulatedQuery:
+    def __init__(self, delay: float, data):
+        self._delay = delay
+        self._data = data
+
+    def __getattr__(self, name):
+        # select/eq/single/insert/...: every builder call returns the same query
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        time.sleep(self._delay * random.uniform(0.8, 1.5))
+        return SimpleNamespace(data=self._data, count=None)
+
+
+class SimulatedSupabase:
+    """
+    Answers every query after `delay` seconds, like a database one round trip away.
+    """
+
+    def __init__(self, delay: float, request: QuizSubmissionRequest, user_id: str):
+        self.delay = delay
+        self.rows = {
+            "quiz_attempts": {"id": request.attempt_id, "user_id": user_id},
+            "quiz_questions": {"id": request.question_id, "correct_answer_index": 1, "explanation": "Simulated."},
+            "quiz_options": {"id": request.answer_id, "option_index": 0, "option_text": "A"},
+            "quiz_answers": [{"id": "answer"}],
+        }
+        self.graded = {"user_id": user_id, "is_correct": False, "correct_answer_id": "correct-option", "explanation": "Simulated."}
+
+    def table(self, name):
+        return _SimulatedQuery(self.delay, self.rows[name])
+
+    def rpc(self, name, params):
+        return _SimulatedQuery(self.delay, self.graded)
+
+
+def percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def measure(label: str, submit, runs: int):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await submit()
+        samples.append((time.perf_counter() - started) * 1000)
+    print(
+        f"  {label:<8} p50 {statistics.median(samples):7.1f}ms  p95 {percentile(samples, 0.95):7.1f}ms"
+        f"  p99 {percentile(samples, 0.99):7.1f}ms  max {max(samples):7.1f}ms"
+    )
+    return samples
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--simulate-ms", type=float, help="simulated round-trip time instead of a real database")
+    parser.add_argument("--attempt", default="00000000-0000-0000-0000-000000000001")
+    parser.add_argument("--question", default="00000000-0000-0000-0000-000000000002")
+    parser.add_argument("--option", default="00000000-0000-0000-0000-000000000003")
+    parser.add_argument("--user", default="00000000-0000-0000-0000-000000000004")
+    args = parser.parse_args()
+
+    request = QuizSubmissionRequest(attempt_id=args.attempt, question_id=args.question, answer_id=args.option)
+    if args.simulate_ms is not None:
+        supabase = SimulatedSupabase(args.simulate_ms / 1000, request, args.user)
+        print(f"simulated round trip ~{args.simulate_ms:g}ms, {args.runs} runs")
+    else:
+        from app.core.database import get_supabase_client
+        supabase = get_supabase_client()
+        print(f"live database, {args.runs} runs")
+
+    rpc = await measure("rpc", lambda: submit_answer("", request, args.user, supabase), args.runs)
+    queries = await measure("queries", lambda: _submit_answer_queries(request, args.user, supabase), args.runs)
+    print(f"  p95 speedup: {percentile(queries, 0.95) / percentile(rpc, 0.95):.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
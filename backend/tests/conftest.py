@@ -0,0 +1,46 @@
+import pytest
+from app.services.quiz_snapshot import attempt_state_cache, quiz_snapshot_cache
+
+@pytest.fixture(autouse=True)
+def clear_quiz_navigation_caches():
+    # Many tests reuse IDs like "quiz-1" with different mocked data
+    quiz_snapshot_cache.clear()
+    attempt_state_cache.clear()
+    yield
+    quiz_snapshot_cache.clear()
+    attempt_state_cache.clear()
+
+@pytest.fixture(autouse=True)
+def disable_llm_telemetry_sink(monkeypatch):
+    # Keep test generations out of the developer's telemetry file
+    from app.core.llm_telemetry import telemetry_sink
+    monkeypatch.setattr(telemetry_sink, "path", "")
+
+@pytest.fixture(autouse=True)
+def clear_search_cache():
+    from app.agents.web_search import search_cache
+    search_cache.clear()
+    yield
+    search_cache.clear()
+
+@pytest.fixture(autouse=True)
+def clear_prompt_registry():
+    # Tests mock system_prompts with different templates
+    from app.services.prompt_registry import prompt_registry
+    prompt_registry.clear()
+    yield
+    prompt_registry.clear()
+
+@pytest.fixture(autouse=True)
+def reset_readiness():
+    from app.core.health import readiness
+    readiness.reset()
+    yield
+    readiness.reset()
+
+@pytest.fixture(autouse=True)
+def reset_supabase_breaker():
+    from app.core.circuit_breaker import supabase_breaker
+    supabase_breaker.reset()
+    yield
+    supabase_breaker.reset()
@@ -0,0 +1,80 @@
+import asyncio
+import time
+import httpx
+import pytest
+from jose import jwt
+from postgrest.exceptions import APIError
+from app.main import app
+from app.core.database import execute_async
+
+QUERY_LATENCY = 0.02
+
+class SlowQuery:
+    """
+    Minimal PostgREST query builder stand-in whose execute() blocks like a real HTTP round trip.
+    """
+    def __init__(self, table):
+        self.table = table
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        time.sleep(QUERY_LATENCY)
+        data = {
+            "quiz_attempts": {"id": "attempt-1", "user_id": "user-1"},
+            "quiz_questions": {"id": "q1", "correct_answer_index": 0, "explanation": "Exp"},
+            "quiz_options": {"id": "opt1", "option_index": 0, "option_text": "A"},
+        }.get(self.table, [])
+        return type("Response", (), {"data": data, "count": None})()
+
+class SlowClient:
+    def table(self, name):
+        return SlowQuery(name)
+
+    def rpc(self, name, params):
+        # Like a database without the grade_answer migration, so answers use plain queries
+        raise APIError({"message": f"Could not find the function public.{name}", "code": "PGRST202"})
+
+@pytest.mark.asyncio
+async def test_execute_async_does_not_block_event_loop():
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    await execute_async(SlowQuery("quizzes"))
+    task.cancel()
+    # A blocking execute() would have starved the ticker completely
+    assert ticks >= 1
+
+async def _run_answers(client, headers, concurrency):
+    payload = {"attempt_id": "attempt-1", "question_id": "q1", "answer_id": "opt1"}
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[
+        client.post("/api/v1/quiz/quiz-1/answer", json=payload, headers=headers)
+        for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses)
+    return concurrency / elapsed
+
+@pytest.mark.asyncio
+async def test_answer_throughput_scales_with_concurrency(monkeypatch):
+    secret = "testsecret"
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", secret)
+    token = jwt.encode({"sub": "user-1", "aud": "authenticated"}, secret, algorithm="HS256")
+    headers = {"Authorization": f"Bearer {token}"}
+    monkeypatch.setattr("app.api.routers.quiz.get_supabase_client", lambda: SlowClient())
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        serial_throughput = await _run_answers(client, headers, 1)
+        concurrent_throughput = await _run_answers(client, headers, 8)
+
+    # Eight concurrent quiz takers should not be serialized behind one another
+    assert concurrent_throughput > serial_throughput * 3
@@ -0,0 +1,158 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.models.quiz import QuizGenerateRequest, QuizGenerated, QuestionGenerated, QuizResponse
+from app.services.chunked_generation import (
+    allocate_questions,
+    chunk_notes,
+    estimate_tokens,
+    generate_chunked_quiz,
+    limit_chunks,
+    merge_questions,
+    summarize_timings,
+)
+from app.services.generation_cache import generation_cache
+from app.services.quiz_service import generate_quiz
+
+def _question(text):
+    return QuestionGenerated(question_text=text, options=["A", "B", "C", "D"], correct_answer_index=0, explanation="Exp")
+
+def _render(notes, quiz_length):
+    return f"{quiz_length}|{notes}"
+
+def test_chunk_notes_respects_budget():
+    notes = ["a" * 400, "b" * 400, "c" * 400]
+    chunks = chunk_notes(notes, max_tokens=150)
+    assert len(chunks) == 3
+    assert all(estimate_tokens(c) <= 150 for c in chunks)
+
+    # Small notes are packed together
+    assert chunk_notes(["x" * 40, "y" * 40], max_tokens=250) == ["x" * 40 + "\n\n" + "y" * 40]
+
+def test_chunk_notes_splits_oversized_note():
+    note = "\n\n".join(["p" * 300] * 4) + "\n\n" + "q" * 1000
+    chunks = chunk_notes([note], max_tokens=100)
+    assert all(len(c) <= 400 for c in chunks)
+    assert "".join(chunks).replace("\n", "") == note.replace("\n", "")
+
+def test_allocate_questions_is_proportional_with_headroom():
+    counts = allocate_questions(["a" * 3000, "b" * 1000], quiz_length=10)
+    assert sum(counts) == 12
+    assert counts[0] > counts[1] >= 1
+
+def test_limit_chunks_joins_neighbours_into_balanced_groups():
+    chunks = [letter * 400 for letter in "abcdefgh"]
+    limited = limit_chunks(chunks, 3)
+    assert len(limited) == 3
+    assert "".join(limited).replace("\n", "") == "".join(chunks)
+    assert max(len(c) for c in limited) <= 3 * 400 + 4
+    assert limit_chunks(chunks[:2], 3) == chunks[:2]
+
+@pytest.mark.asyncio
+async def test_large_notes_for_a_short_quiz_make_at_most_quiz_length_calls():
+    prompts = []
+
+    async def fake_generate(prompt):
+        prompts.append(prompt)
+        count, notes = prompt.split("|", 1)
+        return QuizGenerated(title="T", questions=[_question(f"{len(prompts)}-{i}") for i in range(int(count))])
+
+    notes = ["n" * 400] * 40
+    with patch("app.services.chunked_generation.generate_quiz_content", side_effect=fake_generate):
+        quiz, timings = await generate_chunked_quiz(notes, 5, _render, max_tokens=150)
+    assert len(prompts) == 5
+    assert len(quiz.questions) == 5
+
+@pytest.mark.asyncio
+async def test_shortfall_is_topped_up():
+    calls = {"a": 0, "b": 0}
+
+    async def fake_generate(prompt):
+        count, notes = prompt.split("|", 1)
+        letter = notes[0]
+        calls[letter] += 1
+        if letter == "b" and calls["b"] == 1:
+            raise RuntimeError("overloaded")
+        return QuizGenerated(title="T", questions=[_question(f"{letter}{calls[letter]}-{i}") for i in range(int(count))])
+
+    with patch("app.services.chunked_generation.generate_quiz_content", side_effect=fake_generate):
+        quiz, timings = await generate_chunked_quiz(["a" * 400, "b" * 400], 6, _render, max_tokens=150)
+
+    assert len(quiz.questions) == 6
+    # The failed chunk is retried first
+    assert calls["b"] == 2
+    summary = summarize_timings(timings)
+    assert summary["failed"] == 1 and summary["topups"] >= 1
+
+def test_merge_dedupes_and_trims():
+    per_chunk = [
+        [_question("What is X?"), _question("What is Y?")],
+        [_question("what is x"), _question("What is Z?")],
+    ]
+    merged = merge_questions(per_chunk, quiz_length=2)
+    assert [q.question_text for q in merged] == ["What is X?", "What is Y?"]
+    merged = merge_questions(per_chunk, quiz_length=10)
+    assert [q.question_text for q in merged] == ["What is X?", "What is Y?", "What is Z?"]
+
+@pytest.mark.asyncio
+async def test_chunks_run_concurrently_under_semaphore():
+    state = {"running": 0, "peak": 0}
+
+    async def fake_generate(prompt):
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.05)
+        state["running"] -= 1
+        count, notes = prompt.split("|", 1)
+        return QuizGenerated(title="T", questions=[_question(f"{notes[0]}{i}") for i in range(int(count))])
+
+    notes = [letter * 400 for letter in "abcd"]
+    with patch("app.services.chunked_generation.generate_quiz_content", side_effect=fake_generate):
+        quiz, timings = await generate_chunked_quiz(notes, 8, _render, max_tokens=150, concurrency=2)
+
+    assert state["peak"] == 2
+    assert len(quiz.questions) == 8
+    # Every chunk contributes after round-robin merging
+    assert {q.question_text[0] for q in quiz.questions} == set("abcd")
+    assert len(timings) == 4
+    assert all(t["seconds"] >= 0.05 and t["questions_returned"] >= 2 for t in timings)
+
+@pytest.mark.asyncio
+async def test_failed_chunk_is_skipped_but_total_failure_raises():
+    async def flaky_generate(prompt):
+        if "b" in prompt:
+            raise RuntimeError("overloaded")
+        return QuizGenerated(title="T", questions=[_question("Only question")])
+
+    with patch("app.services.chunked_generation.generate_quiz_content", side_effect=flaky_generate):
+        quiz, timings = await generate_chunked_quiz(["a" * 400, "b" * 400], 5, _render, max_tokens=150)
+    assert [q.question_text for q in quiz.questions] == ["Only question"]
+    assert timings[1]["error"] == "overloaded"
+
+    with patch("app.services.chunked_generation.generate_quiz_content", side_effect=RuntimeError("down")):
+        with pytest.raises(RuntimeError, match="down"):
+            await generate_chunked_quiz(["a" * 400, "b" * 400], 5, _render, max_tokens=150)
+
+@pytest.mark.asyncio
+async def test_generate_quiz_uses_chunking_only_for_large_notes():
+    generation_cache.clear()
+    mock_supabase = MagicMock()
+    notes = [{"content": "a" * 400, "course_id": "c1"}, {"content": "b" * 400, "course_id": "c1"}]
+    mock_supabase.table.return_value.select.return_value.in_.return_value.execute.return_value = MagicMock(data=notes)
+    mock_supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(data=None)
+
+    with patch("app.services.quiz_service.CHUNK_TOKEN_BUDGET", 150), \
+         patch("app.services.quiz_service.generate_chunked_quiz", new_callable=AsyncMock) as mock_chunked, \
+         patch("app.services.quiz_service.generate_quiz_content", new_callable=AsyncMock) as mock_single, \
+         patch("app.services.quiz_service.persist_generated_quiz", new_callable=AsyncMock) as mock_persist:
+        mock_chunked.return_value = (QuizGenerated(title="T", questions=[_question("Q")]), [])
+        mock_persist.return_value = QuizResponse(id="quiz-1", title="T", questions=[])
+
+        await generate_quiz(QuizGenerateRequest(note_ids=["n1", "n2"], quiz_length=5, bypass_cache=True), "user-1", mock_supabase)
+
+        mock_single.assert_not_called()
+        args = mock_chunked.call_args.args
+        assert args[0] == ["a" * 400, "b" * 400]
+        assert args[1] == 5
+        assert "b" * 400 in args[2]("b" * 400, 3)
+    generation_cache.clear()
@@ -0,0 +1,137 @@
+import time
+import httpx
+import pytest
+from fastapi import HTTPException
+from unittest.mock import MagicMock
+from postgrest.exceptions import APIError
+from app.core import circuit_breaker as cb
+from app.core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, is_supabase_outage, supabase_breaker
+from app.core.database import execute_async
+from app.models.quiz_submission import QuizNextRequest
+from app.services import mock_storage
+from app.services.mock_storage import SQLiteMockStore
+from app.services.quiz_submission import get_next_question
+
+def fail(breaker, error):
+    with pytest.raises(type(error)):
+        with breaker.guard():
+            raise error
+
+def succeed(breaker):
+    with breaker.guard():
+        pass
+
+def test_only_outage_errors_count():
+    assert is_supabase_outage(httpx.ConnectTimeout("timed out"))
+    assert is_supabase_outage(APIError({"message": "JSON could not be generated", "code": 502}))
+    assert is_supabase_outage(APIError({"message": "Could not connect", "code": "PGRST001"}))
+    assert not is_supabase_outage(APIError({"message": "No rows", "code": "PGRST116"}))
+    assert not is_supabase_outage(APIError({"message": "duplicate key", "code": "23505"}))
+    assert not is_supabase_outage(APIError({"message": "JSON could not be generated", "code": 404}))
+    assert not is_supabase_outage(ValueError("bad input"))
+
+def test_opens_at_failure_rate_and_fails_fast(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cb.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("test", failure_rate=0.5, min_calls=4, open_seconds=30, is_failure=is_supabase_outage)
+
+    succeed(breaker)
+    fail(breaker, APIError({"message": "No rows", "code": "PGRST116"}))
+    fail(breaker, httpx.ConnectError("refused"))
+    assert breaker.state == CLOSED
+    fail(breaker, httpx.ConnectError("refused"))
+    assert breaker.state == OPEN
+
+    ran = False
+    with pytest.raises(CircuitOpenError):
+        with breaker.guard():
+            ran = True
+    assert not ran
+    assert breaker.retry_after() == 30
+    assert cb.circuit_breaker_rejections_total.value(breaker="test") >= 1
+
+def test_half_open_trial_closes_or_reopens(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cb.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("trial", failure_rate=0.5, min_calls=1, open_seconds=10)
+
+    fail(breaker, RuntimeError("down"))
+    now[0] += 10
+    assert breaker.state == HALF_OPEN
+    fail(breaker, RuntimeError("still down"))
+    assert breaker.state == OPEN
+
+    now[0] += 10
+    with breaker.guard():
+        # Only one trial call at a time
+        with pytest.raises(CircuitOpenError):
+            with breaker.guard():
+                pass
+    assert breaker.state == CLOSED
+    assert cb.circuit_breaker_transitions_total.value(breaker="trial", state=CLOSED) == 1
+
+@pytest.mark.asyncio
+async def test_execute_async_skips_the_query_while_open():
+    query = MagicMock()
+    query.execute.side_effect = httpx.ReadTimeout("timed out")
+    for _ in range(supabase_breaker.min_calls):
+        with pytest.raises(httpx.ReadTimeout):
+            await execute_async(query)
+    assert supabase_breaker.state == OPEN
+
+    calls = query.execute.call_count
+    started = time.perf_counter()
+    with pytest.raises(CircuitOpenError):
+        await execute_async(query)
+    assert query.execute.call_count == calls
+    assert time.perf_counter() - started < 0.05
+
+@pytest.mark.asyncio
+async def test_open_circuit_routes_to_mock_storage_or_503(monkeypatch, tmp_path):
+    monkeypatch.setattr(mock_storage, "_store", SQLiteMockStore(str(tmp_path / "mock.sqlite3")))
+    monkeypatch.setattr(supabase_breaker, "_state", OPEN)
+    monkeypatch.setattr(supabase_breaker, "_opened_at", cb.time.monotonic())
+    supabase = MagicMock()
+
+    mock_storage.save_mock_quiz({"id": "mq-1", "user_id": "u1", "title": "Mock", "questions": [
+        {"id": f"q{i}", "question_text": f"Q{i}", "options": [], "explanation": None} for i in range(2)
+    ]})
+    mock_storage.save_mock_attempt({"id": "ma-1", "user_id": "u1", "quiz_id": "mq-1", "current_question_index": 0})
+    response = await get_next_question("mq-1", QuizNextRequest(attempt_id="ma-1"), "u1", supabase)
+    assert response.current_question_index == 1
+    supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute.assert_not_called()
+
+    with pytest.raises(HTTPException) as exc_info:
+        await get_next_question("q-1", QuizNextRequest(attempt_id="missing"), "u1", supabase)
+    assert exc_info.value.status_code == 503
+    assert "Retry-After" in exc_info.value.headers
+
+@pytest.mark.asyncio
+async def test_half_open_rejections_and_failed_trials_are_503(monkeypatch, tmp_path):
+    monkeypatch.setattr(mock_storage, "_store", SQLiteMockStore(str(tmp_path / "mock.sqlite3")))
+    monkeypatch.setattr(supabase_breaker, "_state", HALF_OPEN)
+    monkeypatch.setattr(supabase_breaker, "_trials", supabase_breaker.half_open_calls)
+    supabase = MagicMock()
+
+    # Another request holds the trial slot, so this lookup is rejected
+    with pytest.raises(HTTPException) as exc_info:
+        await get_next_question("q-1", QuizNextRequest(attempt_id="missing"), "u1", supabase)
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers["Retry-After"] == "1"
+
+    # The trial itself times out and reopens the circuit
+    monkeypatch.setattr(supabase_breaker, "_trials", 0)
+    query = supabase.table.return_value.select.return_value.eq.return_value.single.return_value
+    query.execute.side_effect = httpx.ReadTimeout("timed out")
+    with pytest.raises(HTTPException) as exc_info:
+        await get_next_question("q-1", QuizNextRequest(attempt_id="missing"), "u1", supabase)
+    assert supabase_breaker.state == OPEN
+    assert exc_info.value.status_code == 503
+    assert int(exc_info.value.headers["Retry-After"]) > 1
+
+    # A lookup that got an answer (no such row) is a real 404
+    supabase_breaker.reset()
+    query.execute.side_effect = APIError({"message": "No rows", "code": "PGRST116"})
+    with pytest.raises(HTTPException) as exc_info:
+        await get_next_question("q-1", QuizNextRequest(attempt_id="missing"), "u1", supabase)
+    assert exc_info.value.status_code == 404
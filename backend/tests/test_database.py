@@ -29,7 +29,7 @@ def test_get_supabase_client(reload_modules):
         }):
             from app.core.database import get_supabase_client
             client = get_supabase_client()
-            assert client is mock_client_instance
+            assert client.wrapped is mock_client_instance
             mock_create_client.assert_called_once()
 
 
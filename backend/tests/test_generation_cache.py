@@ -0,0 +1,121 @@
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.models.quiz import QuizGenerateRequest, QuizGenerated, QuestionGenerated, QuizResponse
+from app.services.generation_cache import GenerationCache, generation_cache, make_generation_key
+from app.services.quiz_service import generate_quiz
+
+def _quiz():
+    return QuizGenerated(
+        title="Cached Quiz",
+        questions=[
+            QuestionGenerated(question_text=f"Q{i}", options=[f"{i}A", f"{i}B", f"{i}C", f"{i}D"], correct_answer_index=1, explanation="Exp")
+            for i in range(5)
+        ]
+    )
+
+@pytest.fixture(autouse=True)
+def clear_generation_cache():
+    generation_cache.clear()
+    yield
+    generation_cache.clear()
+
+def test_key_ignores_note_order_and_whitespace():
+    a = make_generation_key(["First  note\n", "Second note"], "v1", "model", 10)
+    b = make_generation_key(["Second note", "First note"], "v1", "model", 10)
+    assert a == b
+
+def test_key_changes_with_inputs():
+    base = make_generation_key(["note"], "v1", "model", 10)
+    assert make_generation_key(["note"], "v2", "model", 10) != base
+    assert make_generation_key(["note"], "v1", "other-model", 10) != base
+    assert make_generation_key(["note"], "v1", "model", 15) != base
+    assert make_generation_key(["other note"], "v1", "model", 10) != base
+
+def test_hit_returns_reshuffled_copy_with_correct_answers():
+    cache = GenerationCache()
+    original = _quiz()
+    cache.set("k", original)
+
+    cached = cache.get("k")
+    assert cached is not None
+    assert sorted(q.question_text for q in cached.questions) == [q.question_text for q in original.questions]
+    for q in cached.questions:
+        i = q.question_text[1:]
+        assert q.options[q.correct_answer_index] == f"{i}B"
+    # The stored entry is never mutated by callers
+    cached.questions.clear()
+    assert len(cache.get("k").questions) == 5
+
+def test_ttl_and_eviction():
+    cache = GenerationCache(max_size=1, ttl=0.05)
+    cache.set("a", _quiz())
+    cache.set("b", _quiz())
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    time.sleep(0.06)
+    assert cache.get("b") is None
+
+def _notes_supabase():
+    mock_supabase = MagicMock()
+
+    def mock_table(name):
+        mock_t = MagicMock()
+        if name == "notes":
+            mock_t.select.return_value.in_.return_value.execute.return_value = MagicMock(data=[{"content": "Lecture content", "course_id": "c1"}])
+        elif name == "system_prompts":
+            mock_t.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(data={"template": "Prompt {{notes}} {{quiz_length}}"})
+        return mock_t
+
+    mock_supabase.table.side_effect = mock_table
+    return mock_supabase
+
+@pytest.mark.asyncio
+async def test_generate_quiz_reuses_cached_generation():
+    persisted = QuizResponse(id="quiz-1", title="Cached Quiz", questions=[])
+    with patch("app.services.quiz_service.generate_quiz_content", new_callable=AsyncMock) as mock_llm, \
+         patch("app.services.quiz_service.persist_generated_quiz", new_callable=AsyncMock) as mock_persist:
+        mock_llm.return_value = _quiz()
+        mock_persist.return_value = persisted
+
+        request = QuizGenerateRequest(note_ids=["n1"], quiz_length=5)
+        await generate_quiz(request, "user-1", _notes_supabase())
+        await generate_quiz(request, "user-2", _notes_supabase())
+
+        assert mock_llm.call_count == 1
+        assert mock_persist.call_count == 2
+        stats = generation_cache.stats()
+        assert stats["hits"] == 1
+        assert stats["llm_calls_avoided"] == 1
+        assert stats["hit_rate"] == 0.5
+
+@pytest.mark.asyncio
+async def test_generate_quiz_bypass_flag_calls_model():
+    with patch("app.services.quiz_service.generate_quiz_content", new_callable=AsyncMock) as mock_llm, \
+         patch("app.services.quiz_service.persist_generated_quiz", new_callable=AsyncMock) as mock_persist:
+        mock_llm.return_value = _quiz()
+        mock_persist.return_value = QuizResponse(id="quiz-1", title="Cached Quiz", questions=[])
+
+        await generate_quiz(QuizGenerateRequest(note_ids=["n1"], quiz_length=5), "user-1", _notes_supabase())
+        await generate_quiz(QuizGenerateRequest(note_ids=["n1"], quiz_length=5, bypass_cache=True), "user-1", _notes_supabase())
+
+        assert mock_llm.call_count == 2
+        assert generation_cache.stats()["bypassed"] == 1
+
+@pytest.mark.asyncio
+async def test_hit_on_chunked_generation_counts_every_chunk_call():
+    timings = [{"chunk": 0}, {"chunk": 1}, {"chunk": 2}, {"chunk": 1, "topup": True}]
+    with patch("app.services.quiz_service.CHUNK_TOKEN_BUDGET", 1), \
+         patch("app.services.quiz_service.generate_chunked_quiz", new_callable=AsyncMock) as mock_chunked, \
+         patch("app.services.quiz_service.persist_generated_quiz", new_callable=AsyncMock) as mock_persist:
+        mock_chunked.return_value = (_quiz(), timings)
+        mock_persist.return_value = QuizResponse(id="quiz-1", title="Cached Quiz", questions=[])
+
+        request = QuizGenerateRequest(note_ids=["n1"], quiz_length=5)
+        for _ in range(3):
+            await generate_quiz(request, "user-1", _notes_supabase())
+
+        assert mock_chunked.call_count == 1
+        stats = generation_cache.stats()
+        assert stats["hits"] == 2
+        assert stats["llm_calls_avoided"] == 8
@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.services.generation_limiter import GenerationLimiter, llm_generation_rejections_total
+
+async def hold(limiter, user_id, release: asyncio.Event, started: list):
+    async with limiter.slot(user_id):
+        started.append(user_id)
+        await release.wait()
+
+@pytest.mark.asyncio
+async def test_global_limit_queues_in_arrival_order():
+    limiter = GenerationLimiter(max_concurrent=2, max_per_user=5, max_waiting=10, wait_timeout=5)
+    release, started = asyncio.Event(), []
+    tasks = [asyncio.create_task(hold(limiter, f"user-{i}", release, started)) for i in range(4)]
+    await asyncio.sleep(0.01)
+    assert started == ["user-0", "user-1"]
+    assert limiter.stats()["waiting"] == 2
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert started == ["user-0", "user-1", "user-2", "user-3"]
+    assert limiter.stats()["active"] == 0
+
+@pytest.mark.asyncio
+async def test_per_user_limit_lets_other_users_through():
+    limiter = GenerationLimiter(max_concurrent=3, max_per_user=1, max_waiting=10, wait_timeout=5)
+    release, started = asyncio.Event(), []
+    tasks = [
+        asyncio.create_task(hold(limiter, "alice", release, started)),
+        asyncio.create_task(hold(limiter, "alice", release, started)),
+        asyncio.create_task(hold(limiter, "bob", release, started)),
+    ]
+    await asyncio.sleep(0.01)
+    # Alice's second generation waits; Bob is not stuck behind it
+    assert started == ["alice", "bob"]
+    release.set()
+    await asyncio.gather(*tasks)
+    assert started == ["alice", "bob", "alice"]
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected_fast_with_retry_after():
+    limiter = GenerationLimiter(max_concurrent=1, max_per_user=5, max_waiting=1, wait_timeout=5)
+    release, started = asyncio.Event(), []
+    tasks = [asyncio.create_task(hold(limiter, f"user-{i}", release, started)) for i in range(2)]
+    await asyncio.sleep(0.01)
+
+    before = llm_generation_rejections_total.value(reason="queue_full")
+    with pytest.raises(HTTPException) as exc_info:
+        async with limiter.slot("user-2"):
+            pass
+    assert exc_info.value.status_code == 429
+    assert 1 <= int(exc_info.value.headers["Retry-After"]) <= 60
+    assert llm_generation_rejections_total.value(reason="queue_full") == before + 1
+
+    release.set()
+    await asyncio.gather(*tasks)
+
+@pytest.mark.asyncio
+async def test_wait_timeout_returns_503_and_frees_the_queue_entry():
+    limiter = GenerationLimiter(max_concurrent=1, max_per_user=5, max_waiting=5, wait_timeout=0.05)
+    release, started = asyncio.Event(), []
+    holder = asyncio.create_task(hold(limiter, "user-0", release, started))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(HTTPException) as exc_info:
+        async with limiter.slot("user-1"):
+            pass
+    assert exc_info.value.status_code == 503
+    assert "Retry-After" in exc_info.value.headers
+    assert limiter.stats()["waiting"] == 0
+
+    release.set()
+    await holder
+    assert limiter.stats()["active"] == 0
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    limiter = GenerationLimiter(max_concurrent=1, max_per_user=5, max_waiting=5, wait_timeout=5)
+    release, started = asyncio.Event(), []
+    holder = asyncio.create_task(hold(limiter, "user-0", release, started))
+    await asyncio.sleep(0.01)
+    waiter = asyncio.create_task(hold(limiter, "user-1", release, started))
+    await asyncio.sleep(0.01)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+
+    release.set()
+    await holder
+    assert limiter.stats() | {"avg_hold_seconds": 0} == {"active": 0, "waiting": 0, "max_concurrent": 1, "avg_hold_seconds": 0}
+
+@pytest.mark.asyncio
+async def test_generation_endpoint_returns_429_when_saturated(monkeypatch):
+    from unittest.mock import MagicMock, patch
+    from app.models.quiz import QuizGenerateRequest
+    from app.services import quiz_service
+
+    limiter = GenerationLimiter(max_concurrent=0, max_per_user=1, max_waiting=0, wait_timeout=1)
+    monkeypatch.setattr(quiz_service, "generation_limiter", limiter)
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.in_.return_value.execute.return_value = MagicMock(data=[{"content": "Notes", "course_id": "c1"}])
+    supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(data={"template": "{{notes}} x{{quiz_length}}"})
+
+    request = QuizGenerateRequest(note_ids=["n1"], quiz_length=5, bypass_cache=True)
+    with patch("app.services.quiz_service.generate_quiz_content") as mock_generate:
+        with pytest.raises(HTTPException) as exc_info:
+            await quiz_service.generate_quiz(request, "user-1", supabase)
+    assert exc_info.value.status_code == 429
+    assert "Retry-After" in exc_info.value.headers
+    mock_generate.assert_not_called()
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from app.core import health
+from app.core.health import ReadinessProbe
+from app.main import app
+
+client = TestClient(app)
+
+def test_healthz_does_not_touch_dependencies():
+    with patch("app.core.health.get_supabase_client") as mock_get_client:
+        response = client.get("/healthz")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+    mock_get_client.assert_not_called()
+
+def test_readyz_caches_the_probe_result():
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.limit.return_value.execute.return_value = MagicMock(data=[])
+    with patch("app.core.health.get_supabase_client", return_value=supabase):
+        responses = [client.get("/readyz") for _ in range(3)]
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert responses[0].json()["status"] == "ready"
+    assert responses[0].json()["checks"]["supabase"]["ok"] is True
+    assert supabase.table.call_count == 1
+
+def test_readyz_reports_unreachable_supabase():
+    with patch("app.core.health.get_supabase_client", side_effect=ValueError("Supabase URL and Service Role Key must be set")):
+        response = client.get("/readyz")
+    assert response.status_code == 503
+    body = response.json()
+    assert body["status"] == "not ready"
+    assert "must be set" in body["checks"]["supabase"]["error"]
+    assert health.dependency_up.value(dependency="supabase") == 0
+
+@pytest.mark.asyncio
+async def test_concurrent_polls_share_one_probe_and_slow_checks_time_out():
+    calls = 0
+
+    async def slow_check():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(1)
+
+    probe = ReadinessProbe({"db": slow_check}, ttl=60, timeout=0.05)
+    results = await asyncio.gather(*(probe.check() for _ in range(5)))
+    assert calls == 1
+    assert all(r is results[0] for r in results)
+    assert results[0]["ready"] is False
+    assert "timed out" in results[0]["checks"]["db"]["error"]
+
+@pytest.mark.asyncio
+async def test_startup_check_runs_without_blocking_the_caller():
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def check():
+        started.set()
+        await release.wait()
+
+    probe = ReadinessProbe({"db": check}, ttl=60)
+    task = asyncio.create_task(probe.run_startup_check())
+    await started.wait()
+    assert probe.last_result is None
+    release.set()
+    await task
+    assert probe.last_result["ready"] is True
@@ -0,0 +1,159 @@
+import json
+import time
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from fastapi.testclient import TestClient
+from jose import jwk, jwt
+from app.main import app
+from app.core.token_cache import token_cache
+
+client = TestClient(app)
+
+def _generate_key(alg: str):
+    if alg == "RS256":
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    return private_pem, public_pem
+
+def _write_jwks(path, keys):
+    entries = []
+    for kid, alg, public_pem in keys:
+        entry = jwk.construct(public_pem, alg).to_dict()
+        entry = {k: (v.decode() if isinstance(v, bytes) else v) for k, v in entry.items()}
+        entry["kid"] = kid
+        entries.append(entry)
+    path.write_text(json.dumps({"keys": entries}))
+
+def _token(private_pem, alg, kid, **claims):
+    payload = {"sub": "user-1", "aud": "authenticated", "exp": int(time.time()) + 60, **claims}
+    return jwt.encode(payload, private_pem, algorithm=alg, headers={"kid": kid})
+
+@pytest.fixture(autouse=True)
+def jwks_env(monkeypatch, tmp_path):
+    token_cache.clear()
+    monkeypatch.delenv("SUPABASE_JWT_SECRET", raising=False)
+    jwks_file = tmp_path / "jwks.json"
+    monkeypatch.setenv("SUPABASE_JWKS_FILE", str(jwks_file))
+
+    # Any remote verification attempt means local JWKS verification did not happen
+    def fail_remote():
+        raise AssertionError("remote verification should not be used")
+    monkeypatch.setattr("app.core.security.get_supabase_client", fail_remote)
+
+    yield jwks_file
+    token_cache.clear()
+
+@pytest.mark.parametrize("alg", ["RS256", "ES256"])
+def test_asymmetric_token_verified_locally(jwks_env, alg):
+    private_pem, public_pem = _generate_key(alg)
+    _write_jwks(jwks_env, [("key-1", alg, public_pem)])
+
+    token = _token(private_pem, alg, "key-1", email="jwks@example.com")
+    response = client.get("/api/protected", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    assert response.json()["user"]["email"] == "jwks@example.com"
+
+def test_rotated_key_is_picked_up_by_kid(jwks_env):
+    old_private, old_public = _generate_key("RS256")
+    _write_jwks(jwks_env, [("old", "RS256", old_public)])
+    response = client.get("/api/protected", headers={"Authorization": f"Bearer {_token(old_private, 'RS256', 'old')}"})
+    assert response.status_code == 200
+
+    # Rotate: the new kid is unknown to the cached key set and must trigger a reload
+    new_private, new_public = _generate_key("ES256")
+    _write_jwks(jwks_env, [("old", "RS256", old_public), ("new", "ES256", new_public)])
+    from app.core.jwks import get_jwks_cache
+    get_jwks_cache().min_refresh_interval = 0
+
+    response = client.get("/api/protected", headers={"Authorization": f"Bearer {_token(new_private, 'ES256', 'new')}"})
+    assert response.status_code == 200
+
+def test_bad_signature_rejected_without_remote_call(jwks_env):
+    _, public_pem = _generate_key("RS256")
+    other_private, _ = _generate_key("RS256")
+    _write_jwks(jwks_env, [("key-1", "RS256", public_pem)])
+
+    token = _token(other_private, "RS256", "key-1")
+    response = client.get("/api/protected", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+
+def test_unknown_kid_falls_back_to_remote(jwks_env, monkeypatch):
+    private_pem, public_pem = _generate_key("RS256")
+    _write_jwks(jwks_env, [("key-1", "RS256", public_pem)])
+
+    class MockUser:
+        id = "remote-user"
+        email = "remote@example.com"
+        aud = "authenticated"
+        user_metadata = {}
+        app_metadata = {}
+        role = "authenticated"
+
+    class MockClient:
+        class auth:
+            @staticmethod
+            def get_user(token):
+                return type("Resp", (), {"user": MockUser()})()
+
+    monkeypatch.setattr("app.core.security.get_supabase_client", lambda: MockClient())
+
+    token = _token(private_pem, "RS256", "unknown-kid")
+    response = client.get("/api/protected", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json()["user"]["sub"] == "remote-user"
+
+def test_failed_refresh_is_rate_limited(monkeypatch):
+    from app.core.jwks import JWKSCache
+    cache = JWKSCache(url="https://example.supabase.co/auth/v1/.well-known/jwks.json", min_refresh_interval=30)
+    fetches = []
+
+    def unreachable():
+        fetches.append(1)
+        raise ConnectionError("JWKS endpoint down")
+    monkeypatch.setattr(cache, "_fetch", unreachable)
+
+    # No keys and the endpoint down: one fetch, then None until the interval passes
+    assert all(cache.get_key("key-1") is None for _ in range(20))
+    assert len(fetches) == 1
+
+    cache._last_refresh -= 30
+    assert cache.get_key("key-1") is None
+    assert len(fetches) == 2
+
+@pytest.mark.asyncio
+async def test_background_refresh_warns_when_no_signing_keys_load(tmp_path, caplog, monkeypatch):
+    import asyncio
+    from app.core.jwks import JWKSCache
+    jwks_file = tmp_path / "jwks.json"
+    jwks_file.write_text(json.dumps({"keys": []}))
+
+    for warn_if_empty, expected in ((False, False), (True, True)):
+        caplog.clear()
+        cache = JWKSCache(path=str(jwks_file), refresh_interval=60)
+        refreshed = asyncio.Event()
+        real_sleep = asyncio.sleep
+
+        async def fake_sleep(delay):
+            # The first sleep starts only after the post-refresh check has run
+            refreshed.set()
+            await real_sleep(3600)
+
+        monkeypatch.setattr("app.core.jwks.asyncio.sleep", fake_sleep)
+        task = asyncio.create_task(cache.run_background_refresh(warn_if_empty=warn_if_empty))
+        await asyncio.wait_for(refreshed.wait(), 5)
+        monkeypatch.undo()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert ("provided no signing keys" in caplog.text) is expected
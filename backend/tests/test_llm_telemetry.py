@@ -0,0 +1,127 @@
+import asyncio
+import json
+import threading
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from pydantic_ai.usage import RunUsage
+from tenacity import wait_none
+from app.agents import quiz_agent
+from app.agents.quiz_agent import generate_quiz_content, search_web
+from app.core import llm_telemetry
+from app.core.llm_telemetry import llm_retries_total, llm_tokens_total, record_tool_call, telemetry_sink, telemetry_tags, track_generation
+from app.models.quiz import QuestionGenerated, QuizGenerated
+
+def make_result(input_tokens=1200, output_tokens=300):
+    result = MagicMock()
+    result.output = QuizGenerated(title="Quiz", questions=[
+        QuestionGenerated(question_text="Q1", options=["A", "B", "C", "D"], correct_answer_index=0, explanation="E")
+    ])
+    result.usage.return_value = RunUsage(requests=2, tool_calls=1, input_tokens=input_tokens, output_tokens=output_tokens)
+    return result
+
+@pytest.fixture
+def sink_path(tmp_path, monkeypatch):
+    path = tmp_path / "telemetry.jsonl"
+    monkeypatch.setattr(telemetry_sink, "path", str(path))
+    monkeypatch.setattr(quiz_agent._run_quiz_agent.retry, "wait", wait_none())
+    return path
+
+def read_records(path):
+    telemetry_sink.flush()
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+@pytest.mark.asyncio
+async def test_generation_records_usage_retries_and_tags(sink_path):
+    class Overloaded(Exception):
+        status_code = 503
+
+    before = llm_retries_total.value(model=quiz_agent.MODEL_NAME, reason="Overloaded:503")
+    with patch.object(quiz_agent.quiz_agent, "run", new_callable=AsyncMock) as mock_run:
+        mock_run.side_effect = [Overloaded("model overloaded"), make_result()]
+        with telemetry_tags(prompt_version="quiz_generator_v1:abc"):
+            quiz = await generate_quiz_content("Prompt")
+
+    assert quiz.title == "Quiz"
+    [record] = read_records(sink_path)
+    assert record["outcome"] == "ok"
+    assert record["retries"] == 1
+    assert record["retry_reasons"] == ["Overloaded:503"]
+    assert [a["outcome"] for a in record["attempts"]] == ["error", "ok"]
+    assert (record["input_tokens"], record["output_tokens"], record["requests"]) == (1200, 300, 2)
+    assert record["estimated_cost_usd"] == pytest.approx((1200 * 0.30 + 300 * 2.50) / 1_000_000)
+    assert record["tags"] == {"prompt_version": "quiz_generator_v1:abc"}
+    assert record["prompt_chars"] == len("Prompt")
+    assert llm_retries_total.value(model=quiz_agent.MODEL_NAME, reason="Overloaded:503") == before + 1
+
+@pytest.mark.asyncio
+async def test_failed_generation_is_recorded(sink_path):
+    with patch.object(quiz_agent.quiz_agent, "run", new_callable=AsyncMock) as mock_run:
+        mock_run.side_effect = ValueError("bad output")
+        with pytest.raises(ValueError):
+            await generate_quiz_content("Prompt")
+
+    [record] = read_records(sink_path)
+    assert record["outcome"] == "error"
+    assert len(record["attempts"]) == 5
+    assert record["retry_reasons"] == ["ValueError"] * 4
+
+@pytest.mark.asyncio
+async def test_tool_calls_are_attributed_to_the_running_generation(sink_path, monkeypatch):
+    monkeypatch.delenv("GOOGLE_SEARCH_API_KEY", raising=False)
+    monkeypatch.setenv("GOOGLE_API_KEY", "key")
+    monkeypatch.setenv("GOOGLE_CSE_ID", "cse")
+
+    async def run(prompt):
+        with patch("httpx.AsyncClient.get", new_callable=AsyncMock) as mock_get:
+            mock_get.return_value = MagicMock(json=lambda: {"items": [{"title": "T", "snippet": "S"}]})
+            # Parallel tool calls run as separate tasks
+            await asyncio.gather(search_web(None, "a"), search_web(None, "b"))
+        return make_result()
+
+    with patch.object(quiz_agent.quiz_agent, "run", side_effect=run):
+        await generate_quiz_content("Prompt")
+
+    [record] = read_records(sink_path)
+    assert record["tool_calls"] == 2
+    assert record["tool_errors"] == 0
+    assert record["tool_seconds"] >= 0
+
+def test_tool_calls_outside_a_generation_only_update_metrics():
+    before = llm_telemetry.llm_tool_call_duration_seconds.count(tool="search_web", outcome="error")
+    record_tool_call("search_web", 0.2, error=True)
+    assert llm_telemetry.llm_tool_call_duration_seconds.count(tool="search_web", outcome="error") == before + 1
+
+def test_token_counters_accumulate(sink_path):
+    before = llm_tokens_total.value(model="m", kind="output")
+    with track_generation("m", "prompt") as telemetry:
+        telemetry.record_attempt(0.5)
+        telemetry.record_usage(RunUsage(input_tokens=10, output_tokens=7))
+    assert llm_tokens_total.value(model="m", kind="output") == before + 7
+
+def test_sink_writes_off_the_calling_thread(sink_path, monkeypatch):
+    writers = []
+    real_append = telemetry_sink._append
+    release = threading.Event()
+
+    def slow_append(batch):
+        writers.append(threading.current_thread())
+        release.wait(5)
+        real_append(batch)
+
+    monkeypatch.setattr(telemetry_sink, "_append", slow_append)
+    telemetry_sink.write({"generation_id": "a"})
+    telemetry_sink.write({"generation_id": "b"})
+    # write() returned while the disk write is still blocked
+    assert not sink_path.exists()
+    release.set()
+    assert [r["generation_id"] for r in read_records(sink_path)] == ["a", "b"]
+    assert threading.current_thread() not in writers
+
+def test_sink_write_errors_are_logged_not_raised(tmp_path, monkeypatch, caplog):
+    # A directory where the file should be makes the append fail
+    path = tmp_path / "telemetry.jsonl"
+    path.mkdir()
+    monkeypatch.setattr(telemetry_sink, "path", str(path))
+    telemetry_sink.write({"generation_id": "a"})
+    telemetry_sink.flush()
+    assert "Could not write LLM telemetry" in caplog.text
@@ -0,0 +1,79 @@
+import time
+from fastapi.testclient import TestClient
+from app.core.metrics import MetricsRegistry, http_request_duration_seconds, http_requests_total
+from app.main import app
+
+client = TestClient(app)
+
+def test_counter_gauge_and_histogram_rendering():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "Jobs.", ("kind",))
+    gauge = registry.gauge("queue_depth", "Depth.")
+    histogram = registry.histogram("latency_seconds", "Latency.", ("op",), buckets=(0.1, 1.0))
+
+    counter.inc(kind="a")
+    counter.inc(2, kind="a")
+    gauge.set(4)
+    histogram.observe(0.05, op="x")
+    histogram.observe(0.1, op="x")
+    histogram.observe(5, op="x")
+    registry.register_stats("cache", lambda: {"hits": 3, "hit_rate": 0.5, "label": "ignored"})
+
+    text = registry.render()
+    assert "# TYPE jobs_total counter" in text
+    assert 'jobs_total{kind="a"} 3.0' in text
+    assert "queue_depth 4" in text
+    assert 'latency_seconds_bucket{op="x",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{op="x",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{op="x",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{op="x"} 3' in text
+    assert "cache_hits 3" in text
+    assert "cache_hit_rate 0.5" in text
+    assert "cache_label" not in text
+
+def test_middleware_labels_by_route_template():
+    # Unauthenticated, so the handler never runs; the route is still matched
+    route = "/api/v1/quiz/{quiz_id}/next"
+    before = http_request_duration_seconds.count(method="POST", route=route)
+    response = client.post("/api/v1/quiz/abc-123/next", json={"attempt_id": "a"})
+    assert response.status_code in (401, 403)
+
+    assert http_requests_total.value(method="POST", route=route, status=str(response.status_code)) >= 1
+    assert http_request_duration_seconds.count(method="POST", route=route) == before + 1
+
+    client.get("/definitely/not/a/route")
+    assert http_requests_total.value(method="GET", route="unmatched", status="404") >= 1
+
+def test_metrics_endpoint_exposes_prometheus_text():
+    client.get("/")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/",status="200"}' in body
+    assert "http_requests_in_flight" in body
+    assert "generation_cache_hit_rate" in body
+    assert "quiz_jobs_queue_depth" in body
+    assert "abc-123" not in body
+
+def test_middleware_overhead_is_small():
+    from app.core.metrics import MetricsMiddleware
+    import asyncio
+
+    async def inner(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def noop_send(message):
+        pass
+
+    async def run(n):
+        middleware = MetricsMiddleware(inner)
+        scope = {"type": "http", "method": "GET", "path": "/"}
+        started = time.perf_counter()
+        for _ in range(n):
+            await middleware(dict(scope), None, noop_send)
+        return (time.perf_counter() - started) / n
+
+    # Well under a tenth of a millisecond per request
+    assert asyncio.run(run(2000)) < 0.0001
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from app.services import mock_storage
+from app.services.mock_storage import SQLiteMockStore, WriteBehindMockStore
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = SQLiteMockStore(str(tmp_path / "mock.sqlite3"))
+    monkeypatch.setattr(mock_storage, "_store", store)
+    return store
+
+def test_round_trip_through_public_api(store):
+    mock_storage.save_mock_quiz({"id": "quiz-1", "title": "Mock Quiz", "questions": []})
+    mock_storage.save_mock_attempt({"id": "attempt-1", "quiz_id": "quiz-1", "current_question_index": 0})
+    mock_storage.save_mock_attempt({"id": "attempt-1", "quiz_id": "quiz-1", "current_question_index": 2})
+
+    assert mock_storage.get_mock_quiz("quiz-1")["title"] == "Mock Quiz"
+    assert mock_storage.get_mock_attempt("attempt-1")["current_question_index"] == 2
+    assert mock_storage.get_mock_attempt("missing") is None
+    assert store.count("attempts") == 1
+
+def test_imports_legacy_json_once(tmp_path):
+    legacy = tmp_path / "mock_db.json"
+    legacy.write_text(json.dumps({
+        "quizzes": {"quiz-1": {"id": "quiz-1", "title": "Old Quiz"}},
+        "attempts": {"attempt-1": {"id": "attempt-1", "quiz_id": "quiz-1"}}
+    }))
+    store = SQLiteMockStore(str(tmp_path / "mock.sqlite3"), legacy_json_path=str(legacy))
+    assert store.get("quizzes", "quiz-1")["title"] == "Old Quiz"
+
+    store.put("quizzes", "quiz-1", {"id": "quiz-1", "title": "Renamed"})
+    # A new process must not re-import over newer data
+    reopened = SQLiteMockStore(str(tmp_path / "mock.sqlite3"), legacy_json_path=str(legacy))
+    assert reopened.get("quizzes", "quiz-1")["title"] == "Renamed"
+    assert reopened.get("attempts", "attempt-1")["quiz_id"] == "quiz-1"
+
+def test_concurrent_writes_are_not_lost(store):
+    def writer(worker):
+        for i in range(50):
+            mock_storage.save_mock_attempt({"id": f"attempt-{worker}-{i}", "current_question_index": i})
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert store.count("attempts") == 400
+    assert mock_storage.get_mock_attempt("attempt-7-49")["current_question_index"] == 49
+
+def _time_accesses(store, prefix, n=200):
+    started = time.perf_counter()
+    for i in range(n):
+        store.put("attempts", f"{prefix}-{i}", {"id": f"{prefix}-{i}", "current_question_index": i})
+        store.get("attempts", f"{prefix}-{i}")
+    return time.perf_counter() - started
+
+def test_access_time_does_not_grow_with_store_size(store):
+    store.put_many("quizzes", {f"seed-{i}": {"id": f"seed-{i}", "questions": []} for i in range(100)})
+    small = _time_accesses(store, "small")
+
+    store.put_many("quizzes", {
+        f"bulk-{i}": {"id": f"bulk-{i}", "questions": [{"question_text": "x" * 200}] * 5}
+        for i in range(20000)
+    })
+    large = _time_accesses(store, "large")
+
+    # The JSON store rewrote every record per call (~200x more data here);
+    # indexed per-record access stays flat, allowing for timing noise
+    assert large < small * 5
+
+def test_write_behind_serves_reads_from_memory_and_flushes_dirty_records(tmp_path):
+    backing = SQLiteMockStore(str(tmp_path / "mock.sqlite3"))
+    store = WriteBehindMockStore(backing, flush_threshold=0)
+
+    store.put("attempts", "attempt-1", {"id": "attempt-1", "current_question_index": 1})
+    store.put("attempts", "attempt-1", {"id": "attempt-1", "current_question_index": 2})
+    store.put("quizzes", "quiz-1", {"id": "quiz-1", "title": "Quiz"})
+    assert store.get("attempts", "attempt-1")["current_question_index"] == 2
+    assert backing.get("attempts", "attempt-1") is None
+    assert store.stats()["dirty_records"] == 2
+
+    assert store.flush() == 2
+    assert backing.get("attempts", "attempt-1")["current_question_index"] == 2
+    assert backing.get("quizzes", "quiz-1")["title"] == "Quiz"
+    stats = store.stats()
+    assert stats["dirty_records"] == 0
+    assert stats["flushes"] == 1
+    assert stats["last_flush_seconds"] > 0
+    assert store.flush() == 0
+
+def test_write_behind_returns_copies(tmp_path):
+    store = WriteBehindMockStore(SQLiteMockStore(str(tmp_path / "mock.sqlite3")), flush_threshold=0)
+    record = {"id": "attempt-1", "current_question_index": 0}
+    store.put("attempts", "attempt-1", record)
+    record["current_question_index"] = 5
+    store.get("attempts", "attempt-1")["current_question_index"] = 7
+    assert store.get("attempts", "attempt-1")["current_question_index"] == 0
+
+def test_write_behind_flushes_inline_at_threshold_without_background_task(tmp_path):
+    backing = SQLiteMockStore(str(tmp_path / "mock.sqlite3"))
+    store = WriteBehindMockStore(backing, flush_threshold=3)
+    for i in range(3):
+        store.put("attempts", f"attempt-{i}", {"id": f"attempt-{i}"})
+    assert backing.count("attempts") == 3
+    assert store.dirty_count() == 0
+
+def test_failed_flush_keeps_records_dirty(tmp_path):
+    backing = SQLiteMockStore(str(tmp_path / "mock.sqlite3"))
+    store = WriteBehindMockStore(backing, flush_threshold=0)
+    store.put("attempts", "attempt-1", {"id": "attempt-1"})
+    with patch.object(backing, "write_batch_checked", side_effect=sqlite3.OperationalError("disk I/O error")):
+        with pytest.raises(sqlite3.OperationalError):
+            store.flush()
+    assert store.stats()["flush_errors"] == 1
+    assert store.flush() == 1
+
+def test_write_behind_sees_writes_flushed_by_other_processes(tmp_path):
+    path = str(tmp_path / "mock.sqlite3")
+    worker_a = WriteBehindMockStore(SQLiteMockStore(path), flush_threshold=0)
+    worker_b = WriteBehindMockStore(SQLiteMockStore(path), flush_threshold=0)
+
+    worker_a.put("attempts", "attempt-1", {"id": "attempt-1", "current_question_index": 1})
+    worker_a.flush()
+    assert worker_b.get("attempts", "attempt-1")["current_question_index"] == 1
+
+    worker_b.put("attempts", "attempt-1", {"id": "attempt-1", "current_question_index": 2})
+    worker_b.flush()
+    # Nothing pending in worker A, so it reads the stored record instead of a stale copy
+    assert worker_a.get("attempts", "attempt-1")["current_question_index"] == 2
+    assert worker_a.stats()["dirty_records"] == 0
+
+def test_write_behind_does_not_overwrite_a_newer_record(tmp_path):
+    path = str(tmp_path / "mock.sqlite3")
+    worker_a = WriteBehindMockStore(SQLiteMockStore(path), flush_threshold=0)
+    worker_b = WriteBehindMockStore(SQLiteMockStore(path), flush_threshold=0)
+    worker_a.put("attempts", "attempt-1", {"id": "attempt-1", "current_question_index": 0})
+    worker_a.flush()
+
+    worker_a.put("attempts", "attempt-1", {"id": "attempt-1", "current_question_index": 1})
+    worker_b.put("attempts", "attempt-1", {"id": "attempt-1", "current_question_index": 5})
+    assert worker_b.flush() == 1
+    assert worker_a.flush() == 0
+
+    assert worker_a.get("attempts", "attempt-1")["current_question_index"] == 5
+    assert worker_a.stats()["flush_conflicts"] == 1
+
+def test_adds_version_column_to_existing_store(tmp_path):
+    path = str(tmp_path / "mock.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE attempts (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+    conn.execute("INSERT INTO attempts VALUES ('attempt-1', '{\"id\": \"attempt-1\"}')")
+    conn.commit()
+    conn.close()
+
+    store = WriteBehindMockStore(SQLiteMockStore(path), flush_threshold=0)
+    store.put("attempts", "attempt-1", {"id": "attempt-1", "current_question_index": 3})
+    assert store.flush() == 1
+    assert store.backing.version("attempts", "attempt-1") == 1
+
+@pytest.mark.asyncio
+async def test_background_flush_runs_on_threshold(tmp_path):
+    backing = SQLiteMockStore(str(tmp_path / "mock.sqlite3"))
+    store = WriteBehindMockStore(backing, flush_interval=60, flush_threshold=2)
+    task = asyncio.create_task(store.run_background_flush())
+    await asyncio.sleep(0)
+    try:
+        store.put("attempts", "attempt-1", {"id": "attempt-1"})
+        store.put("attempts", "attempt-2", {"id": "attempt-2"})
+        for _ in range(100):
+            if backing.count("attempts") == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert backing.count("attempts") == 2
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+def test_lifespan_flushes_mock_store_on_shutdown(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    backing = SQLiteMockStore(str(tmp_path / "mock.sqlite3"))
+    store = WriteBehindMockStore(backing, flush_interval=60, flush_threshold=0)
+    monkeypatch.setattr(mock_storage, "_store", store)
+    monkeypatch.setattr("app.main.get_mock_store", lambda: store)
+    monkeypatch.setattr("app.main.readiness.checks", {})
+
+    with TestClient(app):
+        mock_storage.save_mock_attempt({"id": "attempt-1", "current_question_index": 3})
+        assert backing.get("attempts", "attempt-1") is None
+    assert backing.get("attempts", "attempt-1")["current_question_index"] == 3
@@ -0,0 +1,107 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+from app.services import prompt_registry as prompt_registry_module
+from app.services.prompt_registry import FALLBACK_TEMPLATES, QUIZ_PROMPT_KEY, PromptRegistry, PromptTemplate
+
+def make_supabase(rows=None, single=None):
+    supabase = MagicMock()
+    table = supabase.table.return_value
+    table.select.return_value.execute.return_value = MagicMock(data=rows or [])
+    table.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(data=single)
+    return supabase, table
+
+@pytest.mark.asyncio
+async def test_preloaded_templates_are_served_without_a_lookup():
+    registry = PromptRegistry(ttl=300)
+    supabase, table = make_supabase(rows=[{"key": QUIZ_PROMPT_KEY, "template": "Quiz {{notes}} x{{quiz_length}}"}, {"key": "other", "template": "Other"}])
+    assert await registry.load_all(supabase) == 2
+
+    table.select.reset_mock()
+    for _ in range(5):
+        prompt = await registry.get(QUIZ_PROMPT_KEY, supabase)
+    assert prompt.template == "Quiz {{notes}} x{{quiz_length}}"
+    table.select.assert_not_called()
+    assert registry.stats()["hits"] == 5
+    assert registry.version(QUIZ_PROMPT_KEY) == prompt.version
+
+@pytest.mark.asyncio
+async def test_missing_key_is_fetched_once_then_cached():
+    registry = PromptRegistry(ttl=300)
+    supabase, table = make_supabase(single={"template": "Fetched {{notes}} x{{quiz_length}}"})
+    first = await registry.get(QUIZ_PROMPT_KEY, supabase)
+    second = await registry.get(QUIZ_PROMPT_KEY, supabase)
+    assert first is second
+    assert table.select.return_value.eq.call_count == 1
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_served_while_refreshing(monkeypatch):
+    registry = PromptRegistry(ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr(prompt_registry_module.time, "monotonic", lambda: now[0])
+    supabase, table = make_supabase(single={"template": "v1 {{notes}} x{{quiz_length}}"})
+    old = await registry.get(QUIZ_PROMPT_KEY, supabase)
+
+    table.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(data={"template": "v2 {{notes}} x{{quiz_length}}"})
+    now[0] += 11
+    assert await registry.get(QUIZ_PROMPT_KEY, supabase) is old
+    await asyncio.gather(*registry._tasks)
+
+    new = await registry.get(QUIZ_PROMPT_KEY, supabase)
+    assert new.template == "v2 {{notes}} x{{quiz_length}}"
+    assert new.version != old.version
+
+@pytest.mark.asyncio
+async def test_fallback_when_lookup_fails_and_last_good_template_is_kept():
+    registry = PromptRegistry(ttl=300)
+    supabase, table = make_supabase()
+    table.select.return_value.eq.return_value.single.return_value.execute.side_effect = Exception("PGRST116")
+    prompt = await registry.get(QUIZ_PROMPT_KEY, supabase)
+    assert prompt.is_fallback
+    assert prompt.template == FALLBACK_TEMPLATES[QUIZ_PROMPT_KEY]
+    assert registry.stats()["fallbacks"] == 1
+
+    good = PromptTemplate(QUIZ_PROMPT_KEY, "Good {{notes}} x{{quiz_length}}")
+    registry._store(good)
+    assert await registry._fetch(QUIZ_PROMPT_KEY, supabase) == good
+
+def test_version_is_content_addressed():
+    assert PromptTemplate("k", "A").version == PromptTemplate("k", "A").version
+    assert PromptTemplate("k", "A").version != PromptTemplate("k", "B").version
+    assert PromptTemplate("k", "A").version.startswith("k:")
+
+def test_version_info_metric():
+    registry = PromptRegistry()
+    registry._store(PromptTemplate(QUIZ_PROMPT_KEY, "T"))
+    [_, line] = registry.render_metrics()
+    assert line.startswith(f'prompt_template_info{{key="{QUIZ_PROMPT_KEY}",version="{QUIZ_PROMPT_KEY}:')
+    assert line.endswith('fallback="false"} 1')
+
+@pytest.mark.asyncio
+async def test_template_with_wrong_variables_is_rejected():
+    registry = PromptRegistry(ttl=300)
+    supabase, _ = make_supabase(rows=[{"key": QUIZ_PROMPT_KEY, "template": "Quiz {{notes}} for {{course}}"}])
+    assert await registry.load_all(supabase) == 0
+    assert registry.stats()["load_errors"] == 1
+
+    # On demand: the fallback, or the last good template once there is one
+    supabase, _ = make_supabase(single={"template": "Bad {{notes}}"})
+    assert (await registry.get(QUIZ_PROMPT_KEY, supabase)).is_fallback
+    good = PromptTemplate(QUIZ_PROMPT_KEY, "Good {{notes}} x{{quiz_length}}")
+    registry._store(good)
+    assert await registry._fetch(QUIZ_PROMPT_KEY, supabase) == good
+
+@pytest.mark.asyncio
+async def test_background_refresh_preloads_right_away():
+    registry = PromptRegistry(ttl=300)
+    supabase, _ = make_supabase(rows=[{"key": QUIZ_PROMPT_KEY, "template": "Quiz {{notes}} x{{quiz_length}}"}])
+    task = asyncio.create_task(registry.run_background_refresh(lambda: supabase))
+    try:
+        for _ in range(100):
+            if registry.stats()["loads"]:
+                break
+            await asyncio.sleep(0.01)
+        assert registry.stats()["templates"] == 1
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,53 @@
+import pytest
+from fastapi import HTTPException
+from unittest.mock import MagicMock, patch
+from app.models.quiz import QuizGenerateRequest
+from app.services.prompt_registry import FALLBACK_TEMPLATES, QUIZ_PROMPT_KEY, PromptTemplate
+from app.services.prompt_template import CompiledTemplate, TemplateError, estimate_tokens
+from app.services.quiz_service import GenerationInputs, load_generation_inputs
+
+def test_render_matches_replace_and_is_single_pass():
+    template = FALLBACK_TEMPLATES[QUIZ_PROMPT_KEY]
+    compiled = CompiledTemplate(template)
+    assert compiled.variables == {"notes", "quiz_length"}
+    assert compiled.render(notes="Cells", quiz_length=5) == template.replace("{{notes}}", "Cells").replace("{{quiz_length}}", "5")
+
+    # Placeholder-like text inside the notes is left alone
+    rendered = CompiledTemplate("{{ notes }}|{{quiz_length}}").render(notes="see {{quiz_length}}", quiz_length=3)
+    assert rendered == "see {{quiz_length}}|3"
+
+def test_missing_values_and_invalid_templates_raise():
+    compiled = CompiledTemplate("{{notes}} {{quiz_length}}")
+    with pytest.raises(TemplateError, match="quiz_length"):
+        compiled.render(notes="x")
+
+    compiled.validate({"notes", "quiz_length"})
+    with pytest.raises(TemplateError, match="missing quiz_length"):
+        CompiledTemplate("{{notes}}").validate({"notes", "quiz_length"})
+    with pytest.raises(TemplateError, match="unknown course"):
+        CompiledTemplate("{{notes}} {{quiz_length}} {{course}}").validate({"notes", "quiz_length"})
+
+def test_token_estimate_matches_rendered_prompt():
+    compiled = CompiledTemplate(FALLBACK_TEMPLATES[QUIZ_PROMPT_KEY])
+    notes = "Mitochondria produce ATP. " * 500
+    assert compiled.estimate_tokens(notes=notes, quiz_length=10) == estimate_tokens(compiled.render(notes=notes, quiz_length=10))
+
+def test_notes_budget_leaves_room_for_the_template():
+    inputs = GenerationInputs(course_id=None, notes=["a" * 100], prompt=PromptTemplate(QUIZ_PROMPT_KEY, "x" * 400 + "{{notes}}{{quiz_length}}"))
+    assert inputs.notes_budget(5, 1000) == 1000 - 101
+    assert inputs.notes_budget(5, 150) == 75
+
+@pytest.mark.asyncio
+async def test_oversized_prompt_is_rejected_before_generation():
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.in_.return_value.execute.return_value = MagicMock(data=[{"content": "a" * 4000, "course_id": "c1"}])
+    supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(data=None)
+
+    request = QuizGenerateRequest(note_ids=["n1"], quiz_length=5)
+    with patch("app.services.quiz_service.MAX_PROMPT_TOKENS", 500):
+        with pytest.raises(HTTPException) as exc_info:
+            await load_generation_inputs(request, supabase)
+    assert exc_info.value.status_code == 413
+
+    inputs = await load_generation_inputs(request, supabase)
+    assert "a" * 4000 in inputs.render_prompt(inputs.full_notes, 5)
@@ -0,0 +1,90 @@
+import logging
+import time
+import pytest
+from unittest.mock import MagicMock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core import query_metrics
+from app.core.database import execute_async
+from app.core.metrics import registry
+from app.core.query_metrics import InstrumentedClient, QueryCountMiddleware, QueryStats, query_stats
+
+@pytest.fixture(autouse=True)
+def clear_query_stats():
+    query_stats.clear()
+    yield
+    query_stats.clear()
+
+def load_quiz(supabase, quiz_id):
+    return supabase.table("quizzes").select("*").eq("id", quiz_id).single().execute()
+
+def test_queries_are_tagged_with_table_operation_and_caller():
+    raw = MagicMock()
+    raw.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(data={"id": "quiz-1"})
+    supabase = InstrumentedClient(raw)
+
+    response = load_quiz(supabase, "quiz-1")
+    assert response.data == {"id": "quiz-1"}
+    raw.table.return_value.select.assert_called_once_with("*")
+
+    [row] = query_stats.summary()
+    assert row["table"] == "quizzes"
+    assert row["operation"] == "select"
+    assert row["caller"] == f"{__name__}.load_quiz"
+    assert row["count"] == 1
+    assert row["errors"] == 0
+
+def test_rpc_and_errors_are_recorded():
+    raw = MagicMock()
+    raw.rpc.return_value.execute.side_effect = Exception("boom")
+    supabase = InstrumentedClient(raw)
+
+    with pytest.raises(Exception):
+        supabase.rpc("get_attempt_results", {"p_attempt_id": "a"}).execute()
+
+    raw.rpc.assert_called_once_with("get_attempt_results", {"p_attempt_id": "a"})
+    [row] = query_stats.summary()
+    assert (row["table"], row["operation"], row["errors"]) == ("rpc:get_attempt_results", "rpc", 1)
+
+def test_percentiles_over_recent_samples():
+    stats = QueryStats(window=100)
+    for ms in range(1, 101):
+        stats.record(("quizzes", "select", "caller"), ms / 1000)
+    [row] = stats.summary()
+    assert row["p50_ms"] == pytest.approx(50)
+    assert row["p95_ms"] == pytest.approx(95)
+    assert row["p99_ms"] == pytest.approx(99)
+    assert 'supabase_query_latency_ms{table="quizzes",operation="select",caller="caller",quantile="p95"} 95.000' in stats.render_metrics()
+
+def test_slow_queries_are_logged(monkeypatch, caplog):
+    monkeypatch.setattr(query_metrics, "SLOW_QUERY_MS", 5)
+    raw = MagicMock()
+    raw.table.return_value.update.return_value.eq.return_value.execute.side_effect = lambda: time.sleep(0.01)
+    supabase = InstrumentedClient(raw)
+
+    with caplog.at_level(logging.WARNING, logger="app.core.query_metrics"):
+        supabase.table("quiz_attempts").update({"score": 1}).eq("id", "a").execute()
+    assert "Slow Supabase query: update quiz_attempts" in caplog.text
+
+def test_non_query_attributes_are_delegated():
+    raw = MagicMock()
+    supabase = InstrumentedClient(raw)
+    assert supabase.auth is raw.auth
+    assert supabase.wrapped is raw
+
+def test_request_query_count_spans_executor_threads():
+    raw = MagicMock()
+    supabase = InstrumentedClient(raw)
+    app = FastAPI()
+    app.add_middleware(QueryCountMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def items(item_id: str):
+        for _ in range(3):
+            await execute_async(supabase.table("quiz_questions").select("*").eq("quiz_id", item_id))
+        return {"ok": True}
+
+    response = TestClient(app).get("/items/abc")
+    assert response.headers["x-db-query-count"] == "3"
+    assert query_metrics.http_request_db_queries.count(route="/items/{item_id}") >= 1
+    assert "supabase_queries_total" in registry.render()
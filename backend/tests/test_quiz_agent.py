@@ -1,5 +1,8 @@
 import pytest
 import os
+import subprocess
+import sys
+from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock, patch
 from pydantic_ai import RunContext
 from app.agents.quiz_agent import generate_quiz_content, search_web
@@ -119,4 +122,19 @@ async def test_search_web_api_error():
             ctx = MagicMock(spec=RunContext)
             result = await search_web(ctx, "test query")
             assert "Error performing search" in result
-            assert "API Error" in result
\ No newline at end of file
+            assert "API Error" in result
+
+
+def test_app_import_does_not_build_the_agent():
+    # The agent (pydantic-ai + Google SDK) is built on first use or by the startup prewarm
+    code = "import sys, app.main; print('pydantic_ai' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=Path(__file__).resolve().parent.parent, env={**os.environ, "GOOGLE_API_KEY": "dummy"})
+    assert out.stdout.strip() == "False"
+
+def test_agent_is_built_once_with_the_search_tool():
+    from app.agents import quiz_agent
+    agent = quiz_agent.get_quiz_agent()
+    assert quiz_agent.get_quiz_agent() is agent
+    assert quiz_agent.quiz_agent is agent
+    assert "search_web" in agent._function_toolset.tools
@@ -0,0 +1,113 @@
+import pytest
+from unittest.mock import MagicMock
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from jose import jwt
+from app.main import app
+from app.models.quiz_submission import QuizBatchSubmissionRequest
+from app.services.quiz_snapshot import attempt_state_cache
+from app.services.quiz_submission import submit_answers_batch
+
+QUESTION_ROWS = [
+    {
+        "id": f"q{i}", "position": i, "question_text": f"Question {i}?", "correct_answer_index": 1, "explanation": f"Because {i}.",
+        "quiz_options": [{"id": f"q{i}-o{j}", "option_text": f"Option {j}", "option_index": j} for j in range(4)],
+    }
+    for i in range(3)
+]
+
+def make_supabase():
+    tables = {name: MagicMock() for name in ("quizzes", "quiz_questions", "quiz_answers", "quiz_attempts")}
+    supabase = MagicMock()
+    supabase.table.side_effect = lambda name: tables[name]
+    tables["quizzes"].select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(data={"title": "Quiz", "user_id": "user-1"})
+    tables["quiz_questions"].select.return_value.eq.return_value.execute.return_value = MagicMock(data=QUESTION_ROWS)
+    tables["quiz_answers"].insert.side_effect = lambda rows: MagicMock(execute=MagicMock(return_value=MagicMock(data=rows)))
+    return supabase, tables
+
+def batch(*answers):
+    return QuizBatchSubmissionRequest(attempt_id="attempt-1", answers=[{"question_id": q, "answer_id": a} for q, a in answers])
+
+@pytest.mark.asyncio
+async def test_batch_is_graded_from_one_quiz_fetch_and_inserted_once():
+    supabase, tables = make_supabase()
+    attempt_state_cache.set("attempt-1", "user-1", "quiz-1")
+
+    response = await submit_answers_batch("quiz-1", batch(("q0", "q0-o1"), ("q1", "q1-o3"), ("q2", "q2-o1")), "user-1", supabase)
+
+    assert [r.is_correct for r in response.results] == [True, False, True]
+    assert response.accepted == 3 and response.correct == 2
+    assert response.results[1].correct_answer_id == "q1-o1"
+    assert response.results[1].feedback_text == "Incorrect. Because 1."
+    tables["quiz_answers"].insert.assert_called_once()
+    rows = tables["quiz_answers"].insert.call_args.args[0]
+    assert [(r["question_id"], r["selected_option_index"], r["is_correct"]) for r in rows] == [("q0", 1, True), ("q1", 3, False), ("q2", 1, True)]
+    # Attempt came from the cache; the quiz was read once
+    tables["quiz_attempts"].select.assert_not_called()
+    assert tables["quiz_questions"].select.call_count == 1
+
+@pytest.mark.asyncio
+async def test_invalid_and_superseded_answers_are_reported_per_item():
+    supabase, tables = make_supabase()
+    attempt_state_cache.set("attempt-1", "user-1", "quiz-1")
+
+    response = await submit_answers_batch(
+        "quiz-1",
+        batch(("q0", "q0-o0"), ("missing", "x"), ("q1", "q2-o1"), ("q0", "q0-o1")),
+        "user-1", supabase,
+    )
+
+    assert [(r.accepted, r.error) for r in response.results] == [
+        (False, "Superseded by a later answer to the same question"),
+        (False, "Question not found"),
+        (False, "Invalid answer ID"),
+        (True, None),
+    ]
+    rows = tables["quiz_answers"].insert.call_args.args[0]
+    assert [(r["question_id"], r["is_correct"]) for r in rows] == [("q0", True)]
+
+@pytest.mark.asyncio
+async def test_invalid_later_answer_does_not_supersede_a_valid_one():
+    supabase, tables = make_supabase()
+    attempt_state_cache.set("attempt-1", "user-1", "quiz-1")
+
+    response = await submit_answers_batch("quiz-1", batch(("q0", "q0-o1"), ("q0", "bad-option")), "user-1", supabase)
+
+    assert [(r.accepted, r.error) for r in response.results] == [(True, None), (False, "Invalid answer ID")]
+    rows = tables["quiz_answers"].insert.call_args.args[0]
+    assert [(r["question_id"], r["selected_option_index"]) for r in rows] == [("q0", 1)]
+
+@pytest.mark.asyncio
+async def test_batch_rejects_other_users_and_other_quizzes():
+    supabase, tables = make_supabase()
+    attempt_state_cache.set("attempt-1", "user-1", "quiz-1")
+
+    with pytest.raises(HTTPException) as exc_info:
+        await submit_answers_batch("quiz-1", batch(("q0", "q0-o1")), "user-2", supabase)
+    assert exc_info.value.status_code == 403
+
+    with pytest.raises(HTTPException) as exc_info:
+        await submit_answers_batch("quiz-2", batch(("q0", "q0-o1")), "user-1", supabase)
+    assert exc_info.value.status_code == 400
+    tables["quiz_answers"].insert.assert_not_called()
+
+@pytest.fixture
+def auth_headers(monkeypatch):
+    secret = "testsecret"
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", secret)
+    token = jwt.encode({"sub": "user-1", "aud": "authenticated"}, secret, algorithm="HS256")
+    return {"Authorization": f"Bearer {token}"}
+
+def test_batch_endpoint(auth_headers, monkeypatch):
+    supabase, _ = make_supabase()
+    monkeypatch.setattr("app.api.routers.quiz.get_supabase_client", lambda: supabase)
+    attempt_state_cache.set("attempt-1", "user-1", "quiz-1")
+    client = TestClient(app)
+
+    body = {"attempt_id": "attempt-1", "answers": [{"question_id": "q0", "answer_id": "q0-o1"}]}
+    response = client.post("/api/v1/quiz/quiz-1/answers", json=body, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["results"][0]["is_correct"] is True
+
+    response = client.post("/api/v1/quiz/quiz-1/answers", json={"attempt_id": "attempt-1", "answers": []}, headers=auth_headers)
+    assert response.status_code == 422
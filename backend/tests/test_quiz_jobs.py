@@ -0,0 +1,164 @@
+import asyncio
+import json
+import time
+import pytest
+from unittest.mock import MagicMock
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from jose import jwt
+from app.main import app
+from app.models.quiz import QuizResponse, QuestionResponse, OptionResponse
+
+mock_quiz_response = QuizResponse(
+    id="quiz-uuid",
+    title="Background Quiz",
+    questions=[
+        QuestionResponse(
+            id="q-uuid",
+            question_text="Test Question?",
+            options=[OptionResponse(id=f"o{i}", option_text=t, option_index=i) for i, t in enumerate("ABCD")],
+            correct_answer_index=0,
+            explanation="Because A."
+        )
+    ]
+)
+
+@pytest.fixture
+def auth_headers(monkeypatch):
+    secret = "testsecret"
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", secret)
+    token = jwt.encode({"sub": "job-user", "aud": "authenticated"}, secret, algorithm="HS256")
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def fake_generation(monkeypatch):
+    state = {"delay": 0.0, "error": None}
+
+    async def fake_generate_quiz(request, user_id, supabase, progress=None):
+        for stage in ("notes_fetched", "model_running"):
+            progress(stage)
+        await asyncio.sleep(state["delay"])
+        if state["error"]:
+            raise state["error"]
+        progress("persisting")
+        return mock_quiz_response
+
+    monkeypatch.setattr("app.services.quiz_jobs.generate_quiz", fake_generate_quiz)
+    monkeypatch.setattr("app.services.quiz_jobs.get_supabase_client", lambda: MagicMock())
+    return state
+
+def _wait_for_job(client, job_id, headers, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        data = client.get(f"/api/v1/quiz/jobs/{job_id}", headers=headers).json()
+        if data["status"] in ("completed", "failed"):
+            return data
+        time.sleep(0.02)
+    raise AssertionError("job did not finish in time")
+
+def test_job_returns_immediately_and_completes(auth_headers, fake_generation):
+    with TestClient(app) as client:
+        response = client.post("/api/v1/quiz/jobs", json={"note_ids": ["n1"], "quiz_length": 5}, headers=auth_headers)
+        assert response.status_code == 202
+        job = response.json()
+        assert job["status"] == "queued"
+
+        data = _wait_for_job(client, job["job_id"], auth_headers)
+        assert data["status"] == "completed"
+        assert data["stage"] == "done"
+        assert data["quiz"]["id"] == "quiz-uuid"
+
+def test_job_event_stream_reports_stages(auth_headers, fake_generation):
+    with TestClient(app) as client:
+        job = client.post("/api/v1/quiz/jobs", json={"note_ids": ["n1"], "quiz_length": 5}, headers=auth_headers).json()
+
+        stages = []
+        with client.stream("GET", f"/api/v1/quiz/jobs/{job['job_id']}/events", headers=auth_headers) as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            for line in response.iter_lines():
+                if line.startswith("data: "):
+                    stages.append(json.loads(line[len("data: "):]))
+
+        assert [e["stage"] for e in stages] == ["queued", "running", "notes_fetched", "model_running", "persisting", "done"]
+        assert stages[-1]["quiz_id"] == "quiz-uuid"
+
+def test_job_event_stream_sends_keepalives_while_idle(auth_headers, fake_generation, monkeypatch):
+    monkeypatch.setattr("app.api.routers.quiz.SSE_KEEPALIVE_SECONDS", 0.05)
+    fake_generation["delay"] = 0.3
+    with TestClient(app) as client:
+        job = client.post("/api/v1/quiz/jobs", json={"note_ids": ["n1"], "quiz_length": 5}, headers=auth_headers).json()
+
+        lines = []
+        with client.stream("GET", f"/api/v1/quiz/jobs/{job['job_id']}/events", headers=auth_headers) as response:
+            for line in response.iter_lines():
+                lines.append(line)
+
+    # The model stage is silent for 0.3s: comments keep the connection busy, then the stream completes
+    assert ": keepalive" in lines
+    stages = [json.loads(line[len("data: "):])["stage"] for line in lines if line.startswith("data: ")]
+    assert stages[-1] == "done"
+    assert lines.index(": keepalive") > lines.index('data: {"stage": "model_running"}')
+
+def test_failed_job_reports_error(auth_headers, fake_generation):
+    fake_generation["error"] = HTTPException(status_code=400, detail="No notes found for selected items.")
+    with TestClient(app) as client:
+        job = client.post("/api/v1/quiz/jobs", json={"note_ids": ["n1"], "quiz_length": 5}, headers=auth_headers).json()
+        data = _wait_for_job(client, job["job_id"], auth_headers)
+        assert data["status"] == "failed"
+        assert data["error"] == "No notes found for selected items."
+
+def test_per_user_job_limit(auth_headers, fake_generation):
+    fake_generation["delay"] = 0.3
+    with TestClient(app) as client:
+        payload = {"note_ids": ["n1"], "quiz_length": 5}
+        first = client.post("/api/v1/quiz/jobs", json=payload, headers=auth_headers)
+        second = client.post("/api/v1/quiz/jobs", json=payload, headers=auth_headers)
+        third = client.post("/api/v1/quiz/jobs", json=payload, headers=auth_headers)
+        assert first.status_code == 202
+        assert second.status_code == 202
+        assert third.status_code == 429
+
+        _wait_for_job(client, first.json()["job_id"], auth_headers)
+        _wait_for_job(client, second.json()["job_id"], auth_headers)
+        assert client.post("/api/v1/quiz/jobs", json=payload, headers=auth_headers).status_code == 202
+
+def test_job_not_visible_to_other_users(auth_headers, fake_generation, monkeypatch):
+    with TestClient(app) as client:
+        job = client.post("/api/v1/quiz/jobs", json={"note_ids": ["n1"], "quiz_length": 5}, headers=auth_headers).json()
+        other_token = jwt.encode({"sub": "someone-else", "aud": "authenticated"}, "testsecret", algorithm="HS256")
+        response = client.get(f"/api/v1/quiz/jobs/{job['job_id']}", headers={"Authorization": f"Bearer {other_token}"})
+        assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_event_stream_ends_when_events_are_gone():
+    from app.services.quiz_jobs import InMemoryJobBackend, QuizJobManager
+
+    manager = QuizJobManager()
+    manager.backend = InMemoryJobBackend()
+    job = {"id": "job-1", "stage": "running", "quiz": None, "error": None}
+    manager.backend.save_job(job)
+    manager.backend.publish("job-1", {"stage": "running"})
+
+    # Pruned while a subscriber waits for the next event
+    received = []
+
+    async def consume():
+        async for event in manager.events("job-1"):
+            received.append(event)
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0)
+    manager.backend.delete_job("job-1")
+    await asyncio.wait_for(task, 1)
+    assert received == [{"stage": "running"}]
+
+    # Subscribing after pruning returns at once
+    assert await asyncio.wait_for(_collect(manager.events("job-1")), 1) == []
+
+    # Finished, but its events are gone: the final event comes from the stored job
+    manager.backend.save_job({**job, "stage": "done", "quiz": {"id": "quiz-1"}})
+    events = await asyncio.wait_for(_collect(manager.events("job-1")), 1)
+    assert events == [{"stage": "done", "quiz_id": "quiz-1"}]
+
+async def _collect(stream):
+    return [event async for event in stream]
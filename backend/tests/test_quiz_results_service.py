@@ -1,89 +1,118 @@
 import pytest
 from unittest.mock import MagicMock
+from fastapi import HTTPException
 from app.services.quiz_submission import get_quiz_results
 from datetime import datetime
 
 @pytest.mark.asyncio
 async def test_get_quiz_results_service_success():
     mock_supabase = MagicMock()
-    
-    # 1. Mock Attempt Fetch
-    mock_attempt_res = MagicMock()
-    mock_attempt_res.data = {
-        "id": "attempt-1", 
-        "user_id": "user-1", 
-        "quiz_id": "quiz-1",
-        "end_time": "2023-01-01T12:00:00",
-        "score": None # Logic should update this
-    }
-    
-    # 2. Mock Total Questions Count
-    mock_q_count_res = MagicMock()
-    mock_q_count_res.count = 10
-    
-    # 3. Mock Score Count
-    mock_score_res = MagicMock()
-    mock_score_res.count = 8
-    
-    # 4. Mock Update Score
-    mock_update_res = MagicMock()
 
-    def table_side_effect(name):
-        mock_table = MagicMock()
-        if name == "quiz_attempts":
-            # Handling .select().eq().single().execute() AND .update().eq().execute()
-            mock_table.select.return_value.eq.return_value.single.return_value.execute.return_value = mock_attempt_res
-            mock_table.update.return_value.eq.return_value.execute.return_value = mock_update_res
-        elif name == "quiz_questions":
-            mock_table.select.return_value.eq.return_value.execute.return_value = mock_q_count_res
-        elif name == "quiz_answers":
-            mock_table.select.return_value.eq.return_value.eq.return_value.execute.return_value = mock_score_res
-        return mock_table
-    
-    mock_supabase.table.side_effect = table_side_effect
+    # One RPC call scores the attempt and persists score/end_time
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(data={
+        "user_id": "user-1",
+        "quiz_id": "quiz-1",
+        "score": 8,
+        "total_questions": 10,
+        "end_time": "2023-01-01T12:00:00"
+    })
 
     result = await get_quiz_results("quiz-1", "attempt-1", "user-1", mock_supabase)
-    
+
     assert result.score == 8
     assert result.total_questions == 10
     assert result.percentage == 80.0
     assert result.completed_at == datetime(2023, 1, 1, 12, 0, 0)
-    
-    # Verify score update was called
-    # Note: mocking chain calls is tricky to assert exactly without capturing the mock objects returned by calls
-    # But we can check if table("quiz_attempts").update(...) was accessed.
+
+    mock_supabase.rpc.assert_called_once_with("get_attempt_results", {"p_attempt_id": "attempt-1", "p_user_id": "user-1"})
+    mock_supabase.table.assert_not_called()
 
 @pytest.mark.asyncio
-async def test_get_quiz_results_no_end_time():
+async def test_get_quiz_results_other_user_forbidden():
     mock_supabase = MagicMock()
-    
-    mock_attempt_res = MagicMock()
-    mock_attempt_res.data = {
-        "id": "attempt-1", 
-        "user_id": "user-1", 
-        "quiz_id": "quiz-1",
-        "end_time": None, # Missing end time
-        "score": 5
-    }
-    
-    mock_q_count_res = MagicMock()
-    mock_q_count_res.count = 10
-    mock_score_res = MagicMock()
-    mock_score_res.count = 5
-    
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(data={"user_id": "someone-else"})
+
+    with pytest.raises(HTTPException) as exc:
+        await get_quiz_results("quiz-1", "attempt-1", "user-1", mock_supabase)
+    assert exc.value.status_code == 403
+
+def _fallback_supabase(attempt, answers, updates):
+    mock_supabase = MagicMock()
+    mock_supabase.rpc.return_value.execute.side_effect = Exception("function get_attempt_results does not exist")
+
     def table_side_effect(name):
         mock_table = MagicMock()
         if name == "quiz_attempts":
-            mock_table.select.return_value.eq.return_value.single.return_value.execute.return_value = mock_attempt_res
+            mock_table.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(data=attempt)
+
+            def update(values):
+                updates.append(values)
+                return MagicMock()
+            mock_table.update.side_effect = update
         elif name == "quiz_questions":
-            mock_table.select.return_value.eq.return_value.execute.return_value = mock_q_count_res
+            mock_table.select.return_value.eq.return_value.execute.return_value = MagicMock(count=10)
         elif name == "quiz_answers":
-            mock_table.select.return_value.eq.return_value.eq.return_value.execute.return_value = mock_score_res
+            mock_table.select.return_value.eq.return_value.order.return_value.execute.return_value = MagicMock(data=answers)
         return mock_table
-    
+
     mock_supabase.table.side_effect = table_side_effect
-    
-    result = await get_quiz_results("quiz-1", "attempt-1", "user-1", mock_supabase)
-    
-    # Should default to utcnow (approx check)
+    return mock_supabase
+
+@pytest.mark.asyncio
+async def test_get_quiz_results_fallback_counts_latest_answer_per_question():
+    attempt = {"id": "attempt-1", "user_id": "user-1", "quiz_id": "quiz-1", "end_time": "2023-01-01T12:00:00", "score": None}
+    # Newest first: q1 was corrected, q2 was answered correctly then changed, q3 answered correctly twice
+    answers = [
+        {"question_id": "q1", "is_correct": True},
+        {"question_id": "q2", "is_correct": False},
+        {"question_id": "q3", "is_correct": True},
+        {"question_id": "q1", "is_correct": False},
+        {"question_id": "q2", "is_correct": True},
+        {"question_id": "q3", "is_correct": True},
+    ]
+    updates = []
+
+    result = await get_quiz_results("quiz-1", "attempt-1", "user-1", _fallback_supabase(attempt, answers, updates))
+
+    assert result.score == 2
+    assert result.total_questions == 10
+    assert result.percentage == 20.0
+    assert updates == [{"score": 2, "end_time": "2023-01-01T12:00:00"}]
+
+@pytest.mark.asyncio
+async def test_get_quiz_results_no_end_time():
+    attempt = {"id": "attempt-1", "user_id": "user-1", "quiz_id": "quiz-1", "end_time": None, "score": 5}
+    updates = []
+
+    result = await get_quiz_results("quiz-1", "attempt-1", "user-1", _fallback_supabase(attempt, [], updates))
+
+    # Should default to utcnow (approx check) and persist it
     assert isinstance(result.completed_at, datetime)
+    assert updates[0]["end_time"] is not None
+
+@pytest.mark.asyncio
+async def test_get_quiz_results_does_not_fall_back_after_rpc_timeout():
+    import httpx
+    mock_supabase = MagicMock()
+    mock_supabase.rpc.return_value.execute.side_effect = httpx.ReadTimeout("timed out")
+
+    with pytest.raises(HTTPException) as exc:
+        await get_quiz_results("quiz-1", "attempt-1", "user-1", mock_supabase)
+    assert exc.value.status_code == 500
+    mock_supabase.table.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_get_quiz_results_outage_in_query_fallback_is_503(monkeypatch, tmp_path):
+    import httpx
+    from app.services import mock_storage
+    from app.services.mock_storage import SQLiteMockStore
+    monkeypatch.setattr(mock_storage, "_store", SQLiteMockStore(str(tmp_path / "mock.sqlite3")))
+    mock_supabase = _fallback_supabase(None, [], [])
+    attempts = MagicMock()
+    attempts.select.return_value.eq.return_value.single.return_value.execute.side_effect = httpx.ConnectError("unreachable")
+    mock_supabase.table.side_effect = lambda name: attempts
+
+    with pytest.raises(HTTPException) as exc:
+        await get_quiz_results("quiz-1", "attempt-1", "user-1", mock_supabase)
+    assert exc.value.status_code == 503
+    assert "Retry-After" in exc.value.headers
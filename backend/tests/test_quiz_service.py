@@ -77,3 +77,134 @@ async def test_generate_quiz_service_no_notes():
     
     assert excinfo.value.status_code == 400
     assert "No notes found" in excinfo.value.detail
+
+def _generated_quiz(n=3):
+    return QuizGenerated(
+        title="Gen Quiz",
+        questions=[
+            QuestionGenerated(question_text=f"Q{i}", options=["A", "B", "C", "D"], correct_answer_index=i % 4, explanation=f"Exp {i}")
+            for i in range(n)
+        ]
+    )
+
+@pytest.mark.asyncio
+async def test_persist_generated_quiz_single_rpc():
+    from app.services.quiz_service import persist_generated_quiz
+    mock_supabase = MagicMock()
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(data={
+        "quiz_id": "quiz-1",
+        "questions": [
+            {"id": f"q{i}", "option_ids": [f"q{i}-o{j}" for j in range(4)]}
+            for i in range(3)
+        ]
+    })
+
+    response = await persist_generated_quiz(_generated_quiz(), "user-1", "course-1", mock_supabase)
+
+    mock_supabase.rpc.assert_called_once()
+    name, params = mock_supabase.rpc.call_args[0]
+    assert name == "create_generated_quiz"
+    assert len(params["p_questions"]) == 3
+    mock_supabase.table.assert_not_called()
+    assert response.id == "quiz-1"
+    assert [q.id for q in response.questions] == ["q0", "q1", "q2"]
+    assert response.questions[2].options[3].id == "q2-o3"
+    assert response.questions[2].options[3].option_index == 3
+
+@pytest.mark.asyncio
+async def test_persist_generated_quiz_bulk_fallback_uses_three_inserts():
+    from app.services.quiz_service import persist_generated_quiz
+    mock_supabase = MagicMock()
+    mock_supabase.rpc.return_value.execute.side_effect = Exception("function create_generated_quiz does not exist")
+    inserts = []
+    question_rows = []
+
+    def mock_table(name):
+        mock_t = MagicMock()
+        def insert(rows):
+            inserts.append(name)
+            if name == "quizzes":
+                data = [{"id": "quiz-1"}]
+            elif name == "quiz_questions":
+                question_rows.extend(rows)
+                data = [{"id": f"q{i}"} for i in range(len(rows))]
+            else:
+                data = [{"id": f"{r['question_id']}-o{r['option_index']}", **r} for r in rows]
+            return MagicMock(execute=MagicMock(return_value=MagicMock(data=data)))
+        mock_t.insert.side_effect = insert
+        return mock_t
+
+    mock_supabase.table.side_effect = mock_table
+
+    response = await persist_generated_quiz(_generated_quiz(), "user-1", None, mock_supabase)
+
+    assert inserts == ["quizzes", "quiz_questions", "quiz_options"]
+    assert [r["position"] for r in question_rows] == list(range(len(question_rows)))
+    assert response.id == "quiz-1"
+    assert [o.id for o in response.questions[1].options] == ["q1-o0", "q1-o1", "q1-o2", "q1-o3"]
+
+@pytest.mark.asyncio
+async def test_persist_generated_quiz_bulk_failure_removes_partial_quiz():
+    from app.services.quiz_service import persist_generated_quiz
+    mock_supabase = MagicMock()
+    mock_supabase.rpc.return_value.execute.side_effect = Exception("function create_generated_quiz does not exist")
+    quizzes_table = MagicMock()
+    quizzes_table.insert.return_value.execute.return_value = MagicMock(data=[{"id": "quiz-1"}])
+    questions_table = MagicMock()
+    questions_table.insert.return_value.execute.side_effect = Exception("connection reset")
+
+    mock_supabase.table.side_effect = lambda name: quizzes_table if name == "quizzes" else questions_table
+
+    with pytest.raises(Exception, match="connection reset"):
+        await persist_generated_quiz(_generated_quiz(), "user-1", None, mock_supabase)
+
+    quizzes_table.delete.return_value.eq.assert_called_once_with("id", "quiz-1")
+
+@pytest.mark.asyncio
+async def test_persist_generated_quiz_does_not_fall_back_after_rpc_timeout():
+    import httpx
+    from app.services.quiz_service import persist_generated_quiz
+    mock_supabase = MagicMock()
+    # The RPC may have committed before the timeout; writing again would duplicate the quiz
+    mock_supabase.rpc.return_value.execute.side_effect = httpx.ReadTimeout("timed out")
+
+    with pytest.raises(httpx.ReadTimeout):
+        await persist_generated_quiz(_generated_quiz(), "user-1", None, mock_supabase)
+
+    mock_supabase.table.assert_not_called()
+
+def test_is_missing_function():
+    from postgrest.exceptions import APIError
+    from app.core.database import is_missing_function
+    assert is_missing_function(APIError({"message": "Could not find the function public.grade_answer in the schema cache", "code": "PGRST202"}))
+    assert is_missing_function(Exception("function create_generated_quiz does not exist"))
+    assert not is_missing_function(APIError({"message": "duplicate key", "code": "23505"}))
+    assert not is_missing_function(TimeoutError("timed out"))
+
+def _persisting_supabase():
+    mock_supabase = MagicMock()
+    mock_supabase.table.return_value.select.return_value.in_.return_value.execute.return_value = MagicMock(data=[{"content": "Lecture content"}])
+    mock_supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(data=None)
+    return mock_supabase
+
+@pytest.mark.asyncio
+async def test_generate_quiz_uses_mock_storage_only_when_the_database_was_not_reached():
+    import httpx
+    request = QuizGenerateRequest(note_ids=["n1"], quiz_length=5, bypass_cache=True)
+
+    with patch("app.services.quiz_service.generate_quiz_content", new_callable=AsyncMock) as mock_agent_call, \
+         patch("app.services.quiz_service.persist_generated_quiz", new_callable=AsyncMock) as mock_persist, \
+         patch("app.services.quiz_service.save_mock_quiz") as mock_save:
+        mock_agent_call.return_value = _generated_quiz()
+
+        # The RPC may have committed before timing out: no second copy in mock storage
+        mock_persist.side_effect = httpx.ReadTimeout("timed out")
+        with pytest.raises(HTTPException) as exc_info:
+            await generate_quiz(request, "user-1", _persisting_supabase())
+        assert exc_info.value.status_code == 500
+        mock_save.assert_not_called()
+
+        mock_persist.side_effect = httpx.ConnectError("unreachable")
+        response = await generate_quiz(request, "user-1", _persisting_supabase())
+        mock_save.assert_called_once()
+        assert mock_save.call_args.args[0]["id"] == response.id
@@ -0,0 +1,179 @@
+import pytest
+from dataclasses import FrozenInstanceError
+from unittest.mock import MagicMock
+from app.models.quiz import QuizResponse, QuestionResponse, OptionResponse
+from app.models.quiz_submission import QuizNextRequest, QuizPreviousRequest
+from app.services.quiz_snapshot import (
+    QuizSnapshotCache,
+    build_snapshot,
+    quiz_snapshot_cache,
+    snapshot_from_response,
+)
+from app.services.quiz_submission import start_quiz_attempt, get_next_question, get_previous_question
+from app.services.quiz_service import update_quiz
+
+def _question_rows():
+    return [
+        {
+            "id": f"q{i}",
+            "question_text": f"Question {i}",
+            "correct_answer_index": 1,
+            "explanation": f"Explanation {i}",
+            # Options come back from the join in arbitrary order
+            "quiz_options": [
+                {"id": f"q{i}-o{j}", "option_text": f"Option {j}", "option_index": j}
+                for j in (3, 1, 0, 2)
+            ],
+        }
+        for i in (2, 0, 1)
+    ]
+
+class CountingSupabase:
+    """
+    Minimal fake Supabase client that records which tables were queried.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.answers = []
+        self.attempt = {"id": "attempt-1", "user_id": "user-1", "quiz_id": "quiz-1", "current_question_index": 0}
+
+    def table(self, name):
+        self.calls.append(name)
+        mock_table = MagicMock()
+        if name == "quizzes":
+            mock_table.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(data={"title": "Snapshot Quiz", "user_id": "user-1"})
+        elif name == "quiz_questions":
+            mock_table.select.return_value.eq.return_value.execute.return_value = MagicMock(data=_question_rows())
+        elif name == "quiz_attempts":
+            mock_table.insert.return_value.execute.return_value = MagicMock(data=[{"id": "attempt-1"}])
+            mock_table.select.return_value.eq.return_value.single.return_value.execute.side_effect = lambda: MagicMock(data=dict(self.attempt))
+            def update(values):
+                self.attempt.update(values)
+                return MagicMock(**{"eq.return_value.execute.return_value": MagicMock(data=[dict(self.attempt)])})
+            mock_table.update.side_effect = update
+        elif name == "quiz_answers":
+            mock_table.select.return_value.eq.return_value.eq.return_value.order.return_value.limit.return_value.execute.return_value = MagicMock(data=self.answers)
+        return mock_table
+
+def test_snapshot_is_ordered_and_immutable():
+    snapshot = build_snapshot("quiz-1", "Snapshot Quiz", _question_rows())
+    assert [q.id for q in snapshot.questions] == ["q0", "q1", "q2"]
+    assert [o.option_index for o in snapshot.questions[0].options] == [0, 1, 2, 3]
+    assert snapshot.questions[0].option_id(1) == "q0-o1"
+    with pytest.raises(FrozenInstanceError):
+        snapshot.title = "Changed"
+
+def test_snapshot_cache_lru_eviction():
+    cache = QuizSnapshotCache(max_size=1)
+    cache.set(build_snapshot("a", "A", _question_rows()))
+    cache.set(build_snapshot("b", "B", _question_rows()))
+    assert cache.get("a") is None
+    assert cache.get("b").title == "B"
+
+def test_snapshot_orders_by_position():
+    rows = [{**row, "position": {"q0": 2, "q1": 0, "q2": 1}[row["id"]]} for row in _question_rows()]
+    snapshot = build_snapshot("quiz-1", "Snapshot Quiz", rows)
+    assert [q.id for q in snapshot.questions] == ["q1", "q2", "q0"]
+
+def test_snapshot_from_response_keeps_generation_order():
+    quiz = QuizResponse(id="quiz-1", title="Generated", questions=[
+        QuestionResponse(
+            id=f"q{i}", question_text=f"Question {i}",
+            options=[OptionResponse(id=f"q{i}-o{j}", option_text=f"Option {j}", option_index=j) for j in (1, 0)],
+            correct_answer_index=0, explanation="Exp"
+        )
+        for i in (1, 0)
+    ])
+    snapshot = snapshot_from_response(quiz)
+    assert [q.id for q in snapshot.questions] == ["q1", "q0"]
+    assert [o.option_index for o in snapshot.questions[0].options] == [0, 1]
+
+@pytest.mark.asyncio
+async def test_navigation_only_touches_attempt_state():
+    supabase = CountingSupabase()
+    start = await start_quiz_attempt("quiz-1", "user-1", supabase)
+    assert start.first_question.id == "q0"
+    assert start.total_questions == 3
+
+    supabase.calls.clear()
+    next_res = await get_next_question("quiz-1", QuizNextRequest(attempt_id="attempt-1"), "user-1", supabase)
+    assert next_res.next_question.id == "q1"
+    assert [o.option_index for o in next_res.next_question.options] == [0, 1, 2, 3]
+    # Attempt read and update plus the existing-answer lookup; no quiz reads
+    assert supabase.calls == ["quiz_attempts", "quiz_attempts", "quiz_answers"]
+
+    supabase.answers = [{"is_correct": False, "selected_option_index": 2}]
+    supabase.calls.clear()
+    prev_res = await get_previous_question("quiz-1", QuizPreviousRequest(attempt_id="attempt-1"), "user-1", supabase)
+    assert prev_res.previous_question.id == "q0"
+    assert prev_res.current_question_index == 0
+    assert prev_res.selected_option_id == "q0-o2"
+    assert prev_res.existing_answer.correct_answer_id == "q0-o1"
+    assert supabase.calls == ["quiz_attempts", "quiz_attempts", "quiz_answers"]
+
+@pytest.mark.asyncio
+async def test_navigation_reads_the_index_moved_by_another_worker():
+    supabase = CountingSupabase()
+    await start_quiz_attempt("quiz-1", "user-1", supabase)
+    await get_next_question("quiz-1", QuizNextRequest(attempt_id="attempt-1"), "user-1", supabase)
+
+    # Another worker moved the attempt back to the first question
+    supabase.attempt["current_question_index"] = 0
+    res = await get_next_question("quiz-1", QuizNextRequest(attempt_id="attempt-1"), "user-1", supabase)
+    assert res.next_question.id == "q1"
+    assert supabase.attempt["current_question_index"] == 1
+
+def test_snapshot_cache_entries_expire(monkeypatch):
+    from app.core import ttl_cache
+    now = [100.0]
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now[0])
+    cache = QuizSnapshotCache(max_size=4, ttl=60)
+    cache.set(build_snapshot("a", "A", _question_rows()))
+    now[0] += 59
+    assert cache.get("a").title == "A"
+    now[0] += 1
+    assert cache.get("a") is None
+
+@pytest.mark.asyncio
+async def test_snapshot_miss_fetches_single_question_by_position():
+    mock_supabase = MagicMock()
+    attempts = MagicMock()
+    attempts.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(
+        data={"id": "attempt-1", "user_id": "user-1", "quiz_id": "quiz-1", "current_question_index": 0}
+    )
+    questions = MagicMock()
+    range_query = questions.select.return_value.eq.return_value.order.return_value.range
+    range_query.return_value.execute.return_value = MagicMock(data=[_question_rows()[2]], count=3)
+    answers = MagicMock()
+    answers.select.return_value.eq.return_value.eq.return_value.order.return_value.limit.return_value.execute.return_value = MagicMock(data=[])
+    mock_supabase.table.side_effect = lambda name: {"quiz_attempts": attempts, "quiz_questions": questions, "quiz_answers": answers}[name]
+
+    res = await get_next_question("quiz-1", QuizNextRequest(attempt_id="attempt-1"), "user-1", mock_supabase)
+
+    assert res.next_question.id == "q1"
+    assert res.total_questions == 3
+    questions.select.assert_called_once_with("*, quiz_options(*)", count="exact")
+    questions.select.return_value.eq.return_value.order.assert_called_once_with("position")
+    range_query.assert_called_once_with(1, 1)
+
+@pytest.mark.asyncio
+async def test_navigation_rejects_other_users():
+    supabase = CountingSupabase()
+    await start_quiz_attempt("quiz-1", "user-1", supabase)
+    with pytest.raises(Exception) as exc:
+        await get_next_question("quiz-1", QuizNextRequest(attempt_id="attempt-1"), "intruder", supabase)
+    assert exc.value.status_code == 403
+
+@pytest.mark.asyncio
+async def test_update_quiz_invalidates_snapshot():
+    supabase = CountingSupabase()
+    await start_quiz_attempt("quiz-1", "user-1", supabase)
+    assert quiz_snapshot_cache.get("quiz-1") is not None
+
+    mock_supabase = MagicMock()
+    mock_supabase.table.return_value.select.return_value.eq.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(data={"id": "quiz-1"})
+    mock_supabase.table.return_value.update.return_value.eq.return_value.execute.return_value = MagicMock(data=[{"id": "quiz-1"}])
+    await update_quiz("quiz-1", "Renamed", "user-1", mock_supabase)
+
+    assert quiz_snapshot_cache.get("quiz-1") is None
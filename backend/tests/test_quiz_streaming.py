@@ -0,0 +1,245 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import MagicMock
+from fastapi.testclient import TestClient
+from jose import jwt
+from pydantic_ai.models.function import DeltaToolCall, FunctionModel
+from tenacity import wait_none
+from app.agents import quiz_agent
+from app.main import app
+from app.models.quiz import QuizGenerateRequest, QuizGenerated
+from app.services import quiz_streaming
+from app.services.generation_cache import generation_cache
+from app.services.generation_limiter import GenerationLimiter
+from app.services.quiz_snapshot import quiz_snapshot_cache
+from app.services.quiz_streaming import stream_quiz_generation
+
+QUIZ = {
+    "title": "Cell Biology",
+    "questions": [
+        {"question_text": f"Question {i}?", "options": ["A", "B", "C", "D"], "correct_answer_index": 2, "explanation": f"Because {i}."}
+        for i in range(3)
+    ]
+}
+
+def streaming_model(text: str, fail_after: bool = False):
+    async def stream_fn(messages, info):
+        name = info.output_tools[0].name
+        for i in range(0, len(text), 9):
+            yield {0: DeltaToolCall(name=name if i == 0 else None, json_args=text[i:i + 9])}
+        if fail_after:
+            raise RuntimeError("connection reset")
+    return FunctionModel(stream_function=stream_fn)
+
+def make_supabase():
+    tables = {name: MagicMock() for name in ("notes", "system_prompts", "quizzes", "quiz_questions", "quiz_options")}
+    supabase = MagicMock()
+    supabase.table.side_effect = lambda name: tables[name]
+    tables["notes"].select.return_value.in_.return_value.execute.return_value = MagicMock(data=[{"content": "Cells have membranes.", "course_id": "course-1"}])
+    tables["system_prompts"].select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(data={"template": "{{notes}} ({{quiz_length}})"})
+    tables["quizzes"].insert.return_value.execute.return_value = MagicMock(data=[{"id": "quiz-1"}])
+
+    def insert_question(row):
+        query = MagicMock()
+        query.execute.return_value = MagicMock(data=[{"id": f"question-{row['position']}"}])
+        return query
+
+    def insert_options(rows):
+        query = MagicMock()
+        query.execute.return_value = MagicMock(data=[{**r, "id": f"{r['question_id']}-option-{r['option_index']}"} for r in rows])
+        return query
+
+    tables["quiz_questions"].insert.side_effect = insert_question
+    tables["quiz_options"].insert.side_effect = insert_options
+    return supabase, tables
+
+@pytest.fixture(autouse=True)
+def reset_generation_cache(monkeypatch):
+    monkeypatch.setattr(quiz_agent, "STREAM_RETRY_WAIT", wait_none())
+    generation_cache.clear()
+    yield
+    generation_cache.clear()
+
+async def collect(events):
+    return [event async for event in events]
+
+@pytest.mark.asyncio
+async def test_questions_are_persisted_and_emitted_as_they_complete():
+    supabase, tables = make_supabase()
+    request = QuizGenerateRequest(note_ids=["n1"], quiz_length=5)
+
+    with quiz_agent.quiz_agent.override(model=streaming_model(json.dumps(QUIZ))):
+        events = await collect(stream_quiz_generation(request, "user-1", supabase))
+
+    assert [e["event"] for e in events] == ["started", "quiz", "question", "question", "question", "done"]
+    assert events[1] == {"event": "quiz", "quiz_id": "quiz-1", "title": "Cell Biology"}
+    questions = [e for e in events if e["event"] == "question"]
+    assert [q["index"] for q in questions] == [0, 1, 2]
+    for i, event in enumerate(questions):
+        question = event["question"]
+        assert question["id"] == f"question-{i}"
+        assert question["question_text"] == f"Question {i}?"
+        # Options are shuffled, and the answer index follows the correct option
+        assert question["options"][question["correct_answer_index"]]["option_text"] == "C"
+    assert events[-1] == {"event": "done", "quiz_id": "quiz-1", "total_questions": 3}
+
+    tables["quizzes"].insert.assert_called_once_with({"user_id": "user-1", "title": "Cell Biology", "course_id": "course-1", "generation_complete": False})
+    tables["quizzes"].update.assert_called_once_with({"generation_complete": True})
+    positions = [call.args[0]["position"] for call in tables["quiz_questions"].insert.call_args_list]
+    assert positions == [0, 1, 2]
+    assert quiz_snapshot_cache.get("quiz-1").total_questions == 3
+
+@pytest.mark.asyncio
+async def test_snapshot_of_a_quiz_still_streaming_is_not_cached():
+    from app.services.quiz_snapshot import get_quiz_snapshot
+    supabase = MagicMock()
+    quizzes, questions = MagicMock(), MagicMock()
+    supabase.table.side_effect = lambda name: {"quizzes": quizzes, "quiz_questions": questions}[name]
+    quizzes.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(
+        data={"title": "Cell Biology", "user_id": "user-1", "generation_complete": False}
+    )
+    questions.select.return_value.eq.return_value.execute.return_value = MagicMock(data=[
+        {"id": "question-0", "position": 0, "question_text": "Question 0?", "correct_answer_index": 2, "explanation": None, "quiz_options": []}
+    ])
+
+    # Another worker is still writing this quiz: serve what exists, but don't keep it
+    snapshot = await get_quiz_snapshot("quiz-1", supabase)
+    assert snapshot.total_questions == 1
+    assert quiz_snapshot_cache.get("quiz-1") is None
+
+@pytest.mark.asyncio
+async def test_cached_generation_is_replayed_without_the_model():
+    supabase, _ = make_supabase()
+    request = QuizGenerateRequest(note_ids=["n1"], quiz_length=5)
+    with quiz_agent.quiz_agent.override(model=streaming_model(json.dumps(QUIZ))):
+        await collect(stream_quiz_generation(request, "user-1", supabase))
+
+    def must_not_run(messages, info):
+        raise AssertionError("model called for a cached generation")
+        yield
+
+    with quiz_agent.quiz_agent.override(model=FunctionModel(stream_function=must_not_run)):
+        events = await collect(stream_quiz_generation(request, "user-1", supabase))
+    assert sum(e["event"] == "question" for e in events) == 3
+    assert events[-1]["event"] == "done"
+
+@pytest.mark.asyncio
+async def test_failure_mid_stream_reports_error_and_removes_partial_quiz():
+    supabase, tables = make_supabase()
+    request = QuizGenerateRequest(note_ids=["n1"], quiz_length=5, bypass_cache=True)
+    text = json.dumps(QUIZ)
+    # Cut the output inside the third question's explanation: two questions are complete
+    cut = text.index('"Because 2.') + 5
+
+    with quiz_agent.quiz_agent.override(model=streaming_model(text[:cut], fail_after=True)):
+        events = await collect(stream_quiz_generation(request, "user-1", supabase))
+
+    assert [e["event"] for e in events] == ["started", "quiz", "question", "question", "error"]
+    assert "unexpected error" in events[-1]["detail"]
+    tables["quizzes"].delete.return_value.eq.assert_called_once_with("id", "quiz-1")
+    assert generation_cache.stats()["size"] == 0
+
+def counting_model(text: str, runs: list):
+    async def stream_fn(messages, info):
+        runs.append(1)
+        name = info.output_tools[0].name
+        for i in range(0, len(text), 9):
+            yield {0: DeltaToolCall(name=name if i == 0 else None, json_args=text[i:i + 9])}
+    return FunctionModel(stream_function=stream_fn)
+
+@pytest.mark.asyncio
+async def test_closing_the_stream_does_not_start_another_run():
+    runs = []
+    with quiz_agent.quiz_agent.override(model=counting_model(json.dumps(QUIZ), runs)):
+        stream = quiz_agent.stream_quiz_content("Prompt")
+        await stream.__anext__()
+        # Client disconnected while the first question was being sent
+        await stream.aclose()
+    assert runs == [1]
+
+@pytest.mark.asyncio
+async def test_cancelling_the_consumer_does_not_start_another_run():
+    runs = []
+
+    async def slow_fn(messages, info):
+        runs.append(1)
+        await asyncio.sleep(10)
+        yield {0: DeltaToolCall(name=info.output_tools[0].name, json_args="{}")}
+
+    async def consume():
+        async for _ in quiz_agent.stream_quiz_content("Prompt"):
+            pass
+
+    with quiz_agent.quiz_agent.override(model=FunctionModel(stream_function=slow_fn)):
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    assert runs == [1]
+
+@pytest.mark.asyncio
+async def test_persistence_failure_closes_the_model_stream(monkeypatch):
+    supabase, tables = make_supabase()
+    request = QuizGenerateRequest(note_ids=["n1"], quiz_length=5, bypass_cache=True)
+    closed = []
+    real_stream = quiz_streaming.stream_quiz_content
+
+    async def tracked_stream(prompt):
+        try:
+            async for item in real_stream(prompt):
+                yield item
+        finally:
+            closed.append(True)
+
+    async def failing_add(self, title, question):
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(quiz_streaming, "stream_quiz_content", tracked_stream)
+    monkeypatch.setattr(quiz_streaming.StreamingQuizWriter, "add", failing_add)
+    runs = []
+    with quiz_agent.quiz_agent.override(model=counting_model(json.dumps(QUIZ), runs)):
+        events = await collect(stream_quiz_generation(request, "user-1", supabase))
+
+    assert [e["event"] for e in events] == ["started", "error"]
+    assert closed == [True]
+    assert runs == [1]
+
+@pytest.fixture
+def auth_headers(monkeypatch):
+    secret = "testsecret"
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", secret)
+    token = jwt.encode({"sub": "stream-user", "aud": "authenticated"}, secret, algorithm="HS256")
+    return {"Authorization": f"Bearer {token}"}
+
+def test_endpoint_streams_ndjson_and_sse(auth_headers, monkeypatch):
+    supabase, _ = make_supabase()
+    monkeypatch.setattr("app.api.routers.quiz.get_supabase_client", lambda: supabase)
+    client = TestClient(app)
+    body = {"note_ids": ["n1"], "quiz_length": 5, "bypass_cache": True}
+
+    with quiz_agent.quiz_agent.override(model=streaming_model(json.dumps(QUIZ))):
+        response = client.post("/api/v1/quiz/generate/stream", json=body, headers=auth_headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in response.text.splitlines()]
+        assert events[-1]["event"] == "done"
+
+        response = client.post("/api/v1/quiz/generate/stream", json=body, headers={**auth_headers, "Accept": "text/event-stream"})
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert "event: question\ndata: " in response.text
+
+def test_endpoint_rejects_with_status_before_streaming(auth_headers, monkeypatch):
+    supabase, tables = make_supabase()
+    monkeypatch.setattr("app.api.routers.quiz.get_supabase_client", lambda: supabase)
+    monkeypatch.setattr(quiz_streaming, "generation_limiter", GenerationLimiter(max_concurrent=0, max_waiting=0))
+    client = TestClient(app)
+
+    response = client.post("/api/v1/quiz/generate/stream", json={"note_ids": ["n1"], "quiz_length": 5, "bypass_cache": True}, headers=auth_headers)
+    assert response.status_code == 429
+    assert "retry-after" in response.headers
+
+    tables["notes"].select.return_value.in_.return_value.execute.return_value = MagicMock(data=[])
+    response = client.post("/api/v1/quiz/generate/stream", json={"note_ids": ["n1"], "quiz_length": 5}, headers=auth_headers)
+    assert response.status_code == 400
@@ -46,6 +46,8 @@ async def test_submit_answer_correct():
         return mock_table
         
     mock_supabase.table.side_effect = table_side_effect
+    # Database without the grade_answer function: plain queries
+    mock_supabase.rpc.return_value.execute.side_effect = Exception("function grade_answer does not exist")
 
     req = QuizSubmissionRequest(attempt_id="attempt-1", question_id="q1", answer_id="opt1")
     result = await submit_answer("quiz-1", req, "user-1", mock_supabase)
@@ -118,6 +120,8 @@ async def test_submit_answer_incorrect():
         return mock_table
         
     mock_supabase.table.side_effect = table_side_effect
+    # Database without the grade_answer function: plain queries
+    mock_supabase.rpc.return_value.execute.side_effect = Exception("function grade_answer does not exist")
 
     req = QuizSubmissionRequest(attempt_id="attempt-1", question_id="q1", answer_id="opt1")
     result = await submit_answer("quiz-1", req, "user-1", mock_supabase)
@@ -127,6 +131,55 @@ async def test_submit_answer_incorrect():
     assert "Incorrect" in result.feedback_text
     # assert "Option B" in result.feedback_text # Removed as logic does not include option text
 
+@pytest.mark.asyncio
+async def test_submit_answer_grades_and_records_in_one_rpc():
+    mock_supabase = MagicMock()
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(data={
+        "user_id": "user-1", "is_correct": False, "correct_answer_id": "opt2", "explanation": "Because logic."
+    })
+
+    req = QuizSubmissionRequest(attempt_id="attempt-1", question_id="q1", answer_id="opt1")
+    result = await submit_answer("quiz-1", req, "user-1", mock_supabase)
+
+    assert result.is_correct == False
+    assert result.correct_answer_id == "opt2"
+    assert result.feedback_text == "Incorrect. Because logic."
+    mock_supabase.rpc.assert_called_once_with("grade_answer", {
+        "p_attempt_id": "attempt-1", "p_question_id": "q1", "p_option_id": "opt1", "p_user_id": "user-1"
+    })
+    mock_supabase.table.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_submit_answer_does_not_retry_with_queries_after_rpc_timeout():
+    import httpx
+    mock_supabase = MagicMock()
+    # grade_answer may have recorded the answer before the timeout; the query path would record it again
+    mock_supabase.rpc.return_value.execute.side_effect = httpx.ReadTimeout("timed out")
+
+    req = QuizSubmissionRequest(attempt_id="attempt-1", question_id="q1", answer_id="opt1")
+    with pytest.raises(HTTPException) as exc:
+        await submit_answer("quiz-1", req, "user-1", mock_supabase)
+    assert exc.value.status_code == 500
+    mock_supabase.table.assert_not_called()
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("data, status_code", [
+    ({"user_id": "someone-else"}, 403),
+    ({"user_id": "user-1", "error": "question_not_found"}, 404),
+    ({"user_id": "user-1", "error": "invalid_answer"}, 400),
+    (None, 404),
+])
+async def test_submit_answer_rpc_rejections(data, status_code, monkeypatch):
+    monkeypatch.setattr("app.services.quiz_submission.get_mock_attempt", lambda attempt_id: None)
+    mock_supabase = MagicMock()
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=data)
+
+    req = QuizSubmissionRequest(attempt_id="attempt-1", question_id="q1", answer_id="opt1")
+    with pytest.raises(HTTPException) as exc:
+        await submit_answer("quiz-1", req, "user-1", mock_supabase)
+    assert exc.value.status_code == status_code
+    mock_supabase.table.assert_not_called()
+
 @pytest.mark.asyncio
 async def test_start_quiz_attempt_service_success():
     mock_supabase = MagicMock()
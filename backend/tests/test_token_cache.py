@@ -0,0 +1,133 @@
+import time
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from jose import jwt
+from app.main import app
+from app.core.token_cache import TokenCache, token_cache
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    token_cache.clear()
+    yield
+    token_cache.clear()
+
+def test_cache_entry_expires_at_token_exp():
+    cache = TokenCache(max_size=10, max_ttl=300)
+    cache.set("tok", {"sub": "1"}, exp=time.time() + 0.05)
+    assert cache.get("tok") == (True, {"sub": "1"})
+    time.sleep(0.06)
+    assert cache.get("tok") == (False, None)
+
+def test_cache_ignores_already_expired_tokens():
+    cache = TokenCache(max_size=10, max_ttl=300)
+    cache.set("tok", {"sub": "1"}, exp=time.time() - 1)
+    assert cache.get("tok") == (False, None)
+    assert cache.stats()["size"] == 0
+
+def test_cache_evicts_least_recently_used():
+    cache = TokenCache(max_size=2, max_ttl=300)
+    cache.set("a", {"sub": "a"})
+    cache.set("b", {"sub": "b"})
+    cache.get("a")  # "b" is now least recently used
+    cache.set("c", {"sub": "c"})
+    assert cache.get("b") == (False, None)
+    assert cache.get("a")[0] is True
+    assert cache.get("c")[0] is True
+
+def test_negative_cache_and_counters():
+    cache = TokenCache(max_size=10, negative_ttl=0.05)
+    cache.set_rejected("bad")
+    assert cache.get("bad") == (True, None)
+    time.sleep(0.06)
+    assert cache.get("bad") == (False, None)
+    stats = cache.stats()
+    assert stats["negative_hits"] == 1
+    assert stats["misses"] == 1
+
+def test_repeated_requests_skip_decode(monkeypatch):
+    secret = "testsecret"
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", secret)
+    token = jwt.encode({"sub": "123", "aud": "authenticated", "exp": int(time.time()) + 60}, secret, algorithm="HS256")
+
+    with patch("app.core.security.jwt.decode", wraps=jwt.decode) as mock_decode:
+        for _ in range(3):
+            response = client.get("/api/protected", headers={"Authorization": f"Bearer {token}"})
+            assert response.status_code == 200
+        assert mock_decode.call_count == 1
+
+    assert token_cache.stats()["hits"] == 2
+
+def test_remote_fallback_is_cached(monkeypatch):
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", "wrongsecret")
+    calls = []
+
+    class MockUser:
+        id = "user123"
+        email = "fallback@example.com"
+        aud = "authenticated"
+        user_metadata = {}
+        app_metadata = {}
+        role = "authenticated"
+
+    class MockResponse:
+        user = MockUser()
+
+    class MockAuth:
+        def get_user(self, token):
+            calls.append(token)
+            return MockResponse()
+
+    class MockClient:
+        auth = MockAuth()
+
+    monkeypatch.setattr("app.core.security.get_supabase_client", lambda: MockClient())
+
+    for _ in range(3):
+        response = client.get("/api/protected", headers={"Authorization": "Bearer remotetoken"})
+        assert response.status_code == 200
+        assert response.json()["user"]["sub"] == "user123"
+    assert calls == ["remotetoken"]
+
+def test_remote_rejection_is_negatively_cached(monkeypatch):
+    monkeypatch.delenv("SUPABASE_JWT_SECRET", raising=False)
+    calls = []
+
+    class AuthRejected(Exception):
+        status = 401
+
+    class MockAuth:
+        def get_user(self, token):
+            calls.append(token)
+            raise AuthRejected("invalid JWT")
+
+    class MockClient:
+        auth = MockAuth()
+
+    monkeypatch.setattr("app.core.security.get_supabase_client", lambda: MockClient())
+
+    for _ in range(3):
+        response = client.get("/api/protected", headers={"Authorization": "Bearer rejectedtoken"})
+        assert response.status_code == 401
+    assert calls == ["rejectedtoken"]
+
+def test_transient_remote_errors_are_not_cached(monkeypatch):
+    monkeypatch.delenv("SUPABASE_JWT_SECRET", raising=False)
+    calls = []
+
+    class MockAuth:
+        def get_user(self, token):
+            calls.append(token)
+            raise ConnectionError("network down")
+
+    class MockClient:
+        auth = MockAuth()
+
+    monkeypatch.setattr("app.core.security.get_supabase_client", lambda: MockClient())
+
+    for _ in range(2):
+        response = client.get("/api/protected", headers={"Authorization": "Bearer sometoken"})
+        assert response.status_code == 401
+    assert calls == ["sometoken", "sometoken"]
@@ -0,0 +1,47 @@
+import pytest
+from app.core import ttl_cache
+from app.core.ttl_cache import TTLCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now[0])
+    return now
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(max_size=4, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=30)
+    clock[0] += 10
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+def test_evicts_least_recently_used(clock):
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b", "missing") == "missing"
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    # No ttl: entries only leave by eviction
+    clock[0] += 10 ** 6
+    assert cache.get("a") == 1
+
+def test_zero_size_or_ttl_disables_the_cache():
+    for cache in (TTLCache(max_size=0, ttl=10), TTLCache(max_size=4, ttl=0)):
+        cache.set("a", 1)
+        assert cache.get("a") is None
+        assert cache.stats()["size"] == 0
+
+def test_clear_and_invalidate():
+    cache = TTLCache(max_size=4)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    assert cache.hit_rate() == 0.5
+    cache.clear()
+    assert cache.stats() == {"size": 0, "hits": 0, "misses": 0}
@@ -0,0 +1,99 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+from app.agents import web_search
+from app.core import ttl_cache
+from app.agents.web_search import close_search_client, search, search_cache, start_search_client
+
+class StubSearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(parse_qs(urlparse(self.path).query))
+        server.ports.add(self.client_address[1])
+        if server.fail:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        query = server.requests[-1]["q"][0]
+        body = json.dumps({"items": [{"title": f"About {query}", "snippet": "Stub snippet"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSearchHandler)
+    server.requests, server.ports, server.fail = [], set(), False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(web_search, "SEARCH_URL", f"http://127.0.0.1:{server.server_address[1]}/customsearch/v1")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.mark.asyncio
+async def test_shared_client_reuses_connections(stub_server):
+    await start_search_client()
+    try:
+        for i in range(5):
+            result = await search(f"fact {i}", "key", "cse")
+            assert f"About fact {i}" in result
+    finally:
+        await close_search_client()
+
+    assert len(stub_server.requests) == 5
+    assert stub_server.requests[0]["cx"] == ["cse"]
+    assert stub_server.requests[0]["num"] == ["3"]
+    # All lookups went over one kept-alive connection
+    assert len(stub_server.ports) == 1
+
+@pytest.mark.asyncio
+async def test_normalized_queries_hit_the_cache(stub_server):
+    first = await search("When did  WW2 end?", "key", "cse")
+    second = await search("when did ww2 end?", "key", "cse")
+    assert first == second
+    assert len(stub_server.requests) == 1
+    assert search_cache.stats()["hits"] == 1
+
+    # A different search engine is a different result set
+    await search("when did ww2 end?", "key", "other-cse")
+    assert len(stub_server.requests) == 2
+
+@pytest.mark.asyncio
+async def test_errors_are_not_cached(stub_server):
+    stub_server.fail = True
+    with pytest.raises(Exception):
+        await search("photosynthesis", "key", "cse")
+    stub_server.fail = False
+    assert "About photosynthesis" in await search("photosynthesis", "key", "cse")
+    assert len(stub_server.requests) == 2
+
+def test_cache_entries_expire(monkeypatch):
+    cache = web_search.SearchResultCache(max_size=2, ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now[0])
+    cache.set("a", "A")
+    cache.set("b", "B")
+    cache.set("c", "C")
+    assert cache.get("a") is None
+    assert cache.get("c") == "C"
+    now[0] += 11
+    assert cache.get("c") is None
+
+@pytest.mark.asyncio
+async def test_close_is_idempotent():
+    await start_search_client()
+    assert web_search._http_client is not None
+    await close_search_client()
+    await close_search_client()
+    assert web_search._http_client is None
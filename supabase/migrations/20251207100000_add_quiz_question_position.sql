@@ -0,0 +1,70 @@
+-- Explicit question order. Navigation previously sorted questions by UUID in Python;
+-- `position` records generation order and lets navigation fetch a single question
+-- by index through the (quiz_id, position) index.
+ALTER TABLE quiz_questions ADD COLUMN IF NOT EXISTS position INTEGER;
+
+-- Backfill existing quizzes in the order navigation has used so far (by id),
+-- so in-progress attempts keep pointing at the same questions.
+UPDATE quiz_questions AS q
+SET position = ordered.position
+FROM (
+    SELECT id, (ROW_NUMBER() OVER (PARTITION BY quiz_id ORDER BY id) - 1)::INTEGER AS position
+    FROM quiz_questions
+) AS ordered
+WHERE q.id = ordered.id AND q.position IS NULL;
+
+ALTER TABLE quiz_questions ALTER COLUMN position SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS quiz_questions_quiz_id_position_idx ON quiz_questions (quiz_id, position);
+
+-- Persists a generated quiz (quiz, questions and options) in a single transaction.
+-- p_questions: [{"question_text": ..., "options": [...], "correct_answer_index": 0, "explanation": ...}, ...]
+-- Returns: {"quiz_id": ..., "questions": [{"id": ..., "option_ids": [...]}, ...]} in input order.
+CREATE OR REPLACE FUNCTION create_generated_quiz(
+    p_user_id UUID,
+    p_course_id UUID,
+    p_title TEXT,
+    p_questions JSONB
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_quiz_id UUID;
+    v_question JSONB;
+    v_question_id UUID;
+    v_option_ids JSONB;
+    v_questions JSONB := '[]'::jsonb;
+    v_position INTEGER;
+BEGIN
+    INSERT INTO quizzes (user_id, course_id, title)
+    VALUES (p_user_id, p_course_id, p_title)
+    RETURNING id INTO v_quiz_id;
+
+    FOR v_question, v_position IN
+        SELECT value, (ordinality - 1)::INTEGER FROM jsonb_array_elements(p_questions) WITH ORDINALITY
+    LOOP
+        INSERT INTO quiz_questions (quiz_id, position, question_text, correct_answer_index, explanation)
+        VALUES (
+            v_quiz_id,
+            v_position,
+            v_question->>'question_text',
+            (v_question->>'correct_answer_index')::INTEGER,
+            v_question->>'explanation'
+        )
+        RETURNING id INTO v_question_id;
+
+        WITH inserted AS (
+            INSERT INTO quiz_options (question_id, option_text, option_index)
+            SELECT v_question_id, opt.value #>> '{}', (opt.ordinality - 1)::INTEGER
+            FROM jsonb_array_elements(v_question->'options') WITH ORDINALITY AS opt(value, ordinality)
+            RETURNING id, option_index
+        )
+        SELECT jsonb_agg(id ORDER BY option_index) INTO v_option_ids FROM inserted;
+
+        v_questions := v_questions || jsonb_build_array(
+            jsonb_build_object('id', v_question_id, 'option_ids', v_option_ids)
+        );
+    END LOOP;
+
+    RETURN jsonb_build_object('quiz_id', v_quiz_id, 'questions', v_questions);
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,55 @@
+-- Serves the latest-answer lookups below and in quiz navigation
+CREATE INDEX IF NOT EXISTS quiz_answers_attempt_question_created_idx
+    ON quiz_answers (attempt_id, question_id, created_at DESC);
+
+-- Scores an attempt and persists the result in one call.
+-- Only the latest answer per question counts, so re-answering a question cannot inflate the score.
+-- Sets score (and end_time, if not set yet) atomically while holding the attempt row lock.
+-- Returns NULL if the attempt does not exist, and only {"user_id": ...} if it belongs to another user
+-- (nothing is written in that case). Otherwise returns:
+-- {"user_id": ..., "quiz_id": ..., "score": ..., "total_questions": ..., "end_time": ...}
+CREATE OR REPLACE FUNCTION get_attempt_results(
+    p_attempt_id UUID,
+    p_user_id UUID
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_attempt quiz_attempts%ROWTYPE;
+    v_total INTEGER;
+    v_score INTEGER;
+BEGIN
+    SELECT * INTO v_attempt FROM quiz_attempts WHERE id = p_attempt_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    IF v_attempt.user_id <> p_user_id THEN
+        RETURN jsonb_build_object('user_id', v_attempt.user_id);
+    END IF;
+
+    SELECT COUNT(*) INTO v_total FROM quiz_questions WHERE quiz_id = v_attempt.quiz_id;
+
+    SELECT COUNT(*) INTO v_score
+    FROM (
+        SELECT DISTINCT ON (question_id) is_correct
+        FROM quiz_answers
+        WHERE attempt_id = p_attempt_id
+        ORDER BY question_id, created_at DESC
+    ) AS latest
+    WHERE latest.is_correct;
+
+    UPDATE quiz_attempts
+    SET score = v_score,
+        end_time = COALESCE(end_time, timezone('utc'::text, now()))
+    WHERE id = p_attempt_id
+    RETURNING * INTO v_attempt;
+
+    RETURN jsonb_build_object(
+        'user_id', v_attempt.user_id,
+        'quiz_id', v_attempt.quiz_id,
+        'score', v_score,
+        'total_questions', v_total,
+        'end_time', v_attempt.end_time
+    );
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,69 @@
+-- Serves the selected/correct option lookups below
+CREATE INDEX IF NOT EXISTS quiz_options_question_id_option_index_idx
+    ON quiz_options (question_id, option_index);
+
+-- Grades and records one answer in a single call (replaces five round trips in submit_answer).
+-- Returns NULL if the attempt does not exist, and only {"user_id": ...} if it belongs to another user
+-- (nothing is written in that case). If the question is not part of the attempt's quiz, or the option
+-- does not belong to the question, returns {"user_id": ..., "error": "question_not_found" | "invalid_answer"}.
+-- Otherwise inserts the answer and returns:
+-- {"user_id": ..., "is_correct": ..., "correct_answer_id": ..., "explanation": ...}
+CREATE OR REPLACE FUNCTION grade_answer(
+    p_attempt_id UUID,
+    p_question_id UUID,
+    p_option_id UUID,
+    p_user_id UUID
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_attempt quiz_attempts%ROWTYPE;
+    v_question quiz_questions%ROWTYPE;
+    v_selected_index INTEGER;
+    v_correct_id UUID;
+    v_is_correct BOOLEAN;
+BEGIN
+    SELECT * INTO v_attempt FROM quiz_attempts WHERE id = p_attempt_id;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    IF v_attempt.user_id <> p_user_id THEN
+        RETURN jsonb_build_object('user_id', v_attempt.user_id);
+    END IF;
+
+    SELECT * INTO v_question
+    FROM quiz_questions
+    WHERE id = p_question_id AND quiz_id = v_attempt.quiz_id;
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('user_id', v_attempt.user_id, 'error', 'question_not_found');
+    END IF;
+
+    SELECT option_index INTO v_selected_index
+    FROM quiz_options
+    WHERE id = p_option_id AND question_id = p_question_id;
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('user_id', v_attempt.user_id, 'error', 'invalid_answer');
+    END IF;
+
+    v_is_correct := v_selected_index = v_question.correct_answer_index;
+
+    INSERT INTO quiz_answers (attempt_id, question_id, selected_option_index, is_correct)
+    VALUES (p_attempt_id, p_question_id, v_selected_index, v_is_correct);
+
+    IF v_is_correct THEN
+        v_correct_id := p_option_id;
+    ELSE
+        SELECT id INTO v_correct_id
+        FROM quiz_options
+        WHERE question_id = p_question_id AND option_index = v_question.correct_answer_index
+        LIMIT 1;
+    END IF;
+
+    RETURN jsonb_build_object(
+        'user_id', v_attempt.user_id,
+        'is_correct', v_is_correct,
+        'correct_answer_id', v_correct_id,
+        'explanation', v_question.explanation
+    );
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,4 @@
+-- Streamed quizzes are visible while their questions are still being written.
+-- `generation_complete` stays FALSE until the last question is persisted, so
+-- navigation does not cache a partial quiz. Existing and non-streamed quizzes are complete.
+ALTER TABLE quizzes ADD COLUMN IF NOT EXISTS generation_complete BOOLEAN NOT NULL DEFAULT TRUE;